@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, '../src/model'))
+
+from draw_simulator import make_draw, simulate_draw
+
+
+def synthetic_win_matrix(n_players, rng):
+    """Ma trận xác suất thắng từ Elo giả lập (độ lệch chuẩn 200 điểm, gần phân phối Elo top 128 ATP)."""
+    ratings = 1800 + 200 * rng.standard_normal(n_players)
+    return 1 / (1 + 10 ** ((ratings[None, :] - ratings[:, None]) / 400)), np.argsort(-ratings)
+
+
+def symmetry_check(draw_size, n_seeds, n_sims, seed):
+    """
+    Hạt giống cùng sức mạnh (1900 Elo, còn lại 1500) và cùng vai trò (1 và 2, 3 và 4, ...) phải có
+    xác suất vô địch như nhau khi bốc thăm lại, kể cả trong nhóm hạt giống cuối chưa đủ người.
+
+    Returns:
+        (float, float): Chênh lệch lớn nhất giữa các cặp và ngưỡng chấp nhận (5 sai số chuẩn).
+    """
+    ratings = np.full(draw_size, 1500.0)
+    ratings[:n_seeds] = 1900
+    probs = 1 / (1 + 10 ** ((ratings[None, :] - ratings[:, None]) / 400))
+    slots, groups = make_draw(range(draw_size), range(n_seeds), draw_size, np.random.default_rng(seed))
+    title = simulate_draw(probs, slots, n_sims=n_sims, seed=seed, groups=groups)[:, -1]
+    gap = max(abs(title[k] - title[k + 1]) for k in range(0, n_seeds - 1, 2))
+    return gap, 5 * np.sqrt(2 * title[:n_seeds].max() / n_sims)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thời gian mô phỏng Monte Carlo nhánh đấu theo kích thước, số lần mô phỏng và số tiến trình.")
+    parser.add_argument('--draw-sizes', type=int, nargs='+', default=[32, 128])
+    parser.add_argument('--sims', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    rows = []
+    for draw_size in args.draw_sizes:
+        probs, by_rating = synthetic_win_matrix(draw_size, rng)
+        seeds = by_rating[:draw_size // 4].tolist()
+        for redraw in (False, True):
+            slots, groups = make_draw(range(draw_size), seeds, draw_size, rng)
+            for n_sims in args.sims:
+                for workers in sorted(set(args.workers)):
+                    start = time.perf_counter()
+                    reach = simulate_draw(probs, slots, n_sims=n_sims, seed=args.seed, workers=workers,
+                                          groups=groups if redraw else None)
+                    elapsed = time.perf_counter() - start
+                    rows.append({
+                        'draw_size': draw_size,
+                        'redraw': redraw,
+                        'sims': n_sims,
+                        'workers': workers,
+                        'wall_s': elapsed,
+                        'sims/s': n_sims / elapsed,
+                        # Tổng xác suất vô địch phải bằng 1
+                        'title_sum': reach[:, -1].sum()
+                    })
+
+    print("\n--- MÔ PHỎNG NHÁNH ĐẤU ---")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f'{v:.3f}'))
+
+    print("\n--- ĐỐI XỨNG KHI BỐC THĂM LẠI (HẠT GIỐNG CÙNG SỨC MẠNH) ---")
+    ok = True
+    for draw_size in args.draw_sizes:
+        # Nhóm hạt giống cuối chưa đủ người (3 hạt giống, 3/4 nhóm 5-8, ...)
+        for n_seeds in sorted({3, 6, draw_size // 4 - 2}):
+            gap, tolerance = symmetry_check(draw_size, n_seeds, max(args.sims), args.seed)
+            print(f"  draw {draw_size:>3}, {n_seeds:>2} hạt giống: chênh lệch {gap:.4f} (ngưỡng {tolerance:.4f})")
+            ok = ok and gap <= tolerance
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
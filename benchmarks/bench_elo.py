@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import argparse
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, '../src'))
+
+from data_preprocessing.data_preprocessing import load_data, add_rolling_stats, restructure_data
+from model.custom_elo_model import TennisEloModel
+
+
+def tile_history(df, n_copies):
+    """Nhân bản lịch sử n lần (dời ngày thi đấu) để giả lập kho dữ liệu lớn hơn."""
+    span = df['tourney_date'].max() - df['tourney_date'].min() + pd.Timedelta(days=7)
+    parts = []
+    for i in range(n_copies):
+        part = df.copy()
+        part['tourney_date'] = part['tourney_date'] + i * span
+        parts.append(part)
+    return pd.concat(parts, ignore_index=True)
+
+
+def measure(df, engine):
+    elo = TennisEloModel(k_factor=20, surface_weight=0.5, engine=engine)
+    start = time.perf_counter()
+    out = elo.fit_transform(df)
+    elapsed = time.perf_counter() - start
+    return out, len(df) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh throughput (trận/giây) giữa engine Elo 'dict' và 'array'.")
+    parser.add_argument('--copies', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--max-dict-rows', type=int, default=200_000,
+                        help="Bỏ qua engine 'dict' khi số trận vượt ngưỡng này (quá chậm).")
+    args = parser.parse_args()
+
+    base = restructure_data(add_rolling_stats(load_data(os.path.join(current_dir, '../data'))))
+
+    rows = []
+    for n_copies in args.copies:
+        df = tile_history(base, n_copies)
+        array_out, array_rate = measure(df, 'array')
+        dict_rate, identical = float('nan'), None
+        if len(df) <= args.max_dict_rows:
+            dict_out, dict_rate = measure(df, 'dict')
+            identical = all((array_out[c].values == dict_out[c].values).all()
+                            for c in ['p1_elo', 'p2_elo', 'elo_diff'])
+        rows.append({
+            'matches': len(df),
+            'dict (trận/giây)': round(dict_rate),
+            'array (trận/giây)': round(array_rate),
+            'speedup': array_rate / dict_rate,
+            'identical': identical
+        })
+
+    print("\n--- THROUGHPUT ENGINE ELO ---")
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+sys.path.append(os.path.join(current_dir, '../src/data_preprocessing'))
+sys.path.append(os.path.join(current_dir, '../src/model'))
+
+from synthetic_data import DATA_CACHE, synthetic_dir
+from data_preprocessing import run_pipeline, run_streaming_pipeline
+from stage_cache import StageCache
+from feature_store import FeatureStore
+from telemetry import TELEMETRY
+
+# Tên chế độ -> (low_memory, streaming)
+MODES = {
+    'thường': (False, False),
+    'low_memory': (True, False),
+    'streaming': (False, True),
+    'streaming+low_memory': (True, True),
+}
+
+
+def run_mode(data_path, low_memory, streaming, files_per_chunk):
+    """
+    Chạy toàn bộ pipeline tiền xử lý (không cache stage) trong tiến trình hiện tại.
+    Trả về (bản ghi telemetry từng stage, đỉnh RSS của cả pipeline (MB), tên feature,
+    ma trận feature float32 như trong store).
+    """
+    TELEMETRY.configure(enabled=True)
+    TELEMETRY.records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Bản ghi ngoài cùng đo đỉnh RSS của cả lần chạy (kể cả phần đọc file giữa các chunk)
+        with TELEMETRY.record('pipeline'):
+            if streaming:
+                store = run_streaming_pipeline(data_path, os.path.join(tmp, 'store'), low_memory=low_memory,
+                                               files_per_chunk=files_per_chunk)
+            else:
+                store = FeatureStore.from_frame(run_pipeline(data_path, StageCache(tmp, enabled=False),
+                                                             low_memory=low_memory))
+        *records, total = TELEMETRY.records
+        X = np.array(store.X)
+    return records, total['peak_rss_mb'], store.feature_names, X
+
+
+def measure(data_path, low_memory, streaming, files_per_chunk=1):
+    """
+    Chạy run_mode trong một tiến trình mới (spawn, không chia sẻ trang bộ nhớ với tiến trình cha
+    đang giữ kết quả các chế độ trước) để đỉnh RSS của các chế độ không ảnh hưởng lẫn nhau.
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return pool.submit(run_mode, data_path, low_memory, streaming, files_per_chunk).result()
+
+
+def stage_summary(records):
+    """Gộp bản ghi theo stage (các chunk streaming cộng thời gian, lấy đỉnh RSS lớn nhất)."""
+    summary = {}
+    for rec in records:
+        cur = summary.setdefault(rec['stage'], {'wall_s': 0.0, 'peak_rss_mb': 0.0, 'count': 0})
+        cur['wall_s'] += rec['wall_s']
+        cur['peak_rss_mb'] = max(cur['peak_rss_mb'], rec['peak_rss_mb'])
+        cur['count'] += 1
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh đỉnh bộ nhớ của pipeline tiền xử lý: thường, low_memory và streaming.")
+    parser.add_argument('--data', default=None, help="Thư mục atp_matches_*.csv (mặc định: dữ liệu giả lập --rows trận).")
+    parser.add_argument('--rows', type=int, default=200_000,
+                        help="Số trận giả lập khi không có --data (~200k tương đương toàn bộ lịch sử ATP từ 1968).")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--chunk-files', type=int, default=1, help="Số file mỗi chunk ở chế độ streaming.")
+    parser.add_argument('--output', default=os.path.join(DATA_CACHE, 'memory-latest.json'),
+                        help="File JSON kết quả lần chạy này.")
+    args = parser.parse_args()
+    data_path = args.data or synthetic_dir(args.rows, args.seed)
+
+    results, matrices = {}, {}
+    for mode in args.modes:
+        low_memory, streaming = MODES[mode]
+        print(f"\n=== CHẾ ĐỘ {mode.upper()} ===")
+        records, peak_mb, feature_names, X = measure(data_path, low_memory, streaming, args.chunk_files)
+        matrices[mode] = (feature_names, X)
+        results[mode] = {'process_peak_rss_mb': peak_mb, 'stages': stage_summary(records)}
+
+    # Feature so với chế độ thường (cùng cột; chênh lệch tuyệt đối lớn nhất / tương đối so với max(1, |x|))
+    base_names, base_X = matrices.get('thường', next(iter(matrices.values())))
+    for mode, (names, X) in matrices.items():
+        same_shape = names == base_names and X.shape == base_X.shape
+        diff = np.abs(X.astype(np.float64) - base_X) if same_shape else None
+        results[mode].update({
+            'rows': len(X),
+            'same_columns': same_shape,
+            'identical': bool(same_shape and np.array_equal(X, base_X, equal_nan=True)),
+            'max_rel_diff': float(np.nanmax(diff / np.maximum(1, np.abs(base_X)))) if same_shape else None
+        })
+
+    table = pd.DataFrame([{
+        'mode': mode,
+        'peak_rss_mb': res['process_peak_rss_mb'],
+        'wall_s': sum(stage['wall_s'] for stage in res['stages'].values()),
+        'rows': res['rows'],
+        'identical': res['identical'],
+        'max_rel_diff': res['max_rel_diff'],
+    } for mode, res in results.items()])
+    print(f"\n--- ĐỈNH BỘ NHỚ THEO CHẾ ĐỘ ({data_path}) ---")
+    print(table.to_string(index=False, float_format=lambda v: f'{v:.3g}'))
+    for mode, res in results.items():
+        stages = ', '.join(f"{name} {s['peak_rss_mb']:.0f} MB" for name, s in res['stages'].items())
+        print(f"  {mode}: {stages}")
+    # Streaming phải cho đúng feature của chế độ trong bộ nhớ tương ứng; low_memory chỉ sai số float32
+    ok = all(res['same_columns'] and (res['max_rel_diff'] or 0) < 1e-5 for res in results.values())
+    for stream_mode, mem_mode in [('streaming', 'thường'), ('streaming+low_memory', 'low_memory')]:
+        if stream_mode in matrices and mem_mode in matrices:
+            identical = np.array_equal(matrices[stream_mode][1], matrices[mem_mode][1], equal_nan=True)
+            print(f"Feature {stream_mode} giống hệt {mem_mode}: {'có' if identical else 'KHÔNG'}")
+            ok = ok and identical
+
+    report = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'data': data_path,
+        'ok': bool(ok),
+        'results': results
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Đã lưu kết quả tại: {args.output}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
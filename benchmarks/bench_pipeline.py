@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+sys.path.append(os.path.join(current_dir, '../src/data_preprocessing'))
+sys.path.append(os.path.join(current_dir, '../src/model'))
+
+from synthetic_data import DATA_CACHE, synthetic_dir
+from data_preprocessing import (load_data, add_rolling_stats, add_context_features, add_serve_features,
+                                restructure_data, finalize_features)
+from custom_elo_model import TennisEloModel
+from model_training import ModelTrainer
+from ensemble import EnsembleTrainer
+from telemetry import TELEMETRY
+
+DEFAULT_BASELINE = os.path.join(current_dir, 'baselines', 'pipeline.json')
+METRICS = ['wall_s', 'cpu_s', 'peak_rss_mb', 'rows_per_s']
+
+
+def stage(name, func, *args, **kwargs):
+    with TELEMETRY.record(name, rows_in=len(args[0]) if isinstance(args[0], pd.DataFrame) else None) as rec:
+        result = func(*args, **kwargs)
+        rec['rows_out'] = len(result)
+    return result
+
+
+def run_size(n_rows, seed, max_model_rows, max_exact_rows):
+    """Chạy toàn bộ pipeline trên dữ liệu giả lập n_rows trận; mọi stage được ghi vào TELEMETRY."""
+    data_path = synthetic_dir(n_rows, seed)
+    df = stage('load_data', load_data, data_path)
+    df = stage('add_rolling_stats', add_rolling_stats, df)
+    df = stage('add_context_features', add_context_features, df)
+    df = stage('add_serve_features', add_serve_features, df)
+    df = stage('restructure_data', restructure_data, df)
+    df = stage('elo_fit_transform', TennisEloModel(k_factor=20, surface_weight=0.5).fit_transform, df)
+    df = stage('finalize_features', finalize_features, df)
+    if n_rows > max_model_rows:
+        return
+
+    feature_names = [c for c in df.columns if c not in ('target', 'tourney_date')]
+    X = df[feature_names].to_numpy(dtype=np.float32)
+    y = df['target'].to_numpy(dtype=int)
+    split_idx = int(len(y) * 0.8)
+    svm_mode = 'exact' if split_idx <= max_exact_rows else 'nystroem'
+    trainer = ModelTrainer(svm_mode=svm_mode)
+    trainer.train_evaluate(X[:split_idx], y[:split_idx], X[split_idx:], y[split_idx:])
+    ensemble = EnsembleTrainer(trainer.get_trained_models(), predictions=trainer.predictions)
+    ensemble.soft_voting(X[split_idx:], y[split_idx:])
+    ensemble.stacking(X[:split_idx], y[:split_idx], X[split_idx:], y[split_idx:])
+
+
+def collect(records, n_rows):
+    """Gom bản ghi telemetry thành {'rows/stage[/model]': {chỉ số}}."""
+    results = {}
+    for rec in records:
+        key = '/'.join(str(part) for part in [n_rows, rec['stage'], rec.get('model')] if part is not None)
+        results[key] = {m: rec.get(m) for m in METRICS}
+    return results
+
+
+def compare(results, baseline, threshold, min_seconds, mem_threshold, min_mb):
+    """
+    So sánh với baseline: một chỉ số bị coi là hồi quy khi vượt baseline quá threshold (tương đối)
+    VÀ quá min_seconds/min_mb (tuyệt đối, để bỏ qua nhiễu của các stage rất nhanh).
+    """
+    rows = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if base is None:
+            rows.append({'key': key, 'wall_s': cur['wall_s'], 'status': 'mới'})
+            continue
+        slow = (cur['wall_s'] > base['wall_s'] * (1 + threshold)
+                and cur['wall_s'] - base['wall_s'] > min_seconds)
+        heavy = (cur['peak_rss_mb'] is not None and base.get('peak_rss_mb') is not None
+                 and cur['peak_rss_mb'] > base['peak_rss_mb'] * (1 + mem_threshold)
+                 and cur['peak_rss_mb'] - base['peak_rss_mb'] > min_mb)
+        rows.append({
+            'key': key,
+            'wall_s': cur['wall_s'],
+            'baseline_wall_s': base['wall_s'],
+            'wall_ratio': cur['wall_s'] / base['wall_s'] if base['wall_s'] else np.nan,
+            'peak_rss_mb': cur['peak_rss_mb'],
+            'baseline_rss_mb': base.get('peak_rss_mb'),
+            'status': 'CHẬM' if slow else ('TỐN RAM' if heavy else 'ok')
+        })
+    return pd.DataFrame(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark toàn pipeline trên dữ liệu ATP giả lập, so với baseline.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000],
+                        help="Kích thước dữ liệu giả lập (vd. 10000 100000 1000000 10000000).")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--max-model-rows', type=int, default=200_000,
+                        help="Bỏ qua huấn luyện mô hình khi số trận vượt ngưỡng này.")
+    parser.add_argument('--max-exact-rows', type=int, default=20_000,
+                        help="SVM dùng SVC chính xác đến ngưỡng này, lớn hơn dùng chế độ nystroem.")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="Chạy mỗi kích thước nhiều lần và giữ kết quả tốt nhất (giảm nhiễu).")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help="File baseline của máy này (chưa có thì lần chạy này tạo nó).")
+    parser.add_argument('--update-baseline', action='store_true', help="Ghi kết quả lần chạy này làm baseline.")
+    parser.add_argument('--threshold', type=float, default=0.3, help="Ngưỡng hồi quy thời gian (tương đối).")
+    parser.add_argument('--min-seconds', type=float, default=0.25, help="Chênh lệch thời gian tối thiểu (s).")
+    parser.add_argument('--mem-threshold', type=float, default=0.3, help="Ngưỡng hồi quy bộ nhớ (tương đối).")
+    parser.add_argument('--min-mb', type=float, default=50, help="Chênh lệch bộ nhớ tối thiểu (MB).")
+    parser.add_argument('--output', default=os.path.join(DATA_CACHE, 'pipeline-latest.json'),
+                        help="File JSON kết quả lần chạy này.")
+    args = parser.parse_args()
+
+    TELEMETRY.configure(enabled=True)
+    results = {}
+    for n_rows in args.rows:
+        for i in range(args.repeat):
+            print(f"\n=== BENCHMARK {n_rows} TRẬN (lần {i + 1}/{args.repeat}) ===")
+            TELEMETRY.records = []
+            run_size(n_rows, args.seed, args.max_model_rows, args.max_exact_rows)
+            for key, cur in collect(TELEMETRY.records, n_rows).items():
+                best = results.setdefault(key, cur)
+                if cur['wall_s'] < best['wall_s']:
+                    results[key] = cur
+
+    report = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nĐã lưu kết quả tại: {args.output}")
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Đã ghi baseline tại: {args.baseline}")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    table = compare(results, baseline, args.threshold, args.min_seconds, args.mem_threshold, args.min_mb)
+    print("\n--- SO SÁNH VỚI BASELINE ---")
+    print(table.to_string(index=False, float_format=lambda v: f'{v:.3f}'))
+    regressions = table[~table['status'].isin(['ok', 'mới'])]
+    if len(regressions):
+        print(f"\n[LỖI] {len(regressions)} chỉ số hồi quy vượt ngưỡng.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
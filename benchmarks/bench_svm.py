@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, '../src/model'))
+
+from feature_store import load_feature_store, DEFAULT_STORE_PATH
+from model_training import build_svm_pipeline, SVM_MODES
+
+
+def resample_rows(X, y, n_rows, seed=42, noise=0.05):
+    """Lấy mẫu có hoàn lại n_rows dòng và thêm nhiễu Gauss nhỏ (theo độ lệch chuẩn từng feature)."""
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(y), n_rows)
+    jitter = rng.standard_normal((n_rows, X.shape[1])).astype(np.float32) * (noise * X.std(axis=0))
+    return X[idx] + jitter, y[idx]
+
+
+def measure(mode, X_train, y_train, X_test, y_test, n_components, n_single=200):
+    pipe = build_svm_pipeline(mode, n_components=n_components)
+    start = time.perf_counter()
+    pipe.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    probs = pipe.predict_proba(X_test)[:, 1]
+    batch_us = (time.perf_counter() - start) / len(y_test) * 1e6
+
+    latencies = []
+    for i in range(min(n_single, len(y_test))):
+        start = time.perf_counter()
+        pipe.predict_proba(X_test[i:i + 1])
+        latencies.append(time.perf_counter() - start)
+    return {
+        'fit (s)': fit_seconds,
+        'batch (µs/dòng)': batch_us,
+        'p50 1 dòng (ms)': np.median(latencies) * 1e3,
+        'AUC': roc_auc_score(y_test, probs)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh SVC RBF chính xác với các chế độ xấp xỉ kernel.")
+    parser.add_argument('--data', default=DEFAULT_STORE_PATH, help="Feature store đã xử lý.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--modes', nargs='+', choices=SVM_MODES, default=list(SVM_MODES))
+    parser.add_argument('--n-components', type=int, default=300,
+                        help="Số feature xấp xỉ kernel (Nystroem/RFF).")
+    parser.add_argument('--max-exact-rows', type=int, default=20_000,
+                        help="Bỏ qua SVC chính xác khi số dòng train vượt ngưỡng này (quá chậm).")
+    args = parser.parse_args()
+
+    store = load_feature_store(args.data, mmap=False)
+    split_idx = int(len(store) * 0.8)
+    X, y = store.X, store.y.astype(int)
+    # Train trên dữ liệu lấy mẫu lại từ phần train thật, đánh giá trên phần test thật (theo thời gian)
+    X_test, y_test = X[split_idx:], y[split_idx:]
+
+    rows = []
+    for n_rows in args.rows:
+        X_train, y_train = resample_rows(X[:split_idx], y[:split_idx], n_rows)
+        for mode in args.modes:
+            if mode == 'exact' and n_rows > args.max_exact_rows:
+                rows.append({'rows': n_rows, 'mode': mode, 'fit (s)': float('nan')})
+                continue
+            print(f"Đang đo {mode} trên {n_rows} dòng...")
+            rows.append({'rows': n_rows, 'mode': mode, **measure(mode, X_train, y_train, X_test, y_test,
+                                                                 args.n_components)})
+
+    print("\n--- SVM: CHÍNH XÁC VS XẤP XỈ KERNEL ---")
+    print(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f'{v:.3f}'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, '../src/data_preprocessing'))
+
+from ingestion import MATCH_SCHEMA
+
+# Thư mục dữ liệu giả lập dùng chung của các benchmark (không commit)
+DATA_CACHE = os.path.join(current_dir, '.cache')
+
+# Số trận/năm và số cầu thủ của 5 mùa dữ liệu thật (2020-2024), dùng để co giãn dữ liệu giả lập
+MATCHES_PER_YEAR = 2600
+REAL_ROWS, REAL_PLAYERS = 13_174, 782
+
+LEVELS = {'A': 0.55, 'M': 0.2, 'G': 0.1, 'D': 0.1, 'F': 0.01, 'O': 0.04}
+SURFACES = {'Hard': 0.595, 'Clay': 0.3, 'Grass': 0.1, None: 0.005}
+DRAW_SIZES = {32: 0.6, 28: 0.1, 64: 0.1, 128: 0.12, 48: 0.04, 56: 0.04}
+ENTRIES = {None: 0.8, 'Q': 0.1, 'WC': 0.05, 'LL': 0.02, 'PR': 0.02, 'SE': 0.01}
+IOCS = ['ESP', 'FRA', 'USA', 'ITA', 'ARG', 'SRB', 'GER', 'AUS', 'GBR', 'RUS', 'CAN', 'JPN', 'CHI', 'NED', 'BEL']
+SCORES_BO3 = ['6-4 6-3', '7-6(5) 6-4', '6-3 3-6 6-2', '6-2 6-2', '4-6 6-4 7-5', '7-5 6-7(3) 6-3', '6-1 6-4']
+SCORES_BO5 = ['6-4 6-3 6-2', '7-6(5) 6-4 3-6 6-3', '6-3 3-6 6-2 4-6 6-4', '6-2 6-2 6-1', '6-4 6-4 7-6(4)']
+_STATS = {
+    # (trung bình người thắng, trung bình người thua, độ lệch chuẩn)
+    'ace': (7.0, 5.0, 4.0), 'df': (2.5, 3.5, 2.0), 'svpt': (75.0, 78.0, 20.0), 'SvGms': (12.0, 12.0, 3.0),
+    'bpSaved': (3.0, 4.5, 2.5), 'bpFaced': (4.0, 9.0, 3.0)
+}
+
+
+def _choice(rng, options, size):
+    keys = list(options)
+    idx = rng.choice(len(keys), size=size, p=np.array(list(options.values())) / sum(options.values()))
+    return np.array(keys, dtype=object)[idx]
+
+
+def _round_labels(draw_size):
+    """Nhãn vòng đấu của draw_size - 1 trận (R128 ... F), vòng đầu có bye nếu draw không phải lũy thừa 2."""
+    bracket = 1 << int(np.ceil(np.log2(draw_size)))
+    labels = [f'R{bracket}'] * (draw_size - bracket // 2)
+    size = bracket // 2
+    while size >= 2:
+        name = {8: 'QF', 4: 'SF', 2: 'F'}.get(size, f'R{size}')
+        labels += [name] * (size // 2)
+        size //= 2
+    return labels
+
+
+def make_players(n_players, rng, alpha=3.0, offset=0.13):
+    """
+    Cầu thủ giả lập: trình độ (thang Elo) giảm dần theo thứ hạng, tần suất thi đấu theo luật lũy thừa
+    (Pareto loại II: cầu thủ hạng k được chọn với xác suất ~ 1/(k + offset*n_players)^alpha).
+    Tham số mặc định khớp phân phối số trận/cầu thủ của dữ liệu thật (trung vị ~5, đuôi dài tới vài trăm).
+    """
+    ranks = np.arange(1, n_players + 1)
+    weights = 1.0 / (ranks + offset * n_players) ** alpha
+    return pd.DataFrame({
+        'id': 200_000 + ranks,
+        'name': [f'Player {i}' for i in ranks],
+        'hand': np.where(rng.random(n_players) < 0.86, 'R', 'L'),
+        'ht': np.where(rng.random(n_players) < 0.01, np.nan, np.round(rng.normal(186, 7, n_players))),
+        'ioc': rng.choice(IOCS, n_players),
+        'age0': rng.uniform(18, 36, n_players),
+        'skill': 2100 - 450 * np.log10(ranks) + rng.normal(0, 40, n_players),
+        'rank': ranks,
+        'rank_points': np.round(11_000 / ranks ** 0.8),
+        'weight': weights / weights.sum()
+    })
+
+
+def generate_year(year, n_rows, players, rng):
+    """Sinh khoảng n_rows trận của một năm với đúng các cột của atp_matches_*.csv."""
+    draws, total = [], 0
+    while total < n_rows:
+        draw = int(_choice(rng, DRAW_SIZES, 1)[0])
+        draws.append(draw)
+        total += draw - 1
+    n_tourneys = len(draws)
+    levels = _choice(rng, LEVELS, n_tourneys)
+    surfaces = _choice(rng, SURFACES, n_tourneys)
+    weeks = np.sort(rng.integers(0, 50, n_tourneys))
+    dates = (pd.Timestamp(f'{year}-01-06') + pd.to_timedelta(weeks * 7, unit='D')).strftime('%Y%m%d').astype(int)
+
+    sizes = np.array(draws) - 1
+    t = np.repeat(np.arange(n_tourneys), sizes)
+    n = len(t)
+    rounds = np.concatenate([_round_labels(d) for d in draws])
+    match_num = np.concatenate([np.arange(1, s + 1) for s in sizes])
+
+    # Hai cầu thủ của mỗi trận được chọn theo tần suất thi đấu; trùng nhau thì đổi người thứ hai
+    p1 = rng.choice(len(players), n, p=players['weight'].to_numpy())
+    p2 = rng.choice(len(players), n, p=players['weight'].to_numpy())
+    p2 = np.where(p1 == p2, (p2 + 1) % len(players), p2)
+    skill = players['skill'].to_numpy()
+    p1_wins = rng.random(n) < 1 / (1 + 10 ** ((skill[p2] - skill[p1]) / 400))
+    winner, loser = np.where(p1_wins, p1, p2), np.where(p1_wins, p2, p1)
+
+    best_of = np.where(levels[t] == 'G', 5, 3)
+    df = pd.DataFrame({
+        'tourney_id': [f'{year}-{i:04d}' for i in t],
+        'tourney_name': [f'Synthetic Open {i}' for i in t],
+        'surface': surfaces[t],
+        'draw_size': np.array(draws)[t],
+        'tourney_level': levels[t],
+        'tourney_date': dates[t],
+        'match_num': match_num,
+        'score': np.where(best_of == 5, rng.choice(SCORES_BO5, n), rng.choice(SCORES_BO3, n)),
+        'best_of': best_of,
+        'round': rounds,
+        'minutes': np.round(rng.normal(np.where(best_of == 5, 160, 100), 30).clip(40)),
+    })
+    years_in = year - 2000
+    for side, idx in [('winner', winner), ('loser', loser)]:
+        p = players.iloc[idx]
+        rank = p['rank'].to_numpy().astype(float)
+        df[f'{side}_id'] = p['id'].to_numpy()
+        df[f'{side}_seed'] = np.where(rank <= 16, rank, np.nan)
+        df[f'{side}_entry'] = _choice(rng, ENTRIES, n)
+        df[f'{side}_name'] = p['name'].to_numpy()
+        df[f'{side}_hand'] = p['hand'].to_numpy()
+        df[f'{side}_ht'] = p['ht'].to_numpy()
+        df[f'{side}_ioc'] = p['ioc'].to_numpy()
+        # Tuổi trôi theo năm và quay vòng trong khoảng 18-36 để giữ thực tế trên lịch sử dài
+        df[f'{side}_age'] = np.round(18 + (p['age0'].to_numpy() - 18 + years_in) % 18, 1)
+        df[f'{side}_rank'] = np.where(rng.random(n) < 0.01, np.nan, rank)
+        df[f'{side}_rank_points'] = np.where(np.isnan(df[f'{side}_rank']), np.nan, p['rank_points'].to_numpy())
+
+    missing_stats = rng.random(n) < 0.04
+    for side, pos in [('w', 0), ('l', 1)]:
+        stats = {col: np.round(rng.normal(means[pos], means[2], n).clip(0)) for col, means in _STATS.items()}
+        stats['bpSaved'] = np.minimum(stats['bpSaved'], stats['bpFaced'])
+        stats['1stIn'] = np.round(stats['svpt'] * rng.uniform(0.55, 0.7, n))
+        stats['1stWon'] = np.round(stats['1stIn'] * rng.uniform(0.65, 0.82, n) if pos == 0
+                                   else stats['1stIn'] * rng.uniform(0.58, 0.75, n))
+        stats['2ndWon'] = np.round((stats['svpt'] - stats['1stIn']) * rng.uniform(0.4, 0.6, n))
+        for col, values in stats.items():
+            df[f'{side}_{col}'] = np.where(missing_stats, np.nan, values)
+    return df[list(MATCH_SCHEMA)]
+
+
+def generate_matches(out_dir, n_rows, seed=42, max_years=40):
+    """
+    Ghi khoảng n_rows trận giả lập ra out_dir/atp_matches_{năm}.csv (đọc được bằng load_data).
+    Số năm co giãn theo n_rows (tối đa max_years); dữ liệu lớn hơn dồn thêm giải đấu vào mỗi tuần.
+    Mỗi năm được sinh và ghi riêng nên bộ nhớ chỉ phụ thuộc vào số trận một năm.
+    """
+    rng = np.random.default_rng(seed)
+    n_years = int(np.clip(round(n_rows / MATCHES_PER_YEAR), 1, max_years))
+    n_players = max(100, int(REAL_PLAYERS * (n_rows / REAL_ROWS) ** 0.7))
+    players = make_players(n_players, rng)
+    os.makedirs(out_dir, exist_ok=True)
+
+    written = 0
+    for i, year in enumerate(range(2025 - n_years, 2025)):
+        rows = (n_rows - written) // (n_years - i)
+        df = generate_year(year, rows, players, rng)
+        df.to_csv(os.path.join(out_dir, f'atp_matches_{year}.csv'), index=False)
+        written += len(df)
+    print(f"Đã sinh {written} trận ({n_years} năm, {n_players} cầu thủ) tại: {out_dir}")
+    return written
+
+
+def synthetic_dir(n_rows, seed=42):
+    """Thư mục dữ liệu giả lập n_rows trận trong DATA_CACHE (sinh một lần, các lần chạy sau dùng lại)."""
+    path = os.path.join(DATA_CACHE, f'synthetic_{n_rows}_{seed}')
+    if not os.path.exists(os.path.join(path, '.done')):
+        generate_matches(path, n_rows, seed)
+        open(os.path.join(path, '.done'), 'w').close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sinh dữ liệu trận đấu ATP giả lập cho benchmark.")
+    parser.add_argument('out_dir')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    generate_matches(args.out_dir, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
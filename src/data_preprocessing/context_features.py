@@ -0,0 +1,134 @@
+import pandas as pd
+import numpy as np
+
+from match_index import MatchIndex, _lookup, _segments, pair_keys
+from rolling_features import _win_rate
+
+# Cửa sổ khối lượng thi đấu mặc định (số trận trong 14 ngày trước trận)
+DEFAULT_WORKLOAD_DAYS = 14
+# Số ngày nghỉ tối đa; cầu thủ chưa có trận nào trước đó cũng nhận giá trị này
+MAX_REST_DAYS = 365
+
+def workload_feature(days):
+    """Tên feature khối lượng thi đấu cho một cửa sổ ngày (không kèm tiền tố winner_/loser_)."""
+    return f'matches_{days}d'
+
+def match_days(dates):
+    """tourney_date -> số ngày (int64) dùng làm khóa thời gian của MatchIndex."""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+class ContextState:
+    """
+    Trạng thái ngữ cảnh mang từ chunk này sang chunk sau (chế độ streaming), lưu dạng mảng đã sắp xếp
+    giống MatchIndex:
+    - Ngày các trận gần nhất của từng cầu thủ (trận cuối + các trận trong cửa sổ khối lượng thi đấu),
+      dạng CSR: ngày của player_ids[k] là days[indptr[k]:indptr[k+1]], cũ trước.
+    - Thành tích đối đầu theo khóa cặp pair_keys (tăng dần): lo_wins = số trận id nhỏ thắng, meetings = tổng số trận.
+    """
+
+    def __init__(self, workload_days=DEFAULT_WORKLOAD_DAYS):
+        self.workload_days = workload_days
+        self.player_ids = np.empty(0, dtype=np.int64)
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.days = np.empty(0, dtype=np.int64)
+        self.pair_keys = np.empty(0, dtype=np.int64)
+        self.lo_wins = np.empty(0, dtype=np.int64)
+        self.meetings = np.empty(0, dtype=np.int64)
+
+    def history(self, players):
+        """Các trận gần nhất của các cầu thủ trong players dưới dạng bảng dài (player, pos âm, days)."""
+        players = np.asarray(players, dtype=np.int64)
+        segment = _lookup(self.player_ids, players)
+        known = segment >= 0
+        players, segment = players[known], segment[known]
+        start = self.indptr[segment]
+        counts = self.indptr[segment + 1] - start
+        # Vị trí trong đoạn của từng dòng: 0..count-1 cho mỗi cầu thủ
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return (np.repeat(players, counts), within - np.repeat(counts, counts),
+                self.days[np.repeat(start, counts) + within])
+
+    def h2h_offsets(self, keys):
+        """(số trận id nhỏ thắng, tổng số trận) của các chunk trước cho từng khóa cặp (0 nếu chưa gặp)."""
+        segment = _lookup(self.pair_keys, keys)
+        found = segment >= 0
+        lo_wins = np.zeros(len(keys), dtype=np.int64)
+        meetings = np.zeros(len(keys), dtype=np.int64)
+        lo_wins[found] = self.lo_wins[segment[found]]
+        meetings[found] = self.meetings[segment[found]]
+        return lo_wins, meetings
+
+def compute_context_features(df, workload_days=DEFAULT_WORKLOAD_DAYS, state=None):
+    """
+    Tính các feature ngữ cảnh TRƯỚC trận qua một MatchIndex dựng một lần cho cả df:
+    - h2h_matches, winner_/loser_h2h_win_pct: số lần gặp nhau và tỷ lệ thắng đối đầu (0 nếu chưa gặp).
+    - winner_/loser_rest_days: số ngày từ trận gần nhất (tính theo tourney_date nên bằng 0 giữa
+      các vòng của cùng giải), tối đa MAX_REST_DAYS.
+    - winner_/loser_matches_{workload_days}d: số trận đã đấu trong workload_days ngày trước trận
+      (kể cả các vòng trước của cùng giải).
+    Dữ liệu gốc (Winner/Loser) phải được sắp xếp theo thời gian; "trước trận" là các dòng đứng trước
+    trong df, giống phong độ ở rolling_features.
+
+    Args:
+        state (ContextState): Trạng thái sau các chunk trước (chế độ streaming), được cập nhật tại chỗ.
+    Returns:
+        DataFrame: Các cột feature ngữ cảnh, cùng index với df.
+    """
+    n = len(df)
+    winner = df['winner_id'].to_numpy(dtype=np.int64)
+    loser = df['loser_id'].to_numpy(dtype=np.int64)
+    days = match_days(df['tourney_date'].to_numpy())
+    pos = np.arange(n)
+    history = state.history(np.unique(np.concatenate([winner, loser]))) if state is not None else None
+    index = MatchIndex(winner, loser, days, history=history)
+
+    winner_wins, meetings = index.head_to_head(winner, loser, pos)
+    if state is not None:
+        # Cộng thành tích đối đầu của các chunk trước theo từng cặp
+        prev_lo_wins, prev_meetings = state.h2h_offsets(pair_keys(winner, loser))
+        winner_wins = winner_wins + np.where(winner < loser, prev_lo_wins, prev_meetings - prev_lo_wins)
+        meetings = meetings + prev_meetings
+
+    out = {'h2h_matches': meetings}
+    out['winner_h2h_win_pct'] = _win_rate(winner_wins, meetings)
+    out['loser_h2h_win_pct'] = _win_rate(meetings - winner_wins, meetings)
+    for side, ids in [('winner', winner), ('loser', loser)]:
+        rest = index.days_since_last(ids, pos, days)
+        out[f'{side}_rest_days'] = np.fmin(rest, MAX_REST_DAYS)
+        out[f'{side}_{workload_feature(workload_days)}'] = index.matches_since(ids, pos, days - workload_days)
+
+    if state is not None:
+        _update_state(state, index, days)
+    return pd.DataFrame(out, index=df.index)
+
+def _update_state(state, index, days):
+    """Ghi lại trận cuối và các trận còn nằm trong cửa sổ khối lượng thi đấu của chunk sau, cùng tổng đối đầu."""
+    if len(days) == 0:
+        return
+    # Trận của chunk sau diễn ra sau mọi trận của chunk này
+    n_players = len(index.player_ids)
+    since = np.full(n_players, int(days.max()) - state.workload_days)
+    keep = np.maximum(index.matches_since(index.player_ids, np.full(n_players, index.n_matches), since), 1)
+    # k trận cuối trong đoạn CSR của từng cầu thủ; index đã gồm lịch sử trong state nên thay thế đoạn cũ
+    within = np.arange(keep.sum()) - np.repeat(np.cumsum(keep) - keep, keep)
+    new_days = index.days[np.repeat(index.indptr[1:] - keep, keep) + within]
+    stale = _lookup(index.player_ids, state.player_ids) < 0
+    old_counts = np.diff(state.indptr)
+    player = np.concatenate([np.repeat(state.player_ids, old_counts)[np.repeat(stale, old_counts)],
+                             np.repeat(index.player_ids, keep)])
+    player_days = np.concatenate([state.days[np.repeat(stale, old_counts)], new_days])
+    order = np.argsort(player, kind='stable')
+    state.player_ids, state.indptr = _segments(player[order])
+    state.days = player_days[order]
+
+    totals = np.diff(index.pair_indptr)
+    lo_wins = index.lo_wins[index.pair_indptr[1:]] - index.lo_wins[index.pair_indptr[:-1]]
+    segment = _lookup(state.pair_keys, index.pair_keys)
+    found = segment >= 0
+    state.lo_wins[segment[found]] += lo_wins[found]
+    state.meetings[segment[found]] += totals[found]
+    keys = np.concatenate([state.pair_keys, index.pair_keys[~found]])
+    order = np.argsort(keys, kind='stable')
+    state.pair_keys = keys[order]
+    state.lo_wins = np.concatenate([state.lo_wins, lo_wins[~found]])[order]
+    state.meetings = np.concatenate([state.meetings, totals[~found]])[order]
@@ -1,30 +1,66 @@
 import pandas as pd
-import glob, os, traceback, sys
+import os, traceback, sys, argparse
 import numpy as np
-from model.custom_elo_model import TennisEloModel
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+sys.path.append(os.path.join(current_dir, '..'))
 sys.path.append(os.path.join(current_dir, '../model'))
 
-def load_data(data_path):
-    path_pattern = os.path.join(data_path, 'atp_matches_*.csv')
-    all_files = glob.glob(path_pattern)
-    if not all_files:
-        raise FileNotFoundError(f"Không tìm thấy file CSV tại: {data_path}")
-    
-    li = [pd.read_csv(f, index_col=None, header=0) for f in all_files]
-    df = pd.concat(li, axis=0, ignore_index=True)
-    
-    df['tourney_date'] = pd.to_datetime(df['tourney_date'], format='%Y%m%d')
+from model.custom_elo_model import TennisEloModel
+from model import custom_elo_model
+from model.feature_store import save_feature_store, FeatureStoreWriter, DEFAULT_STORE_PATH, DEFAULT_CSV_PATH
+from model import feature_spec
+from model.feature_spec import CRITICAL_COLUMNS, SEED_COLUMNS, UNSEEDED, DUMMY_COLUMNS, add_diff_features
+from rolling_features import DEFAULT_FORM_WINDOW, RollingState, compute_rolling_features, form_windows
+import rolling_features
+from context_features import DEFAULT_WORKLOAD_DAYS, ContextState, compute_context_features
+import context_features
+import match_index
+from serve_features import DEFAULT_HALF_LIFE, ServeState, compute_serve_features
+import serve_features
+import ingestion
+from ingestion import read_match_files, iter_match_chunks, data_signature
+from stage_cache import STAGES, StageCache
+from telemetry import TELEMETRY, add_telemetry_arguments, configure_telemetry
 
-    df = df.sort_values(by=['tourney_date', 'match_num']).reset_index(drop=True) # Sắp xếp theo thời gian để tính Rolling Stars và Elo
+def load_data(data_path, cache_dir=None, max_workers=None, low_memory=False):
+    """
+    Đọc các file atp_matches_*.csv theo schema cố định (xem ingestion.MATCH_SCHEMA).
+    
+    Args:
+        cache_dir (str): Thư mục cache theo từng file; năm không thay đổi được nạp thẳng từ cache.
+        max_workers (int): Số tiến trình đọc song song các file chưa có trong cache.
+        low_memory (bool): Bỏ cột chuỗi không dùng, dùng category và hạ kiểu số (xem ingestion.compact_frame).
+    """
+    df = read_match_files(data_path, cache_dir=cache_dir, max_workers=max_workers, low_memory=low_memory)
+    df = df.sort_values(by=['tourney_date', 'match_num'], ignore_index=True) # Sắp xếp theo thời gian để tính Rolling Stars và Elo
     return df
 
-def add_rolling_stats(df):
+def add_rolling_stats(df, windows=(DEFAULT_FORM_WINDOW,), engine='vectorized', low_memory=False, state=None):
     """
-    Tính toán phong độ 5 trận gần nhất và tỷ lệ thắng trên mặt sân.
+    Tính toán phong độ các trận gần nhất và tỷ lệ thắng trên mặt sân.
     Thực hiện trên dữ liệu gốc (Winner/Loser).
+    
+    Args:
+        windows (iterable): Các cửa sổ phong độ. Cửa sổ 5 luôn được tính và giữ tên cột gốc (winner_recent_form),
+                            các cửa sổ khác thêm hậu tố (winner_recent_form_10, ...).
+        engine (str): 'vectorized' - tổng tích lũy theo nhóm trên bảng dạng dài (nhanh).
+                      'loop' - duyệt iterrows (cài đặt gốc, chỉ hỗ trợ cửa sổ 5).
+        low_memory (bool): Thêm cột float32 trực tiếp vào df (không sao chép frame).
+        state (RollingState): Trạng thái phong độ mang từ chunk trước (chế độ streaming).
     """
+    if engine == 'loop':
+        return _add_rolling_stats_loop(df)
+    
+    df_feat = df if low_memory else df.copy()
+    rolling = compute_rolling_features(df_feat, windows, state=state)
+    for col in rolling.columns:
+        df_feat[col] = rolling[col].astype(np.float32) if low_memory else rolling[col]
+    return df_feat
+
+def _add_rolling_stats_loop(df):
+    """Cài đặt gốc: duyệt từng dòng, cửa sổ phong độ cố định 5 trận."""
     df_feat = df.copy()
     
     last_5_stats = {} 
@@ -78,16 +114,77 @@ def add_rolling_stats(df):
     
     return df_feat
 
-def restructure_data(df):
+def add_context_features(df, workload_days=DEFAULT_WORKLOAD_DAYS, low_memory=False, state=None):
+    """
+    Thêm feature ngữ cảnh trận: đối đầu (H2H), số ngày nghỉ và số trận trong workload_days ngày trước trận.
+    Thực hiện trên dữ liệu gốc (Winner/Loser), dùng chỉ mục lịch sử trận (match_index.MatchIndex)
+    thay vì duyệt lại lịch sử cho từng thống kê (xem context_features.compute_context_features).
+    
+    Args:
+        low_memory (bool): Thêm cột (float32 / int32) trực tiếp vào df (không sao chép frame).
+        state (ContextState): Trạng thái ngữ cảnh mang từ chunk trước (chế độ streaming).
+    """
+    df_feat = df if low_memory else df.copy()
+    context = compute_context_features(df_feat, workload_days, state=state)
+    for col in context.columns:
+        values = context[col]
+        if low_memory:
+            values = values.astype(np.float32 if values.dtype.kind == 'f' else np.int32)
+        df_feat[col] = values
+    return df_feat
+
+def add_serve_features(df, half_lives=(DEFAULT_HALF_LIFE,), low_memory=False, state=None):
+    """
+    Thêm tỷ lệ giao bóng, đỡ giao bóng, ace và cứu break-point có trọng số mũ TRƯỚC trận
+    từ các cột thống kê w_*/l_* (xem serve_features.compute_serve_features).
+    Thực hiện trên dữ liệu gốc (Winner/Loser).
+    
+    Args:
+        half_lives (iterable): Các chu kỳ bán rã (số trận). Chu kỳ 10 giữ tên cột gốc (winner_serve_pct),
+                               các chu kỳ khác thêm hậu tố (winner_serve_pct_hl5, ...).
+        low_memory (bool): Thêm cột float32 trực tiếp vào df (không sao chép frame).
+        state (ServeState): Trạng thái giao bóng mang từ chunk trước (chế độ streaming).
+    """
+    df_feat = df if low_memory else df.copy()
+    serve = compute_serve_features(df_feat, half_lives, state=state)
+    for col in serve.columns:
+        df_feat[col] = serve[col].astype(np.float32) if low_memory else serve[col]
+    return df_feat
+
+def _swap_columns(win, lose, swap_mask):
+    """Cặp cột (P1, P2) từ (winner, loser) theo swap_mask; cột category được tráo trên mã số nguyên."""
+    if isinstance(win.dtype, pd.CategoricalDtype):
+        dtype = pd.CategoricalDtype(win.cat.categories.union(lose.cat.categories))
+        win_codes = win.astype(dtype).cat.codes.to_numpy()
+        lose_codes = lose.astype(dtype).cat.codes.to_numpy()
+        return (pd.Categorical.from_codes(np.where(swap_mask, lose_codes, win_codes), dtype=dtype),
+                pd.Categorical.from_codes(np.where(swap_mask, win_codes, lose_codes), dtype=dtype))
+    return np.where(swap_mask, lose, win), np.where(swap_mask, win, lose)
+
+def restructure_data(df, low_memory=False, rng=None):
     """
     Tráo đổi ngẫu nhiên Winner/Loser -> P1/P2.
+    Cột không có trong df (vd. cột chuỗi đã bỏ ở chế độ low_memory) được bỏ qua.
+    rng (np.random.RandomState): Nguồn ngẫu nhiên dùng tiếp qua các chunk (chế độ streaming);
+                                 mặc định seed 42 cho toàn bộ df.
     """
-    common_cols = ['tourney_id', 'tourney_name', 'surface', 'draw_size', 'tourney_level', 'tourney_date', 'match_num', 'best_of', 'round']
+    common_cols = ['tourney_id', 'tourney_name', 'surface', 'draw_size', 'tourney_level', 'tourney_date', 'match_num', 'best_of', 'round',
+                   'h2h_matches']
+    common_cols = [c for c in common_cols if c in df.columns]
     # Danh sách các feature cần mang theo khi swap
-    p_feats = ['id', 'seed', 'entry', 'name', 'hand', 'ht', 'ioc', 'age', 'rank', 'rank_points', 'recent_form', 'surface_win_pct']
+    p_feats = ['id', 'seed', 'entry', 'name', 'hand', 'ht', 'ioc', 'age', 'rank', 'rank_points', 'recent_form', 'surface_win_pct',
+               'h2h_win_pct', 'rest_days']
+    # Phong độ các cửa sổ bổ sung (recent_form_10, recent_form_20, ...), khối lượng thi đấu (matches_14d)
+    # và thống kê giao bóng theo từng chu kỳ bán rã (serve_pct, serve_pct_hl5, ...)
+    p_feats += sorted(c[len('winner_'):] for c in df.columns if c.startswith('winner_recent_form_'))
+    p_feats += sorted(c[len('winner_'):] for c in df.columns if c.startswith('winner_matches_'))
+    p_feats += [c[len('winner_'):] for c in df.columns
+                if c.startswith(tuple(f'winner_{stat}' for stat in serve_features.SERVE_STATS))]
     
-    np.random.seed(42)
-    swap_mask = np.random.rand(len(df)) < 0.5
+    if rng is None:
+        np.random.seed(42)
+        rng = np.random
+    swap_mask = rng.rand(len(df)) < 0.5
     
     new_df = df[common_cols].copy()
     
@@ -95,73 +192,227 @@ def restructure_data(df):
         win_col = f'winner_{feat}'
         lose_col = f'loser_{feat}'
         if win_col in df.columns and lose_col in df.columns:
-            new_df[f'p1_{feat}'] = np.where(swap_mask, df[lose_col], df[win_col])
-            new_df[f'p2_{feat}'] = np.where(swap_mask, df[win_col], df[lose_col])
+            new_df[f'p1_{feat}'], new_df[f'p2_{feat}'] = _swap_columns(df[win_col], df[lose_col], swap_mask)
             
-    new_df['target'] = np.where(swap_mask, 0, 1)
+    new_df['target'] = np.where(swap_mask, 0, 1).astype(np.int8 if low_memory else np.int64)
     return new_df
 
-def add_elo_features(df):
+def add_elo_features(df, k_factor=20, surface_weight=0.5, snapshot_path=None, low_memory=False, elo_engine=None):
     """
     Tích hợp hệ thống Elo Hybrid.
+    Nếu có snapshot_path, trạng thái Elo cuối cùng được lưu lại để cập nhật tăng dần về sau.
+    Với low_memory, cột Elo (float32) được thêm trực tiếp vào df thay vì vào một bản sao.
+    Nếu có elo_engine (chế độ streaming), Elo tiếp tục từ trạng thái của nó thay vì một mô hình mới.
     """
     # K=20 (ổn định), Surface weight=0.5 (cân bằng giữa phong độ chung và mặt sân)
-    elo_engine = TennisEloModel(k_factor=20, surface_weight=0.5)
-    df_elo = elo_engine.fit_transform(df)
+    if elo_engine is None:
+        elo_engine = TennisEloModel(k_factor=k_factor, surface_weight=surface_weight)
+    df_elo = elo_engine.fit_transform(df, copy=not low_memory)
+    if low_memory:
+        for col in ['p1_elo', 'p2_elo', 'elo_diff']:
+            df_elo[col] = df_elo[col].astype(np.float32)
+    if snapshot_path:
+        elo_engine.save_state(snapshot_path)
+    return df_elo
+
+def update_elo_features(df, snapshot_path):
+    """
+    Cập nhật Elo cho các trận mới từ snapshot đã lưu (chỉ xử lý các trận sau watermark),
+    rồi ghi đè snapshot bằng trạng thái mới.
+    """
+    elo_engine = TennisEloModel.load_state(snapshot_path)
+    df = df.sort_values(by=['tourney_date', 'match_num']).reset_index(drop=True)
+    df_elo = elo_engine.partial_fit(df)
+    elo_engine.save_state(snapshot_path)
     return df_elo
 
-def finalize_features(df):
+def finalize_features(df, drop_first=True):
     """
     Làm sạch giá trị thiếu và tạo các feature chênh lệch (Diff).
+    drop_first=False giữ mọi cột dummy (chế độ streaming: cột bị bỏ chỉ chốt được sau chunk cuối,
+    xem FeatureStoreWriter).
     """
     
     # Xóa hàng thiếu dữ liệu cốt lõi
-    crit_cols = ['p1_rank', 'p2_rank', 'p1_ht', 'p2_ht', 'p1_age', 'p2_age']
-    df_clean = df.dropna(subset=crit_cols).copy()
+    df_clean = df.dropna(subset=CRITICAL_COLUMNS).copy()
     
     # Xử lý Seed
-    for col in ['p1_seed', 'p2_seed']:
-        df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce').fillna(100)
+    for col in SEED_COLUMNS:
+        df_clean[col] = pd.to_numeric(df_clean[col], errors='coerce').fillna(UNSEEDED)
         
     # Tạo các cột hiệu số (Difference) - Đây là cái model học tốt nhất
-    df_clean['rank_diff'] = df_clean['p1_rank'] - df_clean['p2_rank']
-    df_clean['age_diff'] = df_clean['p1_age'] - df_clean['p2_age']
-    df_clean['ht_diff'] = df_clean['p1_ht'] - df_clean['p2_ht']
-    df_clean['form_diff'] = df_clean['p1_recent_form'] - df_clean['p2_recent_form']
-    df_clean['surf_pct_diff'] = df_clean['p1_surface_win_pct'] - df_clean['p2_surface_win_pct']
+    # (đặc tả dùng chung với MatchPredictor, xem model/feature_spec.py)
+    add_diff_features(df_clean)
     # elo_diff đã được tạo trong bước add_elo_features
     
-    # Mã hóa biến phân loại (Surface, Hand)
-    cols_dummy = ['surface', 'p1_hand', 'p2_hand']
-    df_final = pd.get_dummies(df_clean, columns=cols_dummy, drop_first=True)
+    # Mã hóa biến phân loại (Surface, Hand). Ở chế độ low_memory p1_hand/p2_hand là category:
+    # bỏ các giá trị không còn xuất hiện để tập cột dummy giống hệt khi chúng là chuỗi
+    for col in ['p1_hand', 'p2_hand']:
+        if isinstance(df_clean[col].dtype, pd.CategoricalDtype):
+            df_clean[col] = df_clean[col].cat.remove_unused_categories()
+    dummies = pd.get_dummies(df_clean[DUMMY_COLUMNS], columns=DUMMY_COLUMNS, drop_first=drop_first)
     
-    # Chỉ giữ lại các cột số để đưa vào training
-    numeric_cols = df_final.select_dtypes(include=[np.number]).columns.tolist()
-    if 'tourney_date' in df_final.columns:
-        numeric_cols.append('tourney_date')
+    # Chỉ giữ lại các cột số (kèm cột dummy kiểu bool) để đưa vào training;
+    # ghép một lần từ các cột cần giữ thay vì mã hóa rồi lọc trên toàn bộ frame
+    numeric_cols = [c for c in df_clean.select_dtypes(include=[np.number, 'bool']).columns if c not in DUMMY_COLUMNS]
+    parts = [df_clean[numeric_cols], dummies]
+    if 'tourney_date' in df_clean.columns:
+        parts.append(df_clean[['tourney_date']])
         
-    df_final = df_final[numeric_cols]
+    df_final = pd.concat(parts, axis=1)
     return df_final
 
-def main():
+def prepare_matches(data_path, cache, windows=(DEFAULT_FORM_WINDOW,), low_memory=False,
+                    workload_days=DEFAULT_WORKLOAD_DAYS, half_lives=(DEFAULT_HALF_LIFE,)):
+    """
+    Chạy các stage load -> rolling -> context -> serve -> restructure qua StageCache; trả về (DataFrame, fingerprint).
+    low_memory nằm trong tham số của mọi stage nên hai chế độ có cache riêng.
+    """
+    raw_df, fp = cache.run('load', load_data, data_path, params={'low_memory': low_memory},
+                           upstream=data_signature(data_path), code_deps=[ingestion],
+                           cache_dir=os.path.join(data_path, '.cache', 'ingest'))
+    rolling_df, fp = cache.run('rolling', add_rolling_stats, raw_df,
+                               params={'windows': form_windows(windows), 'low_memory': low_memory}, upstream=fp,
+                               code_deps=[_add_rolling_stats_loop, rolling_features])
+    context_df, fp = cache.run('context', add_context_features, rolling_df,
+                               params={'workload_days': workload_days, 'low_memory': low_memory}, upstream=fp,
+                               code_deps=[context_features, match_index])
+    serve_df, fp = cache.run('serve', add_serve_features, context_df,
+                             params={'half_lives': list(half_lives), 'low_memory': low_memory}, upstream=fp,
+                             code_deps=[serve_features])
+    return cache.run('restructure', restructure_data, serve_df, params={'low_memory': low_memory},
+                     upstream=fp, code_deps=[_swap_columns])
+
+def run_pipeline(data_path, cache, k_factor=20, surface_weight=0.5, windows=(DEFAULT_FORM_WINDOW,), snapshot_path=None,
+                 low_memory=False, workload_days=DEFAULT_WORKLOAD_DAYS, half_lives=(DEFAULT_HALF_LIFE,)):
+    """
+    Chạy pipeline load -> rolling -> context -> serve -> restructure -> elo -> finalize qua StageCache:
+    stage nào có fingerprint (đầu vào, tham số, code) không đổi sẽ được nạp lại từ cache.
+    
+    Args:
+        low_memory (bool): Frame gọn (category, float32, bỏ cột chuỗi không dùng), các stage thêm cột
+                           tại chỗ thay vì sao chép frame. Feature cuối cùng giống chế độ thường
+                           (sai số làm tròn float32).
+    """
+    struct_df, fp = prepare_matches(data_path, cache, windows, low_memory, workload_days, half_lives)
+    elo_df, fp = cache.run('elo', add_elo_features, struct_df,
+                           # float(): --k-factor 20 và giá trị mặc định 20 phải cho cùng fingerprint
+                           params={'k_factor': float(k_factor), 'surface_weight': float(surface_weight),
+                                   'low_memory': low_memory},
+                           upstream=fp, code_deps=[custom_elo_model], outputs=['snapshot_path'],
+                           snapshot_path=snapshot_path)
+    final_df, fp = cache.run('finalize', finalize_features, elo_df, upstream=fp, code_deps=[feature_spec])
+    return final_df
+
+def run_streaming_pipeline(data_path, store_path=DEFAULT_STORE_PATH, k_factor=20, surface_weight=0.5,
+                           windows=(DEFAULT_FORM_WINDOW,), snapshot_path=None, files_per_chunk=1, low_memory=False,
+                           workload_days=DEFAULT_WORKLOAD_DAYS, half_lives=(DEFAULT_HALF_LIFE,)):
+    """
+    Chế độ streaming cho lịch sử dài: đọc dữ liệu theo từng chunk thời gian (iter_match_chunks),
+    mang trạng thái phong độ (RollingState), ngữ cảnh (ContextState), giao bóng (ServeState), Elo (TennisEloModel)
+    và chuỗi ngẫu nhiên swap sang chunk sau, restructure/finalize từng chunk rồi ghi nối vào feature store (FeatureStoreWriter).
+    Bộ nhớ giới hạn bởi kích thước chunk + trạng thái theo cầu thủ; feature store giống hệt run_pipeline.
+    Không dùng StageCache (kết quả theo stage là frame của toàn bộ lịch sử).
+    
+    Returns:
+        FeatureStore: Store đã ghi (memory-map).
+    """
+    rolling_state = RollingState(windows)
+    context_state = ContextState(workload_days)
+    serve_state = ServeState(half_lives)
+    elo_engine = TennisEloModel(k_factor=k_factor, surface_weight=surface_weight)
+    # Cùng chuỗi số ngẫu nhiên với np.random.seed(42) trong restructure_data trên toàn bộ dữ liệu
+    rng = np.random.RandomState(42)
+    writer = FeatureStoreWriter(store_path)
+    chunks = iter_match_chunks(data_path, files_per_chunk, cache_dir=os.path.join(data_path, '.cache', 'ingest'),
+                               low_memory=low_memory)
+    for i, chunk in enumerate(chunks):
+        with TELEMETRY.record('stream_chunk', rows_in=len(chunk), chunk=i) as rec:
+            df = add_rolling_stats(chunk, windows, low_memory=low_memory, state=rolling_state)
+            df = add_context_features(df, workload_days, low_memory=low_memory, state=context_state)
+            df = add_serve_features(df, half_lives, low_memory=low_memory, state=serve_state)
+            df = restructure_data(df, low_memory=low_memory, rng=rng)
+            df = add_elo_features(df, low_memory=low_memory, elo_engine=elo_engine)
+            df = finalize_features(df, drop_first=False)
+            writer.append(df)
+            rec['rows_out'] = len(df)
+    if snapshot_path:
+        elo_engine.save_state(snapshot_path)
+    with TELEMETRY.record('save_feature_store', rows_in=writer.n_rows):
+        return writer.close()
+
+def _positive_int(value):
+    """Kiểu argparse: số nguyên >= 1 (cửa sổ/chu kỳ bằng 0 hoặc âm không có nghĩa)."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"phải là số nguyên >= 1 (nhận {value})")
+    return number
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tiền xử lý dữ liệu ATP và tạo feature.")
+    parser.add_argument('--k-factor', type=float, default=20.0, help="Hệ số K của Elo.")
+    parser.add_argument('--surface-weight', type=float, default=0.5, help="Trọng số Elo mặt sân.")
+    parser.add_argument('--windows', type=_positive_int, nargs='+', default=[DEFAULT_FORM_WINDOW],
+                        help="Các cửa sổ phong độ (vd. 10 20); cửa sổ 5 luôn được tính.")
+    parser.add_argument('--workload-days', type=_positive_int, default=DEFAULT_WORKLOAD_DAYS,
+                        help="Cửa sổ (ngày) của feature khối lượng thi đấu gần đây.")
+    parser.add_argument('--half-lives', type=_positive_int, nargs='+', default=[DEFAULT_HALF_LIFE],
+                        help="Các chu kỳ bán rã (số trận) của thống kê giao bóng (vd. 5 10 25).")
+    parser.add_argument('--force', nargs='+', default=[], choices=STAGES + ['all'], metavar='STAGE',
+                        help=f"Bắt buộc chạy lại các stage: {', '.join(STAGES)} hoặc all.")
+    parser.add_argument('--invalidate', nargs='+', default=[], choices=STAGES + ['all'], metavar='STAGE',
+                        help="Xóa cache của các stage trước khi chạy.")
+    parser.add_argument('--no-cache', action='store_true', help="Không đọc/ghi cache stage.")
+    parser.add_argument('--csv', action='store_true', help="Xuất thêm bản CSV của dữ liệu đã xử lý.")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="Chế độ tiết kiệm bộ nhớ: category, float32, bỏ cột chuỗi không dùng, thêm cột tại chỗ.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Xử lý theo từng chunk file (bộ nhớ không phụ thuộc độ dài lịch sử), ghi thẳng feature store.")
+    parser.add_argument('--chunk-files', type=int, default=1, help="Số file (mùa) mỗi chunk ở chế độ --stream.")
+    add_telemetry_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.stream and args.csv:
+        parser.error("--csv không dùng được với --stream (frame đầy đủ không bao giờ nằm trong bộ nhớ).")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
     current_dir = os.path.dirname(os.path.abspath(__file__))
     data_path = os.path.join(current_dir, "../../data")
+    configure_telemetry(args)
     
     try:
+        force = STAGES if 'all' in args.force else args.force
+        cache = StageCache(os.path.join(data_path, '.cache', 'stages'), enabled=not args.no_cache, force=force)
+        for stage in (STAGES if 'all' in args.invalidate else args.invalidate):
+            cache.invalidate(stage)
+        
         # Pipeline thực thi
-        raw_df = load_data(data_path)
-        rolling_df = add_rolling_stats(raw_df)
-        struct_df = restructure_data(rolling_df)
-        elo_df = add_elo_features(struct_df)
-        final_df = finalize_features(elo_df)
+        snapshot_path = os.path.join(current_dir, "../../elo_state.npz")
+        if args.stream:
+            # Feature store được ghi nối theo từng chunk
+            run_streaming_pipeline(data_path, DEFAULT_STORE_PATH, k_factor=args.k_factor,
+                                   surface_weight=args.surface_weight, windows=args.windows,
+                                   snapshot_path=snapshot_path, files_per_chunk=args.chunk_files,
+                                   low_memory=args.low_memory, workload_days=args.workload_days,
+                                   half_lives=args.half_lives)
+        else:
+            final_df = run_pipeline(data_path, cache, k_factor=args.k_factor, surface_weight=args.surface_weight,
+                                    windows=args.windows, snapshot_path=snapshot_path, low_memory=args.low_memory,
+                                    workload_days=args.workload_days, half_lives=args.half_lives)
+            
+            # Lưu feature store nhị phân (và CSV nếu được yêu cầu)
+            with TELEMETRY.record('save_feature_store', rows_in=len(final_df)):
+                save_feature_store(final_df, DEFAULT_STORE_PATH)
+            if args.csv:
+                final_df.to_csv(DEFAULT_CSV_PATH, index=False)
         
-        # Lưu file
-        output_path = os.path.join(current_dir, "../../processed_atp_data.csv")
-        final_df.to_csv(output_path, index=False)
+        if args.telemetry:
+            TELEMETRY.write_report(args.telemetry)
         
     except Exception as e:
         print(f"\n[LỖI] Quy trình thất bại: {e}")
         traceback.print_exc()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,236 @@
+import pandas as pd
+import numpy as np
+import glob, os, json, hashlib, time
+from concurrent.futures import ProcessPoolExecutor
+from pandas.api.types import union_categoricals
+
+# Tăng khi đổi schema để vô hiệu hóa cache cũ
+SCHEMA_VERSION = 2
+
+_STAT_COLS = ['ace', 'df', 'svpt', '1stIn', '1stWon', '2ndWon', 'SvGms', 'bpSaved', 'bpFaced']
+
+# Schema cố định của atp_matches_*.csv (cột không có ở đây sẽ bị bỏ qua khi đọc)
+MATCH_SCHEMA = {
+    'tourney_id': 'str',
+    'tourney_name': 'str',
+    'surface': 'category',
+    'draw_size': 'float64',  # Có thể trống ở file lịch sử/challenger/futures (int32 không chứa được NaN)
+    'tourney_level': 'category',
+    'tourney_date': 'int32',  # YYYYMMDD, được chuyển sang datetime sau khi đọc
+    'match_num': 'int32',
+    **{f'{side}_{col}': dtype for side in ['winner', 'loser'] for col, dtype in [
+        ('id', 'int32'), ('seed', 'float64'), ('entry', 'str'), ('name', 'str'),
+        ('hand', 'str'), ('ht', 'float64'), ('ioc', 'str'), ('age', 'float64')
+    ]},
+    'score': 'str',
+    'best_of': 'float64',    # Như draw_size
+    'round': 'category',
+    'minutes': 'float64',
+    **{f'{side}_{col}': 'float64' for side in ['w', 'l'] for col in _STAT_COLS},
+    **{f'{side}_{col}': 'float64' for side in ['winner', 'loser'] for col in ['rank', 'rank_points']},
+}
+
+CATEGORICAL_COLS = [col for col, dtype in MATCH_SCHEMA.items() if dtype == 'category']
+
+# Chế độ low_memory: cột chuỗi không stage nào phía sau dùng tới bị bỏ ngay khi đọc,
+# cột chuỗi còn lại (tay thuận, quốc tịch) được giữ dưới dạng category
+UNUSED_STRING_COLS = ['tourney_id', 'tourney_name', 'score'] + [
+    f'{side}_{col}' for side in ['winner', 'loser'] for col in ['name', 'entry']]
+LOW_MEMORY_CATEGORICAL = [f'{side}_{col}' for side in ['winner', 'loser'] for col in ['hand', 'ioc']]
+
+
+def match_files(data_path):
+    """Danh sách file atp_matches_*.csv (đã sắp xếp) trong data_path."""
+    all_files = sorted(glob.glob(os.path.join(data_path, 'atp_matches_*.csv')))
+    if not all_files:
+        raise FileNotFoundError(f"Không tìm thấy file CSV tại: {data_path}")
+    return all_files
+
+
+def data_signature(data_path):
+    """Chữ ký rẻ (tên, kích thước, mtime) của các file dữ liệu, dùng làm fingerprint đầu vào."""
+    return [[os.path.basename(f), os.stat(f).st_size, os.stat(f).st_mtime_ns] for f in match_files(data_path)]
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_match_file(path):
+    """Đọc một file atp_matches_*.csv theo schema cố định."""
+    df = pd.read_csv(path, usecols=lambda c: c in MATCH_SCHEMA,
+                     dtype={c: t for c, t in MATCH_SCHEMA.items() if t != 'str'})
+    df['tourney_date'] = pd.to_datetime(df['tourney_date'], format='%Y%m%d')
+    return df
+
+
+def compact_frame(df):
+    """
+    Thu gọn frame trận đấu tại chỗ (chế độ low_memory): bỏ UNUSED_STRING_COLS, chuyển LOW_MEMORY_CATEGORICAL
+    sang category, hạ float64 -> float32 và số nguyên về kiểu nhỏ nhất đủ chứa giá trị.
+    """
+    df.drop(columns=[c for c in UNUSED_STRING_COLS if c in df.columns], inplace=True)
+    for col in LOW_MEMORY_CATEGORICAL:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in df.select_dtypes(include='float64').columns:
+        df[col] = df[col].astype(np.float32)
+    for col in df.select_dtypes(include='integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+class IngestionCache:
+    """
+    Cache cục bộ cho từng file CSV: frame đã gán kiểu (pickle) + metadata JSON.
+    Khóa cache gồm kích thước, mtime và SHA-256 của file: nếu size/mtime không đổi thì dùng ngay,
+    nếu mtime đổi nhưng nội dung (hash) giữ nguyên thì vẫn dùng lại cache.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache_dir, f'{name}.pkl'), os.path.join(self.cache_dir, f'{name}.json')
+
+    @staticmethod
+    def _signature(path, with_hash=True):
+        stat = os.stat(path)
+        sig = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'schema_version': SCHEMA_VERSION}
+        if with_hash:
+            sig['sha256'] = _file_hash(path)
+        return sig
+
+    def load(self, path):
+        """Trả về frame từ cache hoặc None nếu cache không hợp lệ."""
+        data_path, meta_path = self._paths(path)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+        sig = self._signature(path, with_hash=False)
+        if meta.get('schema_version') != SCHEMA_VERSION or meta.get('size') != sig['size']:
+            return None
+        if meta.get('mtime_ns') != sig['mtime_ns']:
+            # File bị "touch" nhưng có thể không đổi nội dung -> so sánh hash
+            if meta.get('sha256') != _file_hash(path):
+                return None
+            meta['mtime_ns'] = sig['mtime_ns']
+            with open(meta_path, 'w') as f:
+                json.dump(meta, f)
+        return pd.read_pickle(data_path)
+
+    def store(self, path, df):
+        data_path, meta_path = self._paths(path)
+        df.to_pickle(data_path)
+        with open(meta_path, 'w') as f:
+            json.dump(self._signature(path), f)
+
+
+def _read_and_cache(path, cache_dir, low_memory=False):
+    """Worker cho process pool: đọc một file (một năm) và ghi vào cache (luôn ở dạng đầy đủ)."""
+    df = read_match_file(path)
+    if cache_dir is not None:
+        IngestionCache(cache_dir).store(path, df)
+    return compact_frame(df) if low_memory else df
+
+
+def _concat_frames(frames):
+    """
+    Nối các frame, hợp nhất category để các cột phân loại không bị chuyển về object.
+    Cột category được gán lại tại chỗ trên từng frame (không sao chép cả frame).
+    """
+    frames = [f for f in frames if len(f)]
+    for col in [c for c in frames[0].columns if isinstance(frames[0][c].dtype, pd.CategoricalDtype)]:
+        cats = union_categoricals([f[col] for f in frames], sort_categories=True).categories
+        dtype = pd.CategoricalDtype(cats)
+        for f in frames:
+            f[col] = f[col].astype(dtype)
+    return pd.concat(frames, axis=0, ignore_index=True)
+
+
+def read_match_files(data_path, cache_dir=None, max_workers=None, low_memory=False):
+    """
+    Đọc toàn bộ atp_matches_*.csv trong data_path.
+    File chưa có trong cache được đọc song song bằng process pool (mỗi file một tiến trình).
+
+    Args:
+        cache_dir (str): Thư mục cache, None để tắt cache.
+        max_workers (int): Số tiến trình tối đa (1 = đọc tuần tự).
+        low_memory (bool): Thu gọn từng file ngay khi đọc (compact_frame) để frame đầy đủ
+                           của toàn bộ lịch sử không bao giờ nằm trong bộ nhớ.
+    """
+    all_files = match_files(data_path)
+
+    start = time.perf_counter()
+    cache = IngestionCache(cache_dir) if cache_dir is not None else None
+    frames = {}
+    if cache is not None:
+        for path in all_files:
+            cached = cache.load(path)
+            if cached is not None:
+                frames[path] = compact_frame(cached) if low_memory else cached
+
+    missing = [path for path in all_files if path not in frames]
+    if len(missing) > 1 and max_workers != 1:
+        with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count(), len(missing))) as pool:
+            results = pool.map(_read_and_cache, missing, [cache_dir] * len(missing), [low_memory] * len(missing))
+            for path, df in zip(missing, results):
+                frames[path] = df
+    else:
+        for path in missing:
+            frames[path] = _read_and_cache(path, cache_dir, low_memory)
+
+    df = _concat_frames([frames[path] for path in all_files])
+    print(f"Đã đọc {len(all_files)} file ({len(all_files) - len(missing)} từ cache, "
+          f"{len(missing)} từ CSV), {len(df)} trận trong {time.perf_counter() - start:.2f}s.")
+    return df
+
+
+def _min_dates(all_files):
+    """Ngày thi đấu sớm nhất của từng file (chỉ đọc cột tourney_date)."""
+    return [pd.read_csv(path, usecols=['tourney_date'], dtype={'tourney_date': 'int32'})['tourney_date'].min()
+            for path in all_files]
+
+
+def iter_match_chunks(data_path, files_per_chunk=1, cache_dir=None, low_memory=False):
+    """
+    Đọc atp_matches_*.csv theo từng chunk files_per_chunk file, trả về các frame đã sắp xếp theo
+    (tourney_date, match_num) mà nối lại thì giống hệt load_data trên toàn bộ dữ liệu.
+
+    Một file có thể chứa trận sớm hơn trận cuối của file trước (vd. giải khai mạc mùa bắt đầu cuối tháng 12),
+    nên chỉ các trận có ngày nhỏ hơn ngày sớm nhất của mọi file còn lại mới được trả về;
+    phần còn lại được giữ và gộp vào chunk sau. Bộ nhớ chỉ phụ thuộc kích thước chunk.
+    """
+    all_files = match_files(data_path)
+    # later_min[i] = ngày sớm nhất trong các file từ i trở đi
+    later_min = np.minimum.accumulate(_min_dates(all_files)[::-1])[::-1]
+    later_min = pd.to_datetime(later_min.astype(str), format='%Y%m%d')
+    cache = IngestionCache(cache_dir) if cache_dir is not None else None
+
+    pending = None
+    for start in range(0, len(all_files), files_per_chunk):
+        frames = [] if pending is None else [pending]
+        for path in all_files[start:start + files_per_chunk]:
+            df = cache.load(path) if cache is not None else None
+            if df is None:
+                df = _read_and_cache(path, cache_dir, low_memory)
+            elif low_memory:
+                df = compact_frame(df)
+            frames.append(df)
+        chunk = _concat_frames(frames).sort_values(by=['tourney_date', 'match_num'], ignore_index=True)
+
+        end = start + files_per_chunk
+        if end < len(all_files):
+            ready = (chunk['tourney_date'] < later_min[end]).to_numpy()
+            pending = chunk[~ready].reset_index(drop=True)
+            chunk = chunk[ready].reset_index(drop=True)
+        if len(chunk):
+            yield chunk
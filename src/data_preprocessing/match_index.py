@@ -0,0 +1,135 @@
+import numpy as np
+
+# Khóa cặp đối đầu (id nhỏ << 32 | id lớn): id cầu thủ là số nguyên không âm < 2^31
+_PAIR_SHIFT = 32
+
+
+def pair_keys(a_ids, b_ids):
+    """Khóa của cặp đối đầu không phụ thuộc thứ tự hai cầu thủ."""
+    a_ids, b_ids = np.asarray(a_ids, dtype=np.int64), np.asarray(b_ids, dtype=np.int64)
+    return (np.minimum(a_ids, b_ids) << _PAIR_SHIFT) | np.maximum(a_ids, b_ids)
+
+
+def _segments(sorted_keys):
+    """Các giá trị khác nhau của một mảng đã sắp xếp và indptr dạng CSR (đoạn k = [indptr[k], indptr[k+1]))."""
+    keys, starts = np.unique(sorted_keys, return_index=True)
+    return keys, np.append(starts, len(sorted_keys)).astype(np.int64)
+
+
+def _lookup(keys, values):
+    """Chỉ số của values trong mảng keys đã sắp xếp (-1 nếu không có) bằng tìm kiếm nhị phân."""
+    idx = np.minimum(np.searchsorted(keys, values), max(len(keys) - 1, 0))
+    found = (keys[idx] == values) if len(keys) else np.zeros(len(values), dtype=bool)
+    return np.where(found, idx, -1)
+
+
+class MatchIndex:
+    """
+    Chỉ mục lịch sử trận dựng một lần từ dữ liệu Winner/Loser đã sắp xếp theo thời gian,
+    thay cho việc duyệt lại toàn bộ lịch sử cho mỗi thống kê theo cầu thủ.
+
+    - Theo cầu thủ (CSR): các trận của player_ids[k] là positions[indptr[k]:indptr[k+1]]
+      (vị trí trận trong dữ liệu, tăng dần) kèm ngày thi đấu days cùng thứ tự.
+    - Theo cặp đối đầu (CSR): các trận của pair_keys[k] là pair_positions[pair_indptr[k]:pair_indptr[k+1]],
+      lo_wins là tổng tích lũy số trận cầu thủ có id nhỏ hơn thắng.
+
+    Mọi truy vấn "tính đến trận ở vị trí pos" chỉ dùng các trận có vị trí < pos (không rò rỉ kết quả
+    của chính trận đó) và chạy bằng tìm kiếm nhị phân trên khóa (đoạn, vị trí) / (đoạn, ngày),
+    vectorized cho cả mảng truy vấn.
+    """
+
+    def __init__(self, winner_ids, loser_ids, days, history=None):
+        """
+        Args:
+            winner_ids, loser_ids (array): Id hai cầu thủ của từng trận, theo thứ tự thời gian.
+            days (array): Ngày thi đấu (số ngày, int) của từng trận.
+            history (tuple): (player, pos, days) các trận trước dữ liệu này (chế độ streaming,
+                             xem ContextState.history); pos âm, tăng dần theo thời gian trong từng cầu thủ.
+        """
+        winner_ids = np.asarray(winner_ids, dtype=np.int64)
+        loser_ids = np.asarray(loser_ids, dtype=np.int64)
+        days = np.asarray(days, dtype=np.int64)
+        n = len(winner_ids)
+        self.n_matches = n
+
+        player = np.concatenate([winner_ids, loser_ids])
+        pos = np.tile(np.arange(n, dtype=np.int64), 2)
+        match_days = np.tile(days, 2)
+        if history is not None:
+            hist_player, hist_pos, hist_days = history
+            player = np.concatenate([hist_player, player])
+            pos = np.concatenate([hist_pos, pos])
+            match_days = np.concatenate([hist_days, match_days])
+
+        # Chỉ mục theo cầu thủ
+        order = np.lexsort((pos, player))
+        self.player_ids, self.indptr = _segments(player[order])
+        self.positions = pos[order]
+        self.days = match_days[order]
+        segment = np.repeat(np.arange(len(self.player_ids), dtype=np.int64), np.diff(self.indptr))
+        self._pos_offset = -min(int(pos.min()), 0) if len(pos) else 0
+        self._pos_span = n + self._pos_offset + 1
+        self._pos_keys = segment * self._pos_span + self.positions + self._pos_offset
+        self._day_min = int(match_days.min()) if len(match_days) else 0
+        self._day_span = (int(match_days.max()) - self._day_min + 2) if len(match_days) else 1
+        self._day_keys = segment * self._day_span + (self.days - self._day_min)
+
+        # Chỉ mục theo cặp đối đầu
+        keys = pair_keys(winner_ids, loser_ids)
+        order = np.lexsort((np.arange(n), keys))
+        self.pair_keys, self.pair_indptr = _segments(keys[order])
+        self.pair_positions = order.astype(np.int64)
+        lo_won = (winner_ids < loser_ids)[order]
+        self.lo_wins = np.concatenate([[0], np.cumsum(lo_won, dtype=np.int64)])
+        pair_segment = np.repeat(np.arange(len(self.pair_keys), dtype=np.int64), np.diff(self.pair_indptr))
+        self._pair_pos_keys = pair_segment * (n + 1) + self.pair_positions
+
+    def history_before(self, player_ids, positions):
+        """
+        Các trận của mỗi cầu thủ diễn ra trước vị trí positions: đoạn [start, end) của positions/days.
+        Cầu thủ chưa có trong chỉ mục có đoạn rỗng.
+
+        Returns:
+            (segment, start, end): segment = chỉ số trong player_ids (-1 nếu chưa biết).
+        """
+        segment = _lookup(self.player_ids, np.asarray(player_ids, dtype=np.int64))
+        seg = np.maximum(segment, 0)
+        start = self.indptr[seg]
+        rel = np.clip(np.asarray(positions, dtype=np.int64) + self._pos_offset, 0, self._pos_span - 1)
+        end = np.searchsorted(self._pos_keys, seg * self._pos_span + rel)
+        known = segment >= 0
+        return segment, np.where(known, start, 0), np.where(known, end, 0)
+
+    def days_since_last(self, player_ids, positions, days):
+        """Số ngày từ trận gần nhất trước vị trí positions đến ngày days (NaN nếu chưa có trận nào)."""
+        _, start, end = self.history_before(player_ids, positions)
+        has_prior = end > start
+        last = self.days[np.maximum(end - 1, 0)] if len(self.days) else np.zeros(len(end), dtype=np.int64)
+        return np.where(has_prior, np.asarray(days, dtype=np.int64) - last, np.nan)
+
+    def matches_since(self, player_ids, positions, since_days):
+        """Số trận trước vị trí positions có ngày thi đấu >= since_days."""
+        segment, start, end = self.history_before(player_ids, positions)
+        rel = np.clip(np.asarray(since_days, dtype=np.int64) - self._day_min, 0, self._day_span - 1)
+        first = np.searchsorted(self._day_keys, np.maximum(segment, 0) * self._day_span + rel)
+        return end - np.clip(first, start, end)
+
+    def head_to_head(self, a_ids, b_ids, positions):
+        """
+        Thành tích đối đầu của a trước b trong các trận trước vị trí positions.
+
+        Returns:
+            (a_wins, meetings): Số trận a thắng b và tổng số lần gặp nhau.
+        """
+        a_ids = np.asarray(a_ids, dtype=np.int64)
+        segment = _lookup(self.pair_keys, pair_keys(a_ids, b_ids))
+        seg = np.maximum(segment, 0)
+        start = self.pair_indptr[seg]
+        rel = np.clip(np.asarray(positions, dtype=np.int64), 0, self.n_matches)
+        end = np.searchsorted(self._pair_pos_keys, seg * (self.n_matches + 1) + rel)
+        known = segment >= 0
+        start, end = np.where(known, start, 0), np.where(known, end, 0)
+        lo_wins = self.lo_wins[end] - self.lo_wins[start]
+        meetings = end - start
+        a_is_lo = a_ids < np.asarray(b_ids, dtype=np.int64)
+        return np.where(a_is_lo, lo_wins, meetings - lo_wins), meetings
@@ -0,0 +1,170 @@
+import pandas as pd
+import numpy as np
+
+# Cửa sổ phong độ mặc định - giữ tên cột gốc 'recent_form'
+DEFAULT_FORM_WINDOW = 5
+
+def form_feature(window):
+    """Tên feature phong độ cho một cửa sổ (không kèm tiền tố winner_/loser_)."""
+    return 'recent_form' if window == DEFAULT_FORM_WINDOW else f'recent_form_{window}'
+
+def form_windows(windows):
+    """
+    Các cửa sổ phong độ thực sự được tính: luôn gồm DEFAULT_FORM_WINDOW (cột gốc recent_form mà
+    form_diff và MatchPredictor luôn cần), bỏ trùng, giữ thứ tự.
+    """
+    return list(dict.fromkeys([DEFAULT_FORM_WINDOW, *windows]))
+
+def _prior_wins(new_group, won, window=None):
+    """
+    Trên bảng đã sắp xếp theo (nhóm, thời gian): đếm số trận và số trận thắng TRƯỚC mỗi dòng
+    trong cùng nhóm, giới hạn ở `window` trận gần nhất (None = toàn bộ lịch sử).
+    Dùng tổng tích lũy dịch một bước nên không có vòng lặp Python theo dòng.
+    """
+    idx = np.arange(len(won))
+    group_start = np.maximum.accumulate(np.where(new_group, idx, 0))
+    n_prior = idx - group_start
+    if window is not None:
+        n_prior = np.minimum(n_prior, window)
+    # cum[j] = số trận thắng của các dòng đứng trước j
+    cum = np.concatenate([[0], np.cumsum(won)])
+    wins = cum[idx] - cum[idx - n_prior]
+    return wins, n_prior
+
+def _win_rate(wins, n_prior):
+    """Tỷ lệ thắng, bằng 0 nếu chưa có trận nào (giống cài đặt gốc)."""
+    return np.divide(wins, n_prior, out=np.zeros(len(wins)), where=n_prior > 0)
+
+def _surface_key(value):
+    """Khóa mặt sân trong RollingState: mặt sân thiếu (NaN) là None."""
+    return None if pd.isna(value) else value
+
+class RollingState:
+    """
+    Trạng thái phong độ mang từ chunk này sang chunk sau (chế độ streaming):
+    tối đa max(windows) kết quả gần nhất của từng cầu thủ và [thắng, tổng] theo (cầu thủ, mặt sân).
+    Bộ nhớ tỉ lệ với số cầu thủ, không phụ thuộc độ dài lịch sử.
+    """
+    
+    def __init__(self, windows=(DEFAULT_FORM_WINDOW,)):
+        self.max_window = max(form_windows(windows))
+        self.recent = {}   # player_id -> list kết quả (1/0), cũ trước
+        self.surface = {}  # (player_id, mặt sân) -> [số trận thắng, tổng số trận]
+    
+    def history(self, players):
+        """Các trận gần nhất của các cầu thủ trong players dưới dạng bảng dài (player, won, pos âm)."""
+        hist_player, hist_won, hist_pos = [], [], []
+        for p in players:
+            results = self.recent.get(p)
+            if results:
+                hist_player += [p] * len(results)
+                hist_won += results
+                hist_pos += range(-len(results), 0)
+        return (np.array(hist_player, dtype=np.int64), np.array(hist_won, dtype=np.int64),
+                np.array(hist_pos, dtype=np.int64))
+
+def compute_rolling_features(df, windows=(DEFAULT_FORM_WINDOW,), state=None):
+    """
+    Tính phong độ TRƯỚC trận cho nhiều cửa sổ cùng lúc và tỷ lệ thắng trên mặt sân (toàn bộ lịch sử).
+    Dữ liệu gốc (Winner/Loser) phải được sắp xếp theo thời gian.
+    
+    Mỗi trận được tách thành 2 dòng (winner, loser) trong bảng dạng dài, sắp xếp theo
+    (cầu thủ, thời gian) rồi tính bằng tổng tích lũy theo nhóm.
+    
+    Args:
+        df (DataFrame): Có các cột winner_id, loser_id, surface.
+        windows (iterable): Các độ dài cửa sổ phong độ (vd. (10, 20)); cửa sổ 5 luôn được tính thêm (form_windows).
+        state (RollingState): Trạng thái sau các chunk trước (chế độ streaming), được cập nhật tại chỗ.
+                              Các trận gần nhất được chèn trước df và số trận theo mặt sân được cộng dồn,
+                              nên kết quả giống hệt khi tính trên toàn bộ lịch sử.
+    Returns:
+        DataFrame: Các cột winner_/loser_{recent_form[_w], surface_win_pct}, cùng index với df.
+    """
+    windows = form_windows(windows)
+    n = len(df)
+    player = np.concatenate([df['winner_id'].to_numpy(), df['loser_id'].to_numpy()])
+    won = np.concatenate([np.ones(n, dtype=np.int64), np.zeros(n, dtype=np.int64)])
+    pos = np.tile(np.arange(n), 2)
+    # Mặt sân thiếu (NaN) là một nhóm riêng
+    surface_codes, surface_values = pd.factorize(df['surface'], use_na_sentinel=False)
+    surface = np.tile(surface_codes, 2)
+    
+    long_feats = {}
+    
+    # Phong độ: nhóm theo cầu thủ (kèm các trận gần nhất từ chunk trước nếu có)
+    n_hist = 0
+    player_all, won_all, pos_all = player, won, pos
+    if state is not None:
+        hist_player, hist_won, hist_pos = state.history(np.unique(player).tolist())
+        n_hist = len(hist_player)
+        player_all = np.concatenate([hist_player, player])
+        won_all = np.concatenate([hist_won, won])
+        pos_all = np.concatenate([hist_pos, pos])
+    order = np.lexsort((pos_all, player_all))
+    p_sorted = player_all[order]
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = p_sorted[1:] != p_sorted[:-1]
+    for window in windows:
+        wins, n_prior = _prior_wins(new_group, won_all[order], window)
+        values = np.empty(n_hist + 2 * n)
+        values[order] = _win_rate(wins, n_prior)
+        long_feats[form_feature(window)] = values[n_hist:]
+    if state is not None:
+        won_sorted = won_all[order]
+        starts = np.flatnonzero(new_group)
+        ends = np.append(starts[1:], len(order))
+        for p, start, end in zip(p_sorted[starts].tolist(), starts.tolist(), ends.tolist()):
+            state.recent[p] = won_sorted[max(start, end - state.max_window):end].tolist()
+    
+    # Tỷ lệ thắng trên mặt sân: nhóm theo (cầu thủ, mặt sân)
+    order = np.lexsort((pos, surface, player))
+    p_sorted, s_sorted = player[order], surface[order]
+    new_group = np.ones(len(order), dtype=bool)
+    new_group[1:] = (p_sorted[1:] != p_sorted[:-1]) | (s_sorted[1:] != s_sorted[:-1])
+    wins, n_prior = _prior_wins(new_group, won[order])
+    if state is not None:
+        # Cộng số trận thắng/tổng số trận của các chunk trước theo từng nhóm (cầu thủ, mặt sân)
+        starts = np.flatnonzero(new_group)
+        surface_values = np.asarray(surface_values, dtype=object)
+        keys = list(zip(p_sorted[starts].tolist(), [_surface_key(v) for v in surface_values[s_sorted[starts]]]))
+        offsets = np.array([state.surface.get(key, (0, 0)) for key in keys], dtype=np.int64).reshape(-1, 2)
+        group = np.cumsum(new_group) - 1
+        wins = wins + offsets[group, 0]
+        n_prior = n_prior + offsets[group, 1]
+        totals_won = offsets[:, 0] + np.add.reduceat(won[order], starts)
+        totals = offsets[:, 1] + np.diff(np.append(starts, len(order)))
+        for key, w, t in zip(keys, totals_won.tolist(), totals.tolist()):
+            state.surface[key] = [w, t]
+    values = np.empty(2 * n)
+    values[order] = _win_rate(wins, n_prior)
+    long_feats['surface_win_pct'] = values
+    
+    out = {}
+    for name, values in long_feats.items():
+        out[f'winner_{name}'] = values[:n]
+        out[f'loser_{name}'] = values[n:]
+    return pd.DataFrame(out, index=df.index)
+
+def player_form_state(df, max_window=DEFAULT_FORM_WINDOW):
+    """
+    Trạng thái phong độ SAU toàn bộ lịch sử (tức là TRƯỚC trận kế tiếp) của từng cầu thủ,
+    dùng cho dự đoán online.
+    
+    Returns:
+        recent (dict): player_id -> list kết quả (1/0) của tối đa max_window trận gần nhất, cũ trước.
+        surface (dict): (player_id, surface) -> [số trận thắng, tổng số trận].
+    """
+    n = len(df)
+    long = pd.DataFrame({
+        'player': np.concatenate([df['winner_id'].to_numpy(), df['loser_id'].to_numpy()]),
+        'won': np.concatenate([np.ones(n, dtype=np.int64), np.zeros(n, dtype=np.int64)]),
+        'pos': np.tile(np.arange(n), 2),
+        'surface': np.tile(df['surface'].to_numpy(dtype=object), 2),
+    }).sort_values(['player', 'pos'], kind='stable')
+    
+    tail = long.groupby('player', sort=False).tail(max_window)
+    recent = tail.groupby('player', sort=False)['won'].agg(list).to_dict()
+    
+    surf = long.dropna(subset=['surface']).groupby(['player', 'surface'], sort=False)['won'].agg(['sum', 'count'])
+    surface = {key: [int(w), int(t)] for key, w, t in zip(surf.index, surf['sum'], surf['count'])}
+    return recent, surface
@@ -0,0 +1,138 @@
+import pandas as pd
+import numpy as np
+
+# Chu kỳ bán rã mặc định (số trận) - giữ tên cột gốc (serve_pct, ...)
+DEFAULT_HALF_LIFE = 10
+
+# Thống kê giao/đỡ giao bóng: tên -> (cột tử số, cột mẫu số) trong bảng dài SUM_COLUMNS.
+# Mỗi tỷ lệ có cột mẫu số riêng (ace_svpt tách khỏi svpt) để thống kê thiếu chỉ bị loại khỏi đúng tỷ lệ đó.
+SERVE_STATS = {
+    'serve_pct': ('serve_won', 'svpt'),         # % điểm thắng khi giao bóng
+    'return_pct': ('return_won', 'opp_svpt'),   # % điểm thắng khi đỡ giao bóng
+    'ace_rate': ('ace', 'ace_svpt'),            # ace / điểm giao bóng
+    'bp_save_pct': ('bpSaved', 'bpFaced'),      # % break-point cứu được
+}
+SUM_COLUMNS = ['serve_won', 'svpt', 'return_won', 'opp_svpt', 'ace', 'ace_svpt', 'bpSaved', 'bpFaced']
+
+def serve_feature(stat, half_life):
+    """Tên feature giao bóng cho một chu kỳ bán rã (không kèm tiền tố winner_/loser_)."""
+    return stat if half_life == DEFAULT_HALF_LIFE else f'{stat}_hl{half_life}'
+
+def _side_sums(df, own, opp):
+    """
+    Các tổng của bảng dài cho một phía (own = 'w' hoặc 'l'): ma trận [trận x SUM_COLUMNS].
+    Thống kê thiếu (NaN) của một cặp tử số/mẫu số được tính là 0 cho cả hai (không đóng góp);
+    mặt nạ tính trên giá trị gốc của từng cặp trước khi gán 0.
+    """
+    col = lambda side, name: df[f'{side}_{name}'].to_numpy(dtype=np.float64)
+    values = {
+        'serve_won': col(own, '1stWon') + col(own, '2ndWon'),
+        'svpt': col(own, 'svpt'),
+        'return_won': col(opp, 'svpt') - col(opp, '1stWon') - col(opp, '2ndWon'),
+        'opp_svpt': col(opp, 'svpt'),
+        'ace': col(own, 'ace'),
+        'ace_svpt': col(own, 'svpt'),
+        'bpSaved': col(own, 'bpSaved'),
+        'bpFaced': col(own, 'bpFaced'),
+    }
+    missing = {stat: np.isnan(values[num]) | np.isnan(values[den]) for stat, (num, den) in SERVE_STATS.items()}
+    for stat, (num, den) in SERVE_STATS.items():
+        values[num] = np.where(missing[stat], 0.0, values[num])
+        values[den] = np.where(missing[stat], 0.0, values[den])
+    return np.column_stack([values[c] for c in SUM_COLUMNS])
+
+class ServeState:
+    """
+    Trạng thái giao bóng mang từ chunk này sang chunk sau (chế độ streaming) và cho dự đoán online:
+    các tổng có trọng số mũ [chu kỳ bán rã x SUM_COLUMNS] của từng cầu thủ sau trận gần nhất.
+    """
+
+    def __init__(self, half_lives=(DEFAULT_HALF_LIFE,)):
+        self.half_lives = list(half_lives)
+        self.sums = {}  # player_id -> mảng (len(half_lives), len(SUM_COLUMNS))
+
+    def features(self, player):
+        """Feature giao bóng TRƯỚC trận kế tiếp của player: tên feature -> giá trị (0 nếu chưa có)."""
+        sums = self.sums.get(player)
+        out = {}
+        for h, half_life in enumerate(self.half_lives):
+            for stat, (num, den) in SERVE_STATS.items():
+                n = sums[h, SUM_COLUMNS.index(num)] if sums is not None else 0.0
+                d = sums[h, SUM_COLUMNS.index(den)] if sums is not None else 0.0
+                out[serve_feature(stat, half_life)] = n / d if d > 0 else 0.0
+        return out
+
+def compute_serve_features(df, half_lives=(DEFAULT_HALF_LIFE,), state=None):
+    """
+    Tỷ lệ giao/đỡ giao bóng có trọng số mũ TRƯỚC trận cho nhiều chu kỳ bán rã cùng lúc:
+    với chu kỳ h (số trận), trận cách đây k trận có trọng số 0.5^(k/h); mỗi tỷ lệ là
+    tổng tử số / tổng mẫu số có trọng số (0 nếu chưa có thống kê, giống phong độ).
+    Dữ liệu gốc (Winner/Loser) phải được sắp xếp theo thời gian.
+
+    Mỗi trận được tách thành 2 dòng (winner, loser) trong bảng dạng dài. Các tổng được cập nhật
+    theo đệ quy S = r * S + x lần lượt theo thứ tự trận trong từng cầu thủ, nhưng đồng thời cho mọi
+    cầu thủ: bước t xử lý trận thứ t của mọi cầu thủ có hơn t trận. Cầu thủ được xếp theo số trận
+    giảm dần nên ở mỗi bước các cầu thủ còn trận là một đoạn đầu liên tục của mảng trạng thái
+    (không cần chỉ số ngẫu nhiên), số bước bằng số trận lớn nhất của một cầu thủ.
+
+    Args:
+        df (DataFrame): Có winner_id, loser_id và các cột thống kê w_*/l_* (svpt, 1stWon, 2ndWon, ace, bpSaved, bpFaced).
+        half_lives (iterable): Các chu kỳ bán rã (số trận), vd. (5, 10, 25).
+        state (ServeState): Trạng thái sau các chunk trước (chế độ streaming), được cập nhật tại chỗ.
+                            Phép tính giống hệt từng bước nên kết quả giống hệt khi tính trên toàn bộ lịch sử.
+    Returns:
+        DataFrame: Các cột winner_/loser_{serve_pct, return_pct, ace_rate, bp_save_pct}[_hl{h}], cùng index với df.
+    """
+    half_lives = list(half_lives)
+    n = len(df)
+    player = np.concatenate([df['winner_id'].to_numpy(), df['loser_id'].to_numpy()])
+    sums = np.concatenate([_side_sums(df, 'w', 'l'), _side_sums(df, 'l', 'w')])
+    pos = np.tile(np.arange(n), 2)
+
+    # Thứ tự trận trong từng cầu thủ (t) và hạng cầu thủ theo số trận giảm dần
+    order = np.lexsort((pos, player))
+    players, starts, counts = np.unique(player[order], return_index=True, return_counts=True)
+    rank_of = np.empty(len(players), dtype=np.int64)
+    by_count = np.argsort(-counts, kind='stable')
+    rank_of[by_count] = np.arange(len(players))
+    group = np.repeat(np.arange(len(players)), counts)
+    t = np.arange(len(order)) - starts[group]
+    step_order = np.lexsort((rank_of[group], t))
+    rows = order[step_order]  # dòng của bảng dài theo (bước, hạng cầu thủ)
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(t))])
+    x = sums[rows][:, None, :]
+    del sums
+
+    ranked_players = players[by_count].tolist()
+    decay = np.array([0.5 ** (1 / h) for h in half_lives])[:, None]
+    state_sums = np.zeros((len(players), len(half_lives), len(SUM_COLUMNS)))
+    if state is not None:
+        for i, p in enumerate(ranked_players):
+            prev = state.sums.get(p)
+            if prev is not None:
+                state_sums[i] = prev
+
+    # prior[j] = các tổng TRƯỚC trận của dòng rows[j]
+    prior = np.empty((len(rows), len(half_lives), len(SUM_COLUMNS)))
+    for step in range(len(bounds) - 1):
+        lo, hi = bounds[step], bounds[step + 1]
+        active = state_sums[:hi - lo]
+        prior[lo:hi] = active
+        active *= decay
+        active += x[lo:hi]
+
+    if state is not None:
+        for i, p in enumerate(ranked_players):
+            state.sums[p] = state_sums[i].copy()
+
+    out = {}
+    for h, half_life in enumerate(half_lives):
+        for stat, (num, den) in SERVE_STATS.items():
+            num_v = prior[:, h, SUM_COLUMNS.index(num)]
+            den_v = prior[:, h, SUM_COLUMNS.index(den)]
+            values = np.empty(2 * n)
+            values[rows] = np.divide(num_v, den_v, out=np.zeros(len(rows)), where=den_v > 0)
+            name = serve_feature(stat, half_life)
+            out[f'winner_{name}'] = values[:n]
+            out[f'loser_{name}'] = values[n:]
+    return pd.DataFrame(out, index=df.index)
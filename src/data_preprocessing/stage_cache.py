@@ -0,0 +1,101 @@
+import pandas as pd
+import glob, os, sys, json, hashlib, inspect, time, shutil
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../model'))
+from telemetry import TELEMETRY
+
+# Thứ tự các stage của pipeline tiền xử lý
+STAGES = ['load', 'rolling', 'context', 'serve', 'restructure', 'elo', 'finalize']
+
+
+def code_version(*objs):
+    """Hash mã nguồn của các hàm/module/lớp mà một stage phụ thuộc vào."""
+    h = hashlib.sha256()
+    for obj in objs:
+        h.update(inspect.getsource(obj).encode())
+    return h.hexdigest()
+
+
+class StageCache:
+    """
+    Cache kết quả từng stage theo fingerprint = hash(tên stage, tham số, fingerprint stage trước, phiên bản code).
+    Stage có fingerprint không đổi sẽ được nạp lại từ đĩa thay vì chạy lại.
+    """
+
+    def __init__(self, cache_dir, enabled=True, force=()):
+        """
+        Args:
+            cache_dir (str): Thư mục lưu kết quả stage (.pkl).
+            enabled (bool): False để luôn chạy lại và không ghi cache.
+            force (iterable): Các stage bắt buộc chạy lại (kết quả mới ghi đè cache).
+        """
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.force = set(force)
+        if enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(stage, params, upstream, code):
+        payload = json.dumps({'stage': stage, 'params': params, 'upstream': upstream, 'code': code},
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def _path(self, stage, fp):
+        return os.path.join(self.cache_dir, f'{stage}-{fp}.pkl')
+
+    def _output_path(self, stage, fp, name, path):
+        """File output phụ đã cache, vd. elo-<fp>-snapshot_path.npz."""
+        return os.path.join(self.cache_dir, f'{stage}-{fp}-{name}{os.path.splitext(path)[1]}')
+
+    def invalidate(self, stage):
+        """Xóa mọi kết quả (kèm output phụ) đã cache của một stage."""
+        removed = glob.glob(os.path.join(self.cache_dir, f'{stage}-*.pkl'))
+        removed += glob.glob(os.path.join(self.cache_dir, f'{stage}-*-*'))
+        for path in removed:
+            os.remove(path)
+        print(f"[cache] {stage}: đã xóa {len(removed)} kết quả.")
+
+    def run(self, stage, func, *args, params=None, upstream=None, code_deps=(), outputs=(), **kwargs):
+        """
+        Chạy func(*args, **params, **kwargs) hoặc nạp kết quả từ cache.
+        Chỉ params, upstream (fingerprint stage trước hoặc chữ ký dữ liệu đầu vào) và code
+        (func + code_deps) tham gia vào fingerprint; kwargs thì không (ví dụ đường dẫn output phụ).
+
+        Args:
+            outputs (iterable): Tên các kwarg là đường dẫn file mà func ghi ra (vd. snapshot_path).
+                                File được cache cùng fingerprint và chép lại đúng chỗ khi dùng lại cache,
+                                để output phụ luôn khớp với kết quả của stage.
+
+        Returns:
+            (DataFrame, str): Kết quả và fingerprint của stage (dùng làm upstream cho stage sau).
+        """
+        params = params or {}
+        fp = self.fingerprint(stage, params, upstream, code_version(func, *code_deps))
+        path = self._path(stage, fp)
+        rows_in = len(args[0]) if args and isinstance(args[0], pd.DataFrame) else None
+        outputs = {name: kwargs[name] for name in outputs if kwargs.get(name)}
+        cached_outputs = {name: self._output_path(stage, fp, name, out) for name, out in outputs.items()}
+
+        if (self.enabled and stage not in self.force and os.path.exists(path)
+                and all(os.path.exists(cached) for cached in cached_outputs.values())):
+            with TELEMETRY.record(stage, rows_in=rows_in, func=func.__name__, cached=True) as rec:
+                start = time.perf_counter()
+                result = pd.read_pickle(path)
+                for name, cached in cached_outputs.items():
+                    shutil.copyfile(cached, outputs[name])
+                rec['rows_out'] = len(result)
+            print(f"[cache] {stage}: dùng lại kết quả {fp} ({time.perf_counter() - start:.2f}s).")
+            return result, fp
+
+        with TELEMETRY.record(stage, rows_in=rows_in, func=func.__name__, cached=False) as rec:
+            start = time.perf_counter()
+            result = func(*args, **params, **kwargs)
+            elapsed = time.perf_counter() - start
+            rec['rows_out'] = len(result)
+        if self.enabled:
+            result.to_pickle(path)
+            for name, cached in cached_outputs.items():
+                shutil.copyfile(outputs[name], cached)
+        print(f"[stage] {stage}: chạy xong trong {elapsed:.2f}s ({fp}).")
+        return result, fp
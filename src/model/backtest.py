@@ -0,0 +1,177 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from threadpoolctl import threadpool_limits
+from sklearn.metrics import accuracy_score, roc_auc_score, log_loss
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from model_training import ModelTrainer, SVM_MODES, is_threaded
+from feature_store import load_feature_store, DEFAULT_STORE_PATH
+
+# Feature store đã mở trong mỗi tiến trình con (memory-map, không sao chép giữa các fold)
+_STORES = {}
+
+
+def walk_forward_folds(dates, freq='M', min_train_rows=2000):
+    """
+    Chia dữ liệu (đã sắp xếp theo ngày) thành các block liên tiếp theo chu kỳ freq
+    ('W', 'M', 'Q', 'Y' hoặc 'tourney' - mỗi ngày khởi tranh một block).
+    Fold k huấn luyện trên mọi dòng trước block k (cửa sổ mở rộng) và đánh giá trên block k.
+
+    Returns:
+        list[(str, int, int)]: (nhãn chu kỳ, train_end, test_end) - chỉ số dòng, không sao chép dữ liệu.
+    """
+    dates = pd.DatetimeIndex(dates)
+    labels = dates.astype(str) if freq == 'tourney' else dates.to_period(freq).astype(str)
+    labels = np.asarray(labels)
+    bounds = np.concatenate([[0], np.flatnonzero(labels[1:] != labels[:-1]) + 1, [len(labels)]])
+    return [(labels[start], int(start), int(end))
+            for start, end in zip(bounds[:-1], bounds[1:]) if start >= min_train_rows]
+
+
+def _score(y_true, y_prob):
+    y_true = np.asarray(y_true)
+    both_classes = len(np.unique(y_true)) == 2
+    return {
+        'n': len(y_true),
+        'Accuracy': accuracy_score(y_true, y_prob >= 0.5),
+        'Log Loss': log_loss(y_true, y_prob, labels=[0, 1]),
+        'ROC-AUC': roc_auc_score(y_true, y_prob) if both_classes else np.nan
+    }
+
+
+def _run_chunk(store_path, folds, model_names, svm_mode, random_state, threads):
+    """
+    Fit các pipeline một lần trên dữ liệu trước fold đầu tiên của chunk rồi chấm điểm lần lượt
+    từng fold trong chunk (refit_every fold dùng chung một model).
+    """
+    if store_path not in _STORES:
+        _STORES[store_path] = load_feature_store(store_path)
+    store = _STORES[store_path]
+    X, y = store.X, store.y
+    train_end = folds[0][1]
+    pipelines = ModelTrainer(random_state=random_state, svm_mode=svm_mode).pipelines
+
+    probs, fit_seconds = {}, {}
+    with threadpool_limits(limits=threads):
+        for name in model_names:
+            pipe = pipelines[name]
+            if is_threaded(pipe):
+                pipe.named_steps['model'].set_params(n_jobs=threads)
+            start = time.perf_counter()
+            pipe.fit(X[:train_end], y[:train_end].astype(int))
+            fit_seconds[name] = time.perf_counter() - start
+            probs[name] = [pipe.predict_proba(X[start_row:end_row])[:, 1] for _, start_row, end_row in folds]
+
+    rows = []
+    for k, (period, start_row, end_row) in enumerate(folds):
+        y_true = y[start_row:end_row].astype(int)
+        fold_probs = {name: probs[name][k] for name in model_names}
+        fold_probs['Soft Voting'] = np.mean(list(fold_probs.values()), axis=0)
+        for name, y_prob in fold_probs.items():
+            rows.append({'period': period, 'model': name, 'train_rows': train_end,
+                         'fit_seconds': fit_seconds.get(name, 0.0), **_score(y_true, y_prob)})
+    return rows
+
+
+def walk_forward_backtest(store_path=DEFAULT_STORE_PATH, freq='M', min_train_rows=2000, refit_every=1,
+                          model_names=None, svm_mode='nystroem', max_workers=None, random_state=42):
+    """
+    Backtest walk-forward: ở mỗi bước huấn luyện lại các pipeline của ModelTrainer trên cửa sổ mở rộng
+    và chấm điểm block tiếp theo. Các fold chạy song song theo tiến trình; mỗi tiến trình memory-map
+    cùng một feature store thay vì dựng lại feature.
+
+    Args:
+        refit_every (int): Huấn luyện lại sau mỗi refit_every fold (các fold ở giữa dùng model gần nhất)
+                           - giữ hàng trăm fold ở mức chi phí chấp nhận được.
+        model_names (list): Tập con các model của ModelTrainer (mặc định: tất cả).
+        svm_mode (str): Chế độ SVM (mặc định 'nystroem' - SVC chính xác quá chậm cho nhiều fold).
+        max_workers (int): Số tiến trình (mặc định: mọi core).
+
+    Returns:
+        DataFrame: Chỉ số theo (chu kỳ, model): n, Accuracy, Log Loss, ROC-AUC, ...
+    """
+    store = load_feature_store(store_path)
+    if store.dates is None:
+        raise ValueError("Feature store không có cột ngày, không thể backtest theo thời gian.")
+    if (np.diff(store.dates) < np.timedelta64(0)).any():
+        raise ValueError("Feature store chưa được sắp xếp theo ngày; hãy chạy lại tiền xử lý.")
+    model_names = model_names or list(ModelTrainer(svm_mode=svm_mode).pipelines)
+
+    folds = walk_forward_folds(store.dates, freq, min_train_rows)
+    chunks = [folds[i:i + refit_every] for i in range(0, len(folds), refit_every)]
+    max_workers = min(max_workers or os.cpu_count(), len(chunks)) or 1
+    threads = max((os.cpu_count() or 1) // max_workers, 1)
+    print(f"Backtest walk-forward: {len(folds)} fold ({freq}), {len(chunks)} lần huấn luyện, "
+          f"{max_workers} tiến trình x {threads} luồng.")
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Chunk muộn (cửa sổ train lớn nhất) chạy trước để các tiến trình xong gần cùng lúc
+        futures = [executor.submit(_run_chunk, store_path, chunk, model_names, svm_mode, random_state, threads)
+                   for chunk in reversed(chunks)]
+        for done, future in enumerate(as_completed(futures), 1):
+            rows.extend(future.result())
+            if done % 10 == 0 or done == len(futures):
+                print(f"  {done}/{len(futures)} lần huấn luyện xong ({time.perf_counter() - start:.1f}s)")
+
+    return pd.DataFrame(rows).sort_values(['period', 'model'], ignore_index=True)
+
+
+def summarize(results):
+    """Trung bình các chỉ số của từng model, trọng số theo số trận của mỗi chu kỳ."""
+    has_auc = results['ROC-AUC'].notna()
+    weighted = pd.DataFrame({
+        'model': results['model'],
+        'folds': 1,
+        'n': results['n'],
+        'Accuracy': results['Accuracy'] * results['n'],
+        'Log Loss': results['Log Loss'] * results['n'],
+        'ROC-AUC': results['ROC-AUC'].where(has_auc, 0) * results['n'],
+        'n_auc': results['n'].where(has_auc, 0)
+    }).groupby('model').sum()
+    for col in ['Accuracy', 'Log Loss']:
+        weighted[col] /= weighted['n']
+    weighted['ROC-AUC'] /= weighted.pop('n_auc').replace(0, np.nan)
+    weighted['Accuracy std'] = results.groupby('model')['Accuracy'].std()
+    return weighted.sort_values('Accuracy', ascending=False)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest walk-forward các mô hình dự đoán ATP.")
+    parser.add_argument('data', nargs='?', default=DEFAULT_STORE_PATH, help="Feature store đã xử lý.")
+    parser.add_argument('--freq', default='M', help="Chu kỳ mỗi fold: W, M, Q, Y hoặc tourney.")
+    parser.add_argument('--min-train-rows', type=int, default=2000,
+                        help="Số dòng huấn luyện tối thiểu trước fold đầu tiên.")
+    parser.add_argument('--refit-every', type=int, default=1, help="Huấn luyện lại sau mỗi N fold.")
+    parser.add_argument('--models', nargs='+', default=None, help="Tập con model (mặc định: tất cả).")
+    parser.add_argument('--svm-mode', choices=SVM_MODES, default='nystroem')
+    parser.add_argument('--workers', type=int, default=None, help="Số tiến trình song song.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        results = walk_forward_backtest(args.data, args.freq, args.min_train_rows, args.refit_every,
+                                        args.models, args.svm_mode, args.workers)
+    except (FileNotFoundError, ValueError) as e:
+        print(e)
+        return
+
+    print("\n--- BACKTEST WALK-FORWARD (TRUNG BÌNH THEO SỐ TRẬN) ---")
+    print(summarize(results))
+
+    result_path = os.path.normpath(os.path.join(current_dir, "../../backtest_results.csv"))
+    results.to_csv(result_path, index=False)
+    print(f"\nĐã lưu chỉ số theo chu kỳ tại: {result_path}")
+
+if __name__ == "__main__":
+    main()
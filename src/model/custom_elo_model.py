@@ -1,8 +1,136 @@
 import pandas as pd
 import numpy as np
+import itertools
+import time
+
+def _elo_kernel(p1_idx, p2_idx, surf_idx, p1_won, overall, surface, k_factor, surface_weight):
+    """
+    Vòng lặp cập nhật Elo tuần tự trên list số thuần (không đụng tới pandas).
+    Thứ tự phép tính giữ nguyên như _get_elo/_update_elo để kết quả trùng khớp từng bit.
+
+    Args:
+        p1_idx, p2_idx, surf_idx, p1_won (list): Chỉ số nguyên của từng trận (đã sắp xếp theo thời gian).
+        overall (list): Elo tổng quát theo chỉ số cầu thủ, được cập nhật tại chỗ.
+        surface (list[list]): Elo mặt sân [cầu thủ][mặt sân], được cập nhật tại chỗ.
+    Returns:
+        (list, list): Elo kết hợp của P1 và P2 TRƯỚC mỗi trận.
+    """
+    w_overall = 1 - surface_weight
+    n = len(p1_idx)
+    p1_elos = [0.0] * n
+    p2_elos = [0.0] * n
+    
+    for i in range(n):
+        a, b, s = p1_idx[i], p2_idx[i], surf_idx[i]
+        a_surf, b_surf = surface[a], surface[b]
+        a_over, b_over = overall[a], overall[b]
+        a_s, b_s = a_surf[s], b_surf[s]
+        
+        a_final = w_overall * a_over + surface_weight * a_s
+        b_final = w_overall * b_over + surface_weight * b_s
+        p1_elos[i] = a_final
+        p2_elos[i] = b_final
+        
+        if p1_won[i] == 1:
+            delta = k_factor * (1 - 1 / (1 + 10 ** ((b_final - a_final) / 400)))
+        else:
+            delta = -(k_factor * (1 - 1 / (1 + 10 ** ((a_final - b_final) / 400))))
+        
+        overall[a] = a_over + delta
+        overall[b] = b_over - delta
+        a_surf[s] = a_s + delta
+        b_surf[s] = b_s - delta
+    
+    return p1_elos, p2_elos
+
+def _independent_levels(p1_idx, p2_idx):
+    """
+    Gán mỗi trận vào một "tầng": trận của một cầu thủ luôn ở tầng sau mọi trận trước đó của cầu thủ ấy,
+    nên các trận cùng tầng không chung cầu thủ và có thể cập nhật đồng thời mà vẫn giữ đúng thứ tự thời gian.
+    """
+    last = {}
+    levels = [0] * len(p1_idx)
+    for i, (a, b) in enumerate(zip(p1_idx, p2_idx)):
+        level = max(last.get(a, -1), last.get(b, -1)) + 1
+        levels[i] = last[a] = last[b] = level
+    return np.asarray(levels)
+
+def sweep_elo(df, k_factors=(20,), surface_weights=(0.5,), start_elos=(1500,), burn_in=0):
+    """
+    Đánh giá cả lưới cấu hình Elo (k_factor x surface_weight x start_elo) trong MỘT lượt duyệt lịch sử.
+    Điểm của mọi cấu hình được giữ trong mảng [cầu thủ x cấu hình] (và [cầu thủ*mặt sân x cấu hình]);
+    các trận không chung cầu thủ được cập nhật cùng lúc (xem _independent_levels), mỗi phép tính vector hóa
+    trên toàn bộ cấu hình. Kết quả trùng với TennisEloModel.fit_transform của từng cấu hình (sai số làm tròn).
+    start_elo không ảnh hưởng tới xác suất (chỉ hiệu số điểm quan trọng) nên các cấu hình chỉ khác
+    start_elo dùng chung một lần tính.
+
+    Args:
+        df (DataFrame): Dữ liệu đã restructure (p1_id, p2_id, surface, target, tourney_date, match_num).
+        burn_in (int): Bỏ qua n trận đầu tiên khi tính chỉ số (Elo chưa ổn định).
+    Returns:
+        DataFrame: Mỗi cấu hình một dòng: log_loss, brier, accuracy của xác suất P1 thắng TRƯỚC trận.
+    """
+    df = df.sort_values(by=['tourney_date', 'match_num']).reset_index(drop=True)
+    player_index = pd.Index(pd.unique(np.concatenate([df['p1_id'].to_numpy(dtype=object),
+                                                      df['p2_id'].to_numpy(dtype=object)])))
+    surface_index = pd.Index(pd.unique(df['surface'].to_numpy(dtype=object)))
+    p1_idx = player_index.get_indexer(df['p1_id'].to_numpy(dtype=object))
+    p2_idx = player_index.get_indexer(df['p2_id'].to_numpy(dtype=object))
+    surf_idx = surface_index.get_indexer(df['surface'].to_numpy(dtype=object))
+    n_surf = len(surface_index)
+    p1_surf, p2_surf = p1_idx * n_surf + surf_idx, p2_idx * n_surf + surf_idx
+    p1_won = df['target'].to_numpy() == 1
+    scored = np.arange(len(df)) >= burn_in
+
+    configs = list(itertools.product(k_factors, surface_weights))
+    k = np.array([c[0] for c in configs], dtype=np.float64)
+    w = np.array([c[1] for c in configs], dtype=np.float64)
+    # Mọi cấu hình dùng chung điểm khởi đầu start_elos[0]; xem ghi chú về start_elo ở trên
+    overall = np.full((len(player_index), len(configs)), float(start_elos[0]))
+    surface = np.full((len(player_index) * n_surf, len(configs)), float(start_elos[0]))
+    loss, brier, correct = (np.zeros(len(configs)) for _ in range(3))
+
+    start = time.perf_counter()
+    levels = _independent_levels(p1_idx.tolist(), p2_idx.tolist())
+    order = np.argsort(levels, kind='stable')
+    bounds = np.flatnonzero(np.diff(levels[order])) + 1
+    for rows in np.split(order, bounds):
+        a, b, sa, sb = p1_idx[rows], p2_idx[rows], p1_surf[rows], p2_surf[rows]
+        a_over, b_over, a_s, b_s = overall[a], overall[b], surface[sa], surface[sb]
+        a_final = (1 - w) * a_over + w * a_s
+        b_final = (1 - w) * b_over + w * b_s
+
+        # Cùng công thức với _elo_kernel (mỗi bên tính xác suất thắng của mình)
+        prob = 1 / (1 + 10 ** ((b_final - a_final) / 400))
+        won = p1_won[rows][:, None]
+        delta = np.where(won, k * (1 - prob), -(k * (1 - 1 / (1 + 10 ** ((a_final - b_final) / 400)))))
+
+        keep = scored[rows]
+        if keep.any():
+            p, y = prob[keep], won[keep]
+            loss -= np.where(y, np.log(np.clip(p, 1e-15, 1)), np.log(np.clip(1 - p, 1e-15, 1))).sum(axis=0)
+            brier += ((p - y) ** 2).sum(axis=0)
+            correct += ((p >= 0.5) == y).sum(axis=0)
+
+        overall[a] = a_over + delta
+        overall[b] = b_over - delta
+        surface[sa] = a_s + delta
+        surface[sb] = b_s - delta
+    elapsed = time.perf_counter() - start
+
+    n_scored = int(scored.sum())
+    print(f"Đã quét {len(configs)} cấu hình Elo trên {len(df)} trận ({len(bounds) + 1} tầng) "
+          f"trong {elapsed:.2f}s.")
+    rows = []
+    for start_elo in start_elos:
+        for j, (k_factor, surface_weight) in enumerate(configs):
+            rows.append({'k_factor': k_factor, 'surface_weight': surface_weight, 'start_elo': start_elo,
+                         'log_loss': loss[j] / n_scored, 'brier': brier[j] / n_scored,
+                         'accuracy': correct[j] / n_scored})
+    return pd.DataFrame(rows)
 
 class TennisEloModel:
-    def __init__(self, k_factor=32, surface_weight=0.5, start_elo=1500):
+    def __init__(self, k_factor=32, surface_weight=0.5, start_elo=1500, engine='array'):
         """
         Args:
             k_factor (int): Hệ số K - độ nhạy của điểm Elo (K càng lớn, điểm càng biến động mạnh).
@@ -10,16 +138,24 @@ class TennisEloModel:
                                     Nếu 0.0: Chỉ dùng Elo tổng quát.
                                     Nếu 1.0: Chỉ dùng Elo mặt sân.
             start_elo (int): Điểm khởi đầu cho người mới.
+            engine (str): 'array' - intern ID/mặt sân thành chỉ số nguyên và chạy kernel trên mảng (nhanh).
+                          'dict' - duyệt iterrows với dict lồng nhau (cài đặt gốc, dùng để đối chiếu).
         """
+        if engine not in ('array', 'dict'):
+            raise ValueError(f"engine không hợp lệ: {engine} (chỉ hỗ trợ 'array' hoặc 'dict')")
         self.k_factor = k_factor
         self.surface_weight = surface_weight
         self.start_elo = start_elo
+        self.engine = engine
         
         # Lưu trữ Elo tổng quát: {player_id: elo_score}
         self.overall_elo = {}
         
         # Lưu trữ Elo theo mặt sân: {player_id: {surface: elo_score}}
         self.surface_elo = {}
+        
+        # Mốc (tourney_date, match_num) của trận cuối cùng đã xử lý
+        self.watermark = None
 
     def _get_elo(self, player_id, surface):
         """Lấy điểm Elo hiện tại của cầu thủ (kết hợp Overall và Surface)."""
@@ -36,6 +172,12 @@ class TennisEloModel:
         final_elo = (1 - self.surface_weight) * overall + self.surface_weight * s_elo
         return final_elo, overall, s_elo
 
+    def rating(self, player_id, surface):
+        """Elo kết hợp hiện tại của cầu thủ (không thay đổi trạng thái), dùng cho dự đoán online."""
+        overall = self.overall_elo.get(player_id, self.start_elo)
+        s_elo = self.surface_elo.get(player_id, {}).get(surface, self.start_elo)
+        return (1 - self.surface_weight) * overall + self.surface_weight * s_elo
+
     def _update_elo(self, w_id, l_id, surface):
         """Cập nhật điểm Elo sau mỗi trận đấu."""
         # Lấy điểm hiện tại
@@ -64,18 +206,153 @@ class TennisEloModel:
         self.surface_elo[w_id][surface] = w_surf + delta
         self.surface_elo[l_id][surface] = l_surf - delta
 
-    def fit_transform(self, df):
+    def fit_transform(self, df, copy=True):
         """
         Chạy mô hình trên toàn bộ dữ liệu lịch sử để sinh ra feature Elo.
         QUAN TRỌNG: Dữ liệu phải được sắp xếp theo thời gian trước!
+        
+        Args:
+            copy (bool): False để thêm cột Elo trực tiếp vào df (không sao chép frame) khi df đã
+                         theo thứ tự thời gian; nếu chưa, df vẫn được sắp xếp sang một frame mới.
         """
         print(f"--- ĐANG TÍNH TOÁN ELO (K={self.k_factor}, Surface Weight={self.surface_weight}) ---")
         
         # Đảm bảo dữ liệu đã sort
         if 'tourney_date' in df.columns:
-            df = df.sort_values(by=['tourney_date', 'match_num']).reset_index(drop=True)
+            if copy or not self._in_order(df).all():
+                df = df.sort_values(by=['tourney_date', 'match_num']).reset_index(drop=True)
+                copy = False
+            else:
+                df.reset_index(drop=True, inplace=True)
+        
+        df_new = self._transform(df, copy=copy)
+        self._set_watermark(df_new)
+        return df_new
+
+    def partial_fit(self, df):
+        """
+        Cập nhật tăng dần: chỉ áp dụng các trận SAU watermark, tiếp tục từ trạng thái hiện tại
+        (ví dụ sau khi load_state). Các trận có mốc <= watermark được coi là đã xử lý và bỏ qua.
+        Dữ liệu phải đã được sắp xếp theo (tourney_date, match_num), nếu không sẽ bị từ chối.
+        
+        Returns:
+            DataFrame: Các trận mới kèm p1_elo, p2_elo, elo_diff.
+        """
+        in_order = self._in_order(df)
+        if not in_order.all():
+            pos = int(np.argmin(in_order)) + 1
+            raise ValueError(f"Dữ liệu không theo thứ tự thời gian tại dòng {pos}: "
+                             f"hãy sắp xếp theo (tourney_date, match_num) trước khi partial_fit.")
+        
+        if self.watermark is not None:
+            dates, nums = self._match_keys(df)
+            w_date, w_num = np.datetime64(self.watermark[0], 'ns'), self.watermark[1]
+            is_new = (dates > w_date) | ((dates == w_date) & (nums > w_num))
+            n_skipped = int((~is_new).sum())
+            if n_skipped:
+                print(f"Bỏ qua {n_skipped} trận đã xử lý (<= watermark {self.watermark[0].date()}, #{w_num}).")
+            df = df[is_new]
+        df = df.reset_index(drop=True)
+        
+        print(f"--- CẬP NHẬT ELO TĂNG DẦN ({len(df)} trận mới) ---")
+        df_new = self._transform(df)
+        self._set_watermark(df_new)
+        return df_new
+
+    def _transform(self, df, copy=True):
+        """Chạy engine đã chọn trên df (đã sort) và gắn các cột Elo TRƯỚC trận (vào bản sao nếu copy)."""
+        start = time.perf_counter()
+        if self.engine == 'array':
+            p1_elos, p2_elos = self._run_array(df)
+        else:
+            p1_elos, p2_elos = self._run_dict(df)
+        elapsed = time.perf_counter() - start
+        
+        # Thêm cột vào DataFrame
+        df_new = df.copy() if copy else df
+        df_new['p1_elo'] = p1_elos
+        df_new['p2_elo'] = p2_elos
+        df_new['elo_diff'] = df_new['p1_elo'] - df_new['p2_elo']
+        
+        rate = len(df) / elapsed if elapsed > 0 else float('inf')
+        print(f"Đã tính xong Elo ({len(df)} trận, {rate:,.0f} trận/giây, engine={self.engine}).")
+        return df_new
+
+    @classmethod
+    def _in_order(cls, df):
+        """Mảng bool: trận i+1 không đứng trước trận i theo (tourney_date, match_num)."""
+        dates, nums = cls._match_keys(df)
+        return (dates[1:] > dates[:-1]) | ((dates[1:] == dates[:-1]) & (nums[1:] >= nums[:-1]))
+
+    @staticmethod
+    def _match_keys(df):
+        """Trả về (tourney_date dạng datetime64[ns], match_num) của từng trận."""
+        dates = pd.to_datetime(df['tourney_date']).to_numpy(dtype='datetime64[ns]')
+        nums = df['match_num'].to_numpy(dtype=np.int64)
+        return dates, nums
+
+    def _set_watermark(self, df):
+        if len(df) == 0 or 'tourney_date' not in df.columns:
+            return
+        dates, nums = self._match_keys(df.iloc[[-1]])
+        self.watermark = (pd.Timestamp(dates[0]), int(nums[0]))
+
+    def save_state(self, path):
+        """
+        Lưu snapshot trạng thái Elo (tham số, overall_elo, surface_elo, watermark) ra file .npz nén.
+        Elo mặt sân được lưu dưới dạng ma trận [cầu thủ x mặt sân], ô chưa có dữ liệu là NaN.
+        """
+        player_ids = np.asarray(list(self.overall_elo), dtype=np.int64)
+        surfaces = pd.unique(pd.Series(
+            [s for by_surf in self.surface_elo.values() for s in by_surf], dtype=object
+        )).tolist()
+        player_pos = {pid: i for i, pid in enumerate(player_ids.tolist())}
+        surface_pos = {s: j for j, s in enumerate(surfaces) if not pd.isna(s)}
+        # Mặt sân thiếu (NaN) dùng chung một cột
+        nan_col = next((j for j, s in enumerate(surfaces) if pd.isna(s)), None)
+        
+        surface_matrix = np.full((len(player_ids), len(surfaces)), np.nan)
+        for pid, by_surf in self.surface_elo.items():
+            for surf, elo in by_surf.items():
+                col = nan_col if pd.isna(surf) else surface_pos[surf]
+                surface_matrix[player_pos[pid], col] = elo
+        
+        w_date, w_num = self.watermark if self.watermark is not None else (pd.NaT, -1)
+        np.savez_compressed(
+            path,
+            params=np.array([self.k_factor, self.surface_weight, self.start_elo], dtype=np.float64),
+            player_ids=player_ids,
+            overall=np.asarray(list(self.overall_elo.values()), dtype=np.float64),
+            # NaN (mặt sân thiếu) được mã hóa thành chuỗi rỗng
+            surfaces=np.array(['' if pd.isna(s) else s for s in surfaces], dtype=str),
+            surface_elo=surface_matrix,
+            watermark_date=np.array([np.datetime64(w_date, 'ns')]),
+            watermark_match_num=np.array([w_num], dtype=np.int64)
+        )
+
+    @classmethod
+    def load_state(cls, path, engine='array'):
+        """Khôi phục mô hình từ snapshot tạo bởi save_state."""
+        with np.load(path, allow_pickle=False) as snap:
+            k_factor, surface_weight, start_elo = snap['params'].tolist()
+            model = cls(k_factor=k_factor, surface_weight=surface_weight, start_elo=start_elo, engine=engine)
             
-        elo_diffs = []
+            player_ids = snap['player_ids'].tolist()
+            surfaces = [np.nan if s == '' else s for s in snap['surfaces'].tolist()]
+            surface_matrix = snap['surface_elo']
+            
+            model.overall_elo = dict(zip(player_ids, snap['overall'].tolist()))
+            for i, pid in enumerate(player_ids):
+                row = surface_matrix[i]
+                model.surface_elo[pid] = {surfaces[j]: float(row[j]) for j in np.flatnonzero(~np.isnan(row))}
+            
+            w_date = snap['watermark_date'][0]
+            if not np.isnat(w_date):
+                model.watermark = (pd.Timestamp(w_date), int(snap['watermark_match_num'][0]))
+        return model
+
+    def _run_dict(self, df):
+        """Engine 'dict': duyệt từng dòng bằng iterrows (cài đặt gốc)."""
         p1_elos = []
         p2_elos = []
         
@@ -95,20 +372,61 @@ class TennisEloModel:
             # Lưu vào list để thêm vào DataFrame
             p1_elos.append(p1_final)
             p2_elos.append(p2_final)
-            elo_diffs.append(p1_final - p2_final)
             
             # Cập nhật Elo SAU trận đấu (cho trận tiếp theo)
             if target == 1:
                 self._update_elo(p1_id, p2_id, surface)
             else:
                 self._update_elo(p2_id, p1_id, surface)
-                
-        # Thêm cột vào DataFrame
-        df_new = df.copy()
-        df_new['p1_elo'] = p1_elos
-        df_new['p2_elo'] = p2_elos
-        df_new['elo_diff'] = elo_diffs
         
-        print("Đã tính xong Elo cho toàn bộ lịch sử.")
-        return df_new
+        return p1_elos, p2_elos
+
+    def _run_array(self, df):
+        """
+        Engine 'array': intern player ID và mặt sân thành chỉ số nguyên dày đặc,
+        chạy _elo_kernel trên mảng rồi ghi trạng thái ngược lại vào overall_elo/surface_elo.
+        Trạng thái có sẵn (từ lần chạy trước) được dùng làm điểm xuất phát.
+        """
+        # Intern ID: cầu thủ/mặt sân đã biết đứng trước, cầu thủ/mặt sân mới nối tiếp theo
+        known_surfaces = [s for by_surf in self.surface_elo.values() for s in by_surf]
+        player_index = pd.Index(pd.unique(np.concatenate([
+            np.asarray(list(self.overall_elo), dtype=object),
+            df['p1_id'].to_numpy(dtype=object),
+            df['p2_id'].to_numpy(dtype=object)
+        ])))
+        # Mặt sân thiếu (NaN) được xem là một nhóm mặt sân riêng, giống engine 'dict'
+        surface_index = pd.Index(pd.unique(np.concatenate([
+            np.asarray(known_surfaces, dtype=object),
+            df['surface'].to_numpy(dtype=object)
+        ])))
+        
+        p1_idx = player_index.get_indexer(df['p1_id'].to_numpy(dtype=object))
+        p2_idx = player_index.get_indexer(df['p2_id'].to_numpy(dtype=object))
+        surf_idx = surface_index.get_indexer(df['surface'].to_numpy(dtype=object))
+        
+        # Nạp trạng thái hiện tại vào mảng
+        overall = [self.overall_elo.get(pid, self.start_elo) for pid in player_index]
+        surface = [[self.start_elo] * len(surface_index) for _ in range(len(player_index))]
+        for pid, by_surf in self.surface_elo.items():
+            if not by_surf:
+                continue
+            row = surface[player_index.get_loc(pid)]
+            for surf, elo in by_surf.items():
+                row[surface_index.get_loc(surf)] = elo
+        
+        p1_elos, p2_elos = _elo_kernel(
+            p1_idx.tolist(), p2_idx.tolist(), surf_idx.tolist(),
+            df['target'].to_numpy().tolist(),
+            overall, surface, self.k_factor, self.surface_weight
+        )
+        
+        # Ghi trạng thái ngược lại vào dict (chỉ những cặp cầu thủ-mặt sân đã xuất hiện)
+        self.overall_elo = dict(zip(player_index, overall))
+        n_surf = len(surface_index)
+        played = np.unique(np.concatenate([p1_idx, p2_idx]) * n_surf + np.concatenate([surf_idx, surf_idx]))
+        players, surfaces = player_index.to_numpy(), surface_index.to_numpy()
+        for p, s in zip((played // n_surf).tolist(), (played % n_surf).tolist()):
+            self.surface_elo.setdefault(players[p], {})[surfaces[s]] = surface[p][s]
+        
+        return p1_elos, p2_elos
 
@@ -0,0 +1,325 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from custom_elo_model import TennisEloModel
+
+# Số lần mô phỏng mỗi lô (giới hạn bộ nhớ: lô x draw_size chỉ số + số ngẫu nhiên)
+DEFAULT_BATCH_SIZE = 16_384
+
+
+def round_names(draw_size):
+    """Tên các vòng của một nhánh đấu draw_size (lũy thừa của 2): R128, ..., QF, SF, F và W (vô địch)."""
+    names = []
+    size = draw_size
+    while size >= 2:
+        names.append({8: 'QF', 4: 'SF', 2: 'F'}.get(size, f'R{size}'))
+        size //= 2
+    return names + ['W']
+
+
+def _seed_positions(draw_size, n_seeds):
+    """
+    Vị trí (dòng trong nhánh đấu) của các nhóm hạt giống theo cách xếp chuẩn: hạt giống 1 ở đầu, 2 ở cuối,
+    nhóm 3-4 ở hai dòng quanh ranh giới hai nửa, nhóm 5-8 quanh ranh giới các phần tư, ...
+    Trong một nhóm, hạt giống được bốc thăm ngẫu nhiên vào các vị trí của nhóm.
+
+    Returns:
+        list[list[int]]: Vị trí của từng nhóm (nhóm 1, nhóm 2, nhóm 3-4, nhóm 5-8, ...).
+    """
+    groups = [[0], [draw_size - 1]]
+    sections = 2
+    while sum(len(g) for g in groups) < n_seeds and draw_size // sections >= 2:
+        step = draw_size // sections
+        groups.append([p for b in range(step, draw_size, 2 * step) for p in (b - 1, b)])
+        sections *= 2
+    return groups
+
+
+def _redraw(base, groups, bye, rng, size):
+    """
+    size lần bốc thăm từ nhánh đấu base (mảng chỉ số, bye = giá trị bye) theo các nhóm hạt giống của make_draw:
+    hạt giống mỗi nhóm được bốc vào một tập con ngẫu nhiên của MỌI vị trí của nhóm (kể cả nhóm cuối chưa đủ người),
+    bye đi theo hạt giống nhận bye, cầu thủ không hạt giống được xếp ngẫu nhiên vào các vị trí còn lại.
+
+    Returns:
+        ndarray: (size, len(base)) - mỗi dòng một nhánh đấu.
+    """
+    rows = np.arange(size)[:, None]
+    draw = np.full((size, len(base)), bye, dtype=base.dtype)
+    taken = np.zeros((size, len(base)), dtype=bool)
+    seeded = np.zeros(len(base), dtype=bool)
+    for positions, n_seeds, n_byes in groups:
+        new = positions[rng.random((size, len(positions))).argsort(axis=1)[:, :n_seeds]]
+        draw[rows, new] = base[positions[:n_seeds]]
+        taken[rows, new] = True
+        # Vị trí bye (đối thủ vòng đầu của hạt giống nhận bye) giữ giá trị bye
+        taken[rows, new[:, :n_byes] ^ 1] = True
+        seeded[positions[:n_seeds]] = True
+    others = base[~seeded & (base != bye)]
+    # Vị trí còn trống của từng lần bốc thăm (cùng số lượng ở mọi dòng), theo thứ tự tăng dần
+    free = np.argsort(taken, axis=1, kind='stable')[:, :len(others)]
+    draw[rows, free] = others[rng.random((size, len(others))).argsort(axis=1)]
+    return draw
+
+
+def make_draw(player_ids, seeds=(), draw_size=None, rng=None):
+    """
+    Dựng nhánh đấu từ danh sách cầu thủ và hạt giống (chưa bốc thăm).
+
+    Args:
+        player_ids (list): Các cầu thủ tham dự.
+        seeds (list): Cầu thủ hạt giống theo thứ tự (hạt giống 1 trước), phải nằm trong player_ids.
+        draw_size (int): Kích thước nhánh đấu (mặc định: lũy thừa của 2 nhỏ nhất chứa đủ cầu thủ).
+                         Suất trống (bye) được dành cho các hạt giống cao nhất.
+        rng (np.random.Generator): Nguồn ngẫu nhiên cho lần bốc thăm trả về.
+    Returns:
+        (slots, groups): slots - id cầu thủ theo dòng của nhánh đấu (None = bye) sau một lần bốc thăm;
+                         groups - các nhóm hạt giống (vị trí của nhóm, số hạt giống, số hạt giống nhận bye),
+                         vị trí hạt giống hiện tại đứng đầu theo thứ tự hạt giống; dùng cho redraw (_redraw).
+    """
+    rng = rng or np.random.default_rng()
+    player_ids, seeds = list(player_ids), list(seeds)
+    if len(set(player_ids)) != len(player_ids):
+        raise ValueError("Danh sách cầu thủ có phần tử trùng lặp.")
+    if not set(seeds) <= set(player_ids):
+        raise ValueError("Mọi hạt giống phải có trong danh sách cầu thủ.")
+    draw_size = draw_size or 1 << max(1, int(np.ceil(np.log2(len(player_ids)))))
+    if draw_size & (draw_size - 1) or len(player_ids) > draw_size:
+        raise ValueError(f"draw_size phải là lũy thừa của 2 và >= số cầu thủ ({len(player_ids)}).")
+    n_byes = draw_size - len(player_ids)
+    if n_byes > len(seeds):
+        raise ValueError(f"Cần ít nhất {n_byes} hạt giống để nhận {n_byes} suất bye.")
+
+    # Nhánh đấu mẫu (chỉ số vào entries, bye = len(player_ids)): hạt giống ở các vị trí đầu của nhóm
+    entries = player_ids + [None]
+    index = {pid: i for i, pid in enumerate(player_ids)}
+    bye = len(player_ids)
+    template = np.full(draw_size, bye, dtype=np.int64)
+    groups, group_positions, bye_positions, template_byes, placed = [], set(), set(), set(), 0
+    for positions in _seed_positions(draw_size, len(seeds)):
+        group_seeds = seeds[placed:placed + len(positions)]
+        if not group_seeds:
+            break
+        positions = np.array(positions)
+        template[positions[:len(group_seeds)]] = [index[pid] for pid in group_seeds]
+        group_byes = min(max(n_byes - placed, 0), len(group_seeds))
+        groups.append((positions, len(group_seeds), group_byes))
+        group_positions.update(positions.tolist())
+        if group_byes:
+            bye_positions.update((positions ^ 1).tolist())
+            template_byes.update((positions[:group_byes] ^ 1).tolist())
+        placed += len(group_seeds)
+    # Bye đi theo hạt giống nên không được rơi vào vị trí của bất kỳ nhóm hạt giống nào
+    if bye_positions & group_positions:
+        raise ValueError("Quá nhiều hạt giống so với draw_size: suất bye trùng vị trí hạt giống.")
+    seeded = set(seeds)
+    others = [index[pid] for pid in player_ids if pid not in seeded]
+    free = [p for p in range(draw_size) if template[p] == bye and p not in template_byes]
+    template[free] = others
+
+    drawn = _redraw(template, groups, bye, rng, 1)[0]
+    # Vị trí hạt giống sau lần bốc thăm này lên đầu nhóm (theo thứ tự hạt giống)
+    where = {int(v): p for p, v in enumerate(drawn) if v != bye}
+    for g, (positions, n_seeds, group_byes) in enumerate(groups):
+        first = [where[int(v)] for v in template[positions[:n_seeds]]]
+        groups[g] = (np.array(first + [p for p in positions.tolist() if p not in first]), n_seeds, group_byes)
+    return [entries[i] for i in drawn], groups
+
+
+def elo_win_matrix(elo_model, player_ids, surface):
+    """
+    Ma trận P[i, j] = xác suất cầu thủ i thắng cầu thủ j trên mặt sân theo Elo kết hợp hiện tại
+    (cùng công thức kỳ vọng với TennisEloModel._update_elo).
+    """
+    ratings = np.array([elo_model.rating(pid, surface) for pid in player_ids], dtype=np.float64)
+    return 1 / (1 + 10 ** ((ratings[None, :] - ratings[:, None]) / 400))
+
+
+def model_win_matrix(predictor, player_ids, surface, model=None, **context):
+    """
+    Ma trận P[i, j] từ các model đã huấn luyện (ModelTrainer) qua MatchPredictor.predict_many:
+    mọi cặp có thứ tự được chấm trong một lần gọi, rồi lấy trung bình hai chiều
+    P[i, j] = (p(i, j) + 1 - p(j, i)) / 2 để khử lệch vị trí P1/P2 của model.
+
+    Args:
+        model (str): Tên model, 'soft_voting' (mặc định) hoặc 'stacking' (xem MatchPredictor.predict_many).
+        context: Ngữ cảnh trận chung cho mọi cặp (vd. date, best_of, draw_size).
+    """
+    n = len(player_ids)
+    ids = np.asarray(player_ids)
+    i, j = np.nonzero(~np.eye(n, dtype=bool))
+    matches = {'p1_id': ids[i], 'p2_id': ids[j], 'surface': np.full(len(i), surface, dtype=object)}
+    matches.update({key: np.full(len(i), value) for key, value in context.items()})
+    probs = np.full((n, n), 0.5)
+    probs[i, j] = predictor.predict_many(matches, model=model)
+    return (probs + 1 - probs.T) / 2
+
+
+def win_matrix(source, player_ids, surface, model=None, **context):
+    """Ma trận xác suất thắng từ một TennisEloModel hoặc một MatchPredictor (model đã huấn luyện)."""
+    if isinstance(source, TennisEloModel):
+        return elo_win_matrix(source, player_ids, surface)
+    return model_win_matrix(source, player_ids, surface, model=model, **context)
+
+
+def _simulate_chunk(probs, slots, groups, n_sims, seed, batch_size):
+    """
+    Mô phỏng n_sims lần một nhánh đấu (mảng chỉ số, bye = len(probs) - 1) bằng phép toán trên mảng:
+    mỗi vòng ghép các cặp dòng kề nhau của mọi lần mô phỏng cùng lúc.
+    groups (list | None): nếu có, nhánh đấu được bốc thăm lại (_redraw) ở từng lần mô phỏng.
+
+    Returns:
+        ndarray: counts[i, r] = số lần cầu thủ i vào tới vòng r (cột cuối: vô địch).
+    """
+    rng = np.random.default_rng(seed)
+    n_rounds = int(np.log2(len(slots)))
+    counts = np.zeros((len(probs), n_rounds + 1), dtype=np.int64)
+    dtype = np.int16 if len(probs) < np.iinfo(np.int16).max else np.int32
+    base = np.asarray(slots, dtype=dtype)
+    for start in range(0, n_sims, batch_size):
+        size = min(batch_size, n_sims - start)
+        draw = np.broadcast_to(base, (size, len(base)))
+        if groups:
+            draw = _redraw(base, groups, len(probs) - 1, rng, size)
+        counts[:, 0] += np.bincount(draw.ravel(), minlength=len(probs))
+        for r in range(n_rounds):
+            a, b = draw[:, 0::2], draw[:, 1::2]
+            draw = np.where(rng.random(a.shape) < probs[a, b], a, b)
+            counts[:, r + 1] += np.bincount(draw.ravel(), minlength=len(probs))
+    return counts
+
+
+def simulate_draw(probs, slots, n_sims=100_000, seed=42, workers=1, groups=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Mô phỏng Monte Carlo một nhánh đấu từ ma trận xác suất thắng đã tính sẵn.
+
+    Args:
+        probs (ndarray): P[i, j] = xác suất i thắng j (n x n).
+        slots (list): Chỉ số cầu thủ (hàng của probs) theo dòng của nhánh đấu; None hoặc -1 = bye.
+        workers (int): Số tiến trình; các lần mô phỏng được chia đều, mỗi tiến trình một chuỗi ngẫu nhiên
+                       độc lập (SeedSequence.spawn) nên kết quả chỉ phụ thuộc vào (seed, workers).
+        groups (list): Nhóm hạt giống để bốc thăm lại ở mỗi lần mô phỏng (xem make_draw); None = nhánh đấu cố định.
+    Returns:
+        ndarray: reach[i, r] = xác suất cầu thủ i vào tới vòng r (cột cuối: vô địch).
+    """
+    n = len(probs)
+    # Thêm một hàng/cột cho bye: mọi cầu thủ thắng bye
+    full = np.ones((n + 1, n + 1))
+    full[:n, :n] = probs
+    full[n, :n] = 0.0
+    slots = [n if s is None or s < 0 else s for s in slots]
+    if len(slots) & (len(slots) - 1):
+        raise ValueError(f"Số dòng của nhánh đấu phải là lũy thừa của 2 (nhận {len(slots)}).")
+
+    workers = max(1, min(workers, n_sims))
+    sizes = [n_sims // workers + (k < n_sims % workers) for k in range(workers)]
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    if workers == 1:
+        counts = _simulate_chunk(full, slots, groups, n_sims, seeds[0], batch_size)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_simulate_chunk, full, slots, groups, size, s, batch_size)
+                       for size, s in zip(sizes, seeds)]
+            counts = sum(f.result() for f in futures)
+    return counts[:n] / n_sims
+
+
+def simulate_tournament(source, player_ids, surface, slots=None, seeds=(), draw_size=None, redraw=False,
+                        n_sims=100_000, seed=42, workers=1, model=None, **context):
+    """
+    Xác suất vào tới từng vòng và vô địch của mọi cầu thủ trong một giải.
+
+    Args:
+        source: TennisEloModel (trạng thái Elo hiện tại) hoặc MatchPredictor (model đã huấn luyện).
+        player_ids (list): Các cầu thủ tham dự.
+        slots (list): Nhánh đấu đã bốc thăm (id theo dòng, None = bye). Nếu không có, nhánh đấu được dựng
+                      từ seeds/draw_size (make_draw).
+        redraw (bool): Bốc thăm lại (trong từng nhóm hạt giống và giữa các cầu thủ không hạt giống)
+                       ở mỗi lần mô phỏng - dự báo trước khi có lịch bốc thăm chính thức.
+        model (str), context: Truyền cho model_win_matrix khi source là MatchPredictor.
+    Returns:
+        DataFrame: Mỗi cầu thủ một dòng (index player_id), mỗi vòng một cột (R128, ..., F, W),
+                   sắp xếp theo xác suất vô địch giảm dần.
+    """
+    player_ids = list(player_ids)
+    rng = np.random.default_rng(seed)
+    if slots is None:
+        slots, groups = make_draw(player_ids, seeds, draw_size, rng)
+    else:
+        groups = None
+        if redraw:
+            raise ValueError("redraw cần seeds/draw_size thay vì nhánh đấu đã bốc thăm.")
+    position = {pid: i for i, pid in enumerate(player_ids)}
+    index_slots = [None if pid is None or pd.isna(pid) else position[pid] for pid in slots]
+
+    probs = win_matrix(source, player_ids, surface, model=model, **context)
+    reach = simulate_draw(probs, index_slots, n_sims=n_sims, seed=seed, workers=workers,
+                          groups=groups if redraw else None)
+    result = pd.DataFrame(reach, index=pd.Index(player_ids, name='player_id'), columns=round_names(len(slots)))
+    return result.sort_values('W', ascending=False)
+
+
+def read_draw(path):
+    """
+    Đọc nhánh đấu từ CSV: cột player_id theo thứ tự dòng của nhánh đấu (ô trống = bye),
+    cột seed (tùy chọn) là thứ hạng hạt giống.
+    """
+    df = pd.read_csv(path)
+    slots = [None if pd.isna(pid) else int(pid) for pid in df['player_id']]
+    seeds = []
+    if 'seed' in df.columns:
+        seeded = df.dropna(subset=['player_id', 'seed']).sort_values('seed')
+        seeds = seeded['player_id'].astype(int).tolist()
+    return slots, seeds
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mô phỏng Monte Carlo xác suất vào từng vòng và vô địch của một giải.")
+    parser.add_argument('draw', help="CSV nhánh đấu: cột player_id theo thứ tự dòng (trống = bye), cột seed tùy chọn.")
+    parser.add_argument('--surface', required=True, help="Mặt sân (Hard, Clay, Grass, ...).")
+    parser.add_argument('--elo-state', default=os.path.join(current_dir, '../../elo_state.npz'),
+                        help="Snapshot trạng thái Elo (data_preprocessing.py ghi sau mỗi lần chạy).")
+    parser.add_argument('--sims', type=int, default=100_000, help="Số lần mô phỏng.")
+    parser.add_argument('--workers', type=int, default=1, help="Số tiến trình mô phỏng song song.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--redraw', action='store_true',
+                        help="Bỏ thứ tự trong file, bốc thăm lại theo cột seed ở mỗi lần mô phỏng.")
+    parser.add_argument('--draw-size', type=int, default=None,
+                        help="Kích thước nhánh đấu khi --redraw (mặc định: lũy thừa của 2 nhỏ nhất chứa đủ cầu thủ).")
+    parser.add_argument('--top', type=int, default=16, help="Số cầu thủ in ra.")
+    parser.add_argument('--output', default=None, help="Ghi bảng xác suất ra CSV.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    elo = TennisEloModel.load_state(args.elo_state)
+    slots, seeds = read_draw(args.draw)
+    player_ids = [pid for pid in slots if pid is not None]
+
+    start = time.perf_counter()
+    if args.redraw:
+        result = simulate_tournament(elo, player_ids, args.surface, seeds=seeds, draw_size=args.draw_size, redraw=True,
+                                     n_sims=args.sims, seed=args.seed, workers=args.workers)
+    else:
+        result = simulate_tournament(elo, player_ids, args.surface, slots=slots,
+                                     n_sims=args.sims, seed=args.seed, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n--- XÁC SUẤT THEO VÒNG ({args.sims:,} lần mô phỏng, {elapsed:.2f}s) ---")
+    print(result.head(args.top).to_string(float_format=lambda v: f'{v:.3f}'))
+    if args.output:
+        result.to_csv(args.output)
+        print(f"Đã lưu bảng xác suất tại: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
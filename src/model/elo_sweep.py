@@ -0,0 +1,44 @@
+import numpy as np
+import os
+import sys
+import argparse
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+sys.path.append(os.path.join(current_dir, '../data_preprocessing'))
+
+from custom_elo_model import sweep_elo
+from data_preprocessing import prepare_matches
+from stage_cache import StageCache
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Quét lưới tham số Elo trong một lượt duyệt lịch sử.")
+    parser.add_argument('--k-factors', type=float, nargs='+', default=[8, 12, 16, 20, 24, 28, 32, 40, 48, 64])
+    parser.add_argument('--surface-weights', type=float, nargs='+', default=list(np.round(np.arange(0, 1.01, 0.1), 1)))
+    parser.add_argument('--start-elos', type=float, nargs='+', default=[1500])
+    parser.add_argument('--burn-in', type=int, default=1000,
+                        help="Bỏ qua n trận đầu tiên khi tính chỉ số (Elo chưa ổn định).")
+    parser.add_argument('--no-cache', action='store_true', help="Không đọc/ghi cache stage.")
+    parser.add_argument('--low-memory', action='store_true', help="Frame gọn (category, float32) cho lịch sử dài.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data_path = os.path.join(current_dir, "../../data")
+    cache = StageCache(os.path.join(data_path, '.cache', 'stages'), enabled=not args.no_cache)
+    struct_df, _ = prepare_matches(data_path, cache, low_memory=args.low_memory)
+
+    results = sweep_elo(struct_df, args.k_factors, args.surface_weights, args.start_elos, args.burn_in)
+    results = results.sort_values('log_loss', ignore_index=True)
+
+    print("\n--- QUÉT THAM SỐ ELO (SẮP XẾP THEO LOG LOSS) ---")
+    print(results.head(10).to_string(index=False))
+
+    result_path = os.path.normpath(os.path.join(current_dir, "../../elo_sweep_results.csv"))
+    results.to_csv(result_path, index=False)
+    print(f"\nĐã lưu kết quả {len(results)} cấu hình tại: {result_path}")
+
+if __name__ == "__main__":
+    main()
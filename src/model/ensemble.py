@@ -2,12 +2,106 @@ import pandas as pd
 import numpy as np
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, f1_score, roc_auc_score, precision_score, log_loss
+from sklearn.base import clone
+from sklearn.model_selection import TimeSeriesSplit
+from threadpoolctl import threadpool_limits
+from concurrent.futures import ProcessPoolExecutor
+from model_store import data_fingerprint, model_key
+from prediction_cache import PredictionCache
+from model_training import is_threaded
+from telemetry import TELEMETRY
+import os, time, tempfile
+
+
+# Dữ liệu train đã mở trong mỗi tiến trình con (memory-map, không sao chép giữa các task)
+_SHARED = {}
+
+
+def _shared_arrays(paths):
+    """Nạp (memory-map) các mảng .npy dùng chung một lần cho mỗi tiến trình con."""
+    if paths not in _SHARED:
+        _SHARED[paths] = tuple(np.load(path, mmap_mode='r') for path in paths)
+    return _SHARED[paths]
+
+
+def _oof_worker(pipe, X_train, y_train, train_end, val_end, threads):
+    """
+    Fit bản sao chưa huấn luyện của pipeline trên [:train_end], dự đoán xác suất trên [train_end:val_end].
+    X_train/y_train là mảng, hoặc đường dẫn .npy (chế độ song song: mọi task memory-map cùng một file
+    thay vì nhận một bản sao dữ liệu qua pickle).
+    """
+    if isinstance(X_train, str):
+        X_train, y_train = _shared_arrays((X_train, y_train))
+    pipe = clone(pipe)
+    if is_threaded(pipe):
+        pipe.named_steps['model'].set_params(n_jobs=threads)
+    with threadpool_limits(limits=threads):
+        pipe.fit(X_train[:train_end], y_train[:train_end])
+        return pipe.predict_proba(X_train[train_end:val_end])[:, 1]
+
+
+def out_of_fold_predictions(models, X_train, y_train, n_splits=5, cpu_budget=None):
+    """
+    Meta-feature out-of-fold theo thời gian (TimeSeriesSplit): mỗi fold được dự đoán bởi model
+    chỉ huấn luyện trên dữ liệu trước nó. Các cặp (model, fold) được fit song song.
+
+    Returns:
+        (np.ndarray, int): Ma trận [n_oof x n_models] cho các dòng [start:] và chỉ số start
+                           (các dòng của fold huấn luyện đầu tiên không có dự đoán out-of-fold).
+    """
+    folds = [(train_idx[-1] + 1, val_idx[-1] + 1)
+             for train_idx, val_idx in TimeSeriesSplit(n_splits=n_splits).split(X_train)]
+    start = folds[0][0]
+    tasks = [(j, name, fold) for j, name in enumerate(models) for fold in folds]
+    # Task lớn (fold dài) chạy trước để các tiến trình xong gần cùng lúc
+    tasks.sort(key=lambda task: -task[2][0])
+    cpu_budget = cpu_budget or os.cpu_count()
+    threads = max(cpu_budget // len(tasks), 1)
+    
+    oof = np.empty((len(y_train) - start, len(models)))
+    if cpu_budget == 1:
+        for j, name, (train_end, val_end) in tasks:
+            oof[train_end - start:val_end - start, j] = _oof_worker(
+                models[name], X_train, y_train, train_end, val_end, 1)
+        return oof, start
+    
+    # Ghi dữ liệu train ra đĩa một lần; mỗi tiến trình memory-map file thay vì nhận n_models x n_splits bản sao
+    with tempfile.TemporaryDirectory(prefix='oof-') as tmp_dir:
+        X_path, y_path = os.path.join(tmp_dir, 'X_train.npy'), os.path.join(tmp_dir, 'y_train.npy')
+        np.save(X_path, X_train[:folds[-1][1]])
+        np.save(y_path, np.asarray(y_train[:folds[-1][1]]))
+        with ProcessPoolExecutor(max_workers=min(len(tasks), cpu_budget)) as executor:
+            futures = {executor.submit(_oof_worker, models[name], X_path, y_path, train_end, val_end,
+                                       threads if is_threaded(models[name]) else 1): (j, train_end, val_end)
+                       for j, name, (train_end, val_end) in tasks}
+            for future, (j, train_end, val_end) in futures.items():
+                oof[train_end - start:val_end - start, j] = future.result()
+    return oof, start
+
 
 class EnsembleTrainer:
-    def __init__(self, trained_models):
+    def __init__(self, trained_models, store=None, model_keys=None, predictions=None):
+        """
+        Args:
+            trained_models (dict): Tên -> model đã fit.
+            store (ModelStore): Kho model để lưu/nạp meta-model stacking và cấu hình soft voting.
+            model_keys (dict): Khóa model store của từng model cơ sở (ModelTrainer.model_keys).
+            predictions (PredictionCache): Cache xác suất dùng chung (ModelTrainer.predictions) để
+                                           không suy luận lại trên tập test.
+        """
         self.models = trained_models
         self.results = []
+        self.meta_model = None
+        self.store = store
+        self.model_keys = model_keys or {}
+        self.predictions = predictions if predictions is not None else PredictionCache()
+
+    def _ensemble_key(self, strategy, names, estimator, data_fp=''):
+        """Khóa của một chiến lược ensemble: phụ thuộc vào khóa các model cơ sở và dữ liệu huấn luyện."""
+        base = [self.model_keys.get(name, name) for name in names]
+        return model_key(strategy, estimator, f'{data_fp}:{"|".join(base)}')
 
+    @TELEMETRY.timed('soft_voting', rows=lambda self, X_test, y_test: len(y_test))
     def soft_voting(self, X_test, y_test):
         print("\n--- ENSEMBLE: SOFT VOTING ---")
         probs = []
@@ -16,7 +110,7 @@ class EnsembleTrainer:
         # Duyệt qua tất cả model có trong danh sách
         for name, model in self.models.items():
             try:
-                p = model.predict_proba(X_test)[:, 1]
+                p = self.predictions.proba(name, model, X_test)
                 probs.append(p)
                 valid_models.append(name)
             except AttributeError:
@@ -27,6 +121,11 @@ class EnsembleTrainer:
         if not probs:
             return None
             
+        if self.store is not None:
+            config = {'models': valid_models, 'weights': [1 / len(valid_models)] * len(valid_models)}
+            self.store.save(self._ensemble_key('Soft Voting', valid_models, config), config,
+                            name='Soft Voting', fit_seconds=0.0)
+        
         y_prob_avg = np.mean(probs, axis=0)
         y_pred_avg = (y_prob_avg >= 0.5).astype(int)
 
@@ -42,30 +141,42 @@ class EnsembleTrainer:
         print(f"  -> Accuracy: {res['Accuracy']:.4f}, AUC: {res['ROC-AUC']:.4f}")
         return res
 
-    def stacking(self, X_train, y_train, X_test, y_test):
+    @TELEMETRY.timed('stacking', rows=lambda self, X_train, y_train, *args, **kwargs: len(y_train))
+    def stacking(self, X_train, y_train, X_test, y_test, n_splits=5, cpu_budget=None):
+        """
+        Meta-model học trên xác suất out-of-fold theo thời gian của các model cơ sở
+        (không dùng dự đoán in-sample trên X_train); đánh giá trên xác suất test đã cache.
+        
+        Args:
+            n_splits (int): Số fold của TimeSeriesSplit khi tạo meta-feature.
+            cpu_budget (int): Số core cho việc fit các fold song song (mặc định: mọi core).
+        """
         print("\n--- ENSEMBLE: STACKING ---")
-        meta_train_list = []
-        meta_test_list = []
-        valid_models = []
+        valid_models = {name: model for name, model in self.models.items() if hasattr(model, 'predict_proba')}
+        meta_model = LogisticRegression(max_iter=1000, class_weight='balanced')
         
-        for name, model in self.models.items():
-            try:
-                # Cần ensure tính tương thích chiều dữ liệu
-                train_prob = model.predict_proba(X_train)[:, 1]
-                test_prob = model.predict_proba(X_test)[:, 1]
-                
-                meta_train_list.append(train_prob)
-                meta_test_list.append(test_prob)
-                valid_models.append(name)
-            except AttributeError:
-                pass
-            
-        X_train_meta = np.column_stack(meta_train_list)
-        X_test_meta = np.column_stack(meta_test_list)
+        cached, key = None, None
+        if self.store is not None:
+            data_fp = f'{data_fingerprint(X_train, y_train)}:oof{n_splits}'
+            key = self._ensemble_key('Stacking', list(valid_models), meta_model, data_fp)
+            cached = self.store.load(key)
         
-        # Meta-model (Logistic Regression)
-        meta_model = LogisticRegression(max_iter=1000, class_weight='balanced')
-        meta_model.fit(X_train_meta, y_train)
+        X_test_meta = self.predictions.matrix(valid_models, X_test)
+        if cached is not None:
+            meta_model, meta = cached
+            print(f"Nạp meta-model stacking từ model store (train gốc mất {meta['fit_seconds']:.1f}s).")
+        else:
+            start = time.perf_counter()
+            X_train_meta, oof_start = out_of_fold_predictions(valid_models, X_train, y_train, n_splits, cpu_budget)
+            print(f"Đã tạo meta-feature out-of-fold cho {len(X_train_meta)} dòng ({n_splits} fold, "
+                  f"{time.perf_counter() - start:.1f}s).")
+            
+            # Meta-model (Logistic Regression)
+            meta_model.fit(X_train_meta, y_train[oof_start:])
+            if self.store is not None:
+                self.store.save(key, meta_model, name='Stacking', fit_seconds=time.perf_counter() - start,
+                                base_models=list(valid_models), n_splits=n_splits)
+        self.meta_model = meta_model
         
         y_prob_stack = meta_model.predict_proba(X_test_meta)[:, 1]
         y_pred_stack = (y_prob_stack >= 0.5).astype(int)
@@ -0,0 +1,81 @@
+import numpy as np
+
+# Đặc tả feature dùng chung cho finalize_features (offline) và MatchPredictor (online)
+# để hai phía không bao giờ lệch nhau.
+
+# Hàng thiếu một trong các cột này bị loại khỏi tập huấn luyện
+CRITICAL_COLUMNS = ['p1_rank', 'p2_rank', 'p1_ht', 'p2_ht', 'p1_age', 'p2_age']
+
+SEED_COLUMNS = ['p1_seed', 'p2_seed']
+# Giá trị seed cho cầu thủ không được xếp hạt giống
+UNSEEDED = 100
+
+# Thống kê giao bóng (data_preprocessing/serve_features.py) -> tên cột hiệu số
+SERVE_DIFFS = {'serve_pct': 'serve_diff', 'return_pct': 'return_diff', 'ace_rate': 'ace_diff', 'bp_save_pct': 'bp_save_diff'}
+
+# Biến phân loại được mã hóa one-hot (drop_first=True)
+DUMMY_COLUMNS = ['surface', 'p1_hand', 'p2_hand']
+
+
+def diff_pairs(columns):
+    """
+    Các cột hiệu số (Difference) theo đúng thứ tự của finalize_features: tên -> (cột P1, cột P2).
+    Phong độ các cửa sổ bổ sung (p1_recent_form_10, ...), feature ngữ cảnh (đối đầu, ngày nghỉ,
+    khối lượng thi đấu p1_matches_14d, ...) và thống kê giao bóng (p1_serve_pct, p1_serve_pct_hl5, ...)
+    được phát hiện từ tên cột.
+    """
+    pairs = {
+        'rank_diff': ('p1_rank', 'p2_rank'),
+        'age_diff': ('p1_age', 'p2_age'),
+        'ht_diff': ('p1_ht', 'p2_ht'),
+        'form_diff': ('p1_recent_form', 'p2_recent_form'),
+    }
+    for col in [c for c in columns if c.startswith('p1_recent_form_')]:
+        suffix = col[len('p1_recent_form_'):]
+        pairs[f'form_diff_{suffix}'] = (col, f'p2_recent_form_{suffix}')
+    pairs['surf_pct_diff'] = ('p1_surface_win_pct', 'p2_surface_win_pct')
+    if 'p1_h2h_win_pct' in columns:
+        pairs['h2h_diff'] = ('p1_h2h_win_pct', 'p2_h2h_win_pct')
+    if 'p1_rest_days' in columns:
+        pairs['rest_diff'] = ('p1_rest_days', 'p2_rest_days')
+    for col in [c for c in columns if c.startswith('p1_matches_')]:
+        suffix = col[len('p1_matches_'):]
+        pairs[f'workload_diff_{suffix}'] = (col, f'p2_matches_{suffix}')
+    for col in columns:
+        for stat, diff in SERVE_DIFFS.items():
+            if col == f'p1_{stat}' or col.startswith(f'p1_{stat}_hl'):
+                pairs[diff + col[len(f'p1_{stat}'):]] = (col, f'p2{col[2:]}')
+    return pairs
+
+
+def add_diff_features(cols):
+    """Thêm các cột hiệu số vào cols (DataFrame hoặc dict tên cột -> mảng numpy)."""
+    for name, (p1_col, p2_col) in diff_pairs(list(cols.keys())).items():
+        cols[name] = cols[p1_col] - cols[p2_col]
+    return cols
+
+
+def dummy_source(feature_name):
+    """Với một cột dummy (vd. 'surface_Hard') trả về (cột gốc, giá trị); None nếu không phải cột dummy."""
+    for col in DUMMY_COLUMNS:
+        if feature_name.startswith(f'{col}_'):
+            return col, feature_name[len(col) + 1:]
+    return None
+
+
+def feature_plan(feature_names):
+    """Với mỗi feature: (tên, None) nếu lấy trực tiếp, hoặc (cột gốc, giá trị) nếu là cột dummy."""
+    return [(name, None) if dummy_source(name) is None else dummy_source(name) for name in feature_names]
+
+
+def build_feature_matrix(cols, feature_names, plan=None):
+    """
+    Dựng ma trận float32 theo thứ tự feature_names từ dict cột thô (mảng numpy cùng độ dài):
+    tính cột hiệu số và cột dummy giống hệt finalize_features.
+    """
+    cols = add_diff_features(dict(cols))
+    plan = plan or feature_plan(feature_names)
+    out = np.empty((len(next(iter(cols.values()))), len(plan)), dtype=np.float32)
+    for j, (name, value) in enumerate(plan):
+        out[:, j] = cols[name] if value is None else (cols[name] == value)
+    return out
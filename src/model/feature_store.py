@@ -0,0 +1,191 @@
+import pandas as pd
+import numpy as np
+import os, json, glob, shutil
+from feature_spec import DUMMY_COLUMNS, dummy_source
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Vị trí mặc định của feature store (dùng chung cho tiền xử lý và huấn luyện)
+DEFAULT_STORE_PATH = os.path.normpath(os.path.join(current_dir, "../../processed_atp_data"))
+DEFAULT_CSV_PATH = os.path.normpath(os.path.join(current_dir, "../../processed_atp_data.csv"))
+
+STORE_VERSION = 1
+
+
+class FeatureStore:
+    """
+    Feature store dạng nhị phân theo cột:
+        features.npy      - ma trận feature float32 [n_rows x n_features] (C-order)
+        target.npy        - nhãn int8
+        tourney_date.npy  - ngày thi đấu datetime64[ns]
+        schema.json       - tên feature, dtype gốc của từng cột và metadata
+    Khi nạp với mmap=True, X/y/dates là memmap chỉ-đọc: cắt lát (X[:k]) không sao chép dữ liệu.
+    """
+
+    def __init__(self, X, y, dates, schema):
+        self.X = X
+        self.y = y
+        self.dates = dates
+        self.schema = schema
+        self.feature_names = schema['feature_names']
+
+    @classmethod
+    def from_frame(cls, df, target_col='target', date_col='tourney_date'):
+        """Tạo store trong bộ nhớ từ DataFrame đã finalize (mọi cột trừ target/ngày là feature)."""
+        feature_names = [c for c in df.columns if c not in (target_col, date_col)]
+        has_dates = date_col in df.columns
+        schema = {
+            'version': STORE_VERSION,
+            'n_rows': len(df),
+            'feature_names': feature_names,
+            'dtypes': {c: str(df[c].dtype) for c in feature_names},
+            'target': target_col,
+            'date': date_col if has_dates else None,
+        }
+        X = np.ascontiguousarray(df[feature_names].to_numpy(dtype=np.float32))
+        y = df[target_col].to_numpy(dtype=np.int8)
+        dates = pd.to_datetime(df[date_col]).to_numpy(dtype='datetime64[ns]') if has_dates else None
+        return cls(X, y, dates, schema)
+
+    def __len__(self):
+        return len(self.y)
+
+    def to_frame(self):
+        """Dựng lại DataFrame với dtype gốc (bool, int, float) - có sao chép dữ liệu."""
+        cols = {}
+        for j, name in enumerate(self.feature_names):
+            dtype = self.schema['dtypes'][name]
+            values = np.asarray(self.X[:, j])
+            cols[name] = values != 0 if dtype == 'bool' else values.astype(dtype)
+        df = pd.DataFrame(cols)
+        df[self.schema['target']] = np.asarray(self.y).astype(np.int64)
+        if self.dates is not None:
+            df[self.schema['date']] = np.asarray(self.dates)
+        return df
+
+
+def save_feature_store(df, path=DEFAULT_STORE_PATH, target_col='target', date_col='tourney_date'):
+    """Ghi DataFrame đã finalize ra feature store."""
+    store = FeatureStore.from_frame(df, target_col, date_col)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'features.npy'), store.X)
+    np.save(os.path.join(path, 'target.npy'), store.y)
+    if store.dates is not None:
+        np.save(os.path.join(path, 'tourney_date.npy'), store.dates)
+    with open(os.path.join(path, 'schema.json'), 'w') as f:
+        json.dump(store.schema, f, indent=2)
+    print(f"Đã lưu feature store ({len(store)} dòng x {len(store.feature_names)} feature) tại: {path}")
+    return store
+
+
+def _write_npy_header(f, dtype, shape):
+    """Header .npy cho mảng C-order; dữ liệu được ghi nối tiếp sau đó theo từng khối dòng."""
+    np.lib.format.write_array_header_1_0(f, {'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+                                             'fortran_order': False, 'shape': shape})
+
+
+class FeatureStoreWriter:
+    """
+    Ghi feature store theo từng chunk (chế độ streaming) với bộ nhớ cố định.
+    Mỗi chunk (đã finalize với drop_first=False) được ghi tạm vào {path}/.spool; close() chốt tập cột
+    giống hệt finalize_features trên toàn bộ dữ liệu: cột dummy là hợp của mọi chunk, bỏ giá trị đầu tiên
+    theo thứ tự sắp xếp (như get_dummies(drop_first=True)), rồi ghi tuần tự các file .npy.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, target_col='target', date_col='tourney_date'):
+        self.path = path
+        self.target_col = target_col
+        self.date_col = date_col
+        self.spool_dir = os.path.join(path, '.spool')
+        shutil.rmtree(self.spool_dir, ignore_errors=True)
+        os.makedirs(self.spool_dir)
+        self.n_rows = 0
+        self.n_chunks = 0
+        self.columns = None                            # cột không phải dummy, theo thứ tự của chunk
+        self.dummy_values = {col: set() for col in DUMMY_COLUMNS}
+        self.dtypes = {}
+
+    @staticmethod
+    def _is_dummy(df, col):
+        return df[col].dtype == bool and dummy_source(col) is not None
+
+    def append(self, df):
+        """Ghi tạm một chunk đã finalize và ghi nhận cột/dtype của nó."""
+        if len(df) == 0:
+            return
+        columns = [c for c in df.columns if not self._is_dummy(df, c)]
+        if self.columns is None:
+            self.columns = columns
+        elif columns != self.columns:
+            raise ValueError(f"Chunk {self.n_chunks} có cột khác các chunk trước: {columns}")
+        for col in df.columns:
+            if self._is_dummy(df, col):
+                source, value = dummy_source(col)
+                self.dummy_values[source].add(value)
+            else:
+                # Chunk có thể hạ kiểu số nguyên khác nhau (low_memory): giữ kiểu chung như khi nối frame
+                dtype = self.dtypes.get(col)
+                self.dtypes[col] = df[col].dtype if dtype is None else np.result_type(dtype, df[col].dtype)
+        df.to_pickle(os.path.join(self.spool_dir, f'chunk_{self.n_chunks:06d}.pkl'))
+        self.n_chunks += 1
+        self.n_rows += len(df)
+
+    def close(self):
+        """Ghi features.npy/target.npy/tourney_date.npy/schema.json từ các chunk; trả về store (memory-map)."""
+        if self.columns is None:
+            raise ValueError("Không có chunk nào được ghi vào feature store.")
+        dummy_names = [f'{col}_{value}' for col in DUMMY_COLUMNS for value in sorted(self.dummy_values[col])[1:]]
+        feature_names = [c for c in self.columns if c not in (self.target_col, self.date_col)] + dummy_names
+        has_dates = self.date_col in self.columns
+        schema = {
+            'version': STORE_VERSION,
+            'n_rows': self.n_rows,
+            'feature_names': feature_names,
+            'dtypes': {c: 'bool' if c in dummy_names else str(self.dtypes[c]) for c in feature_names},
+            'target': self.target_col,
+            'date': self.date_col if has_dates else None,
+        }
+
+        # Mỗi mảng: (file, dtype, shape, hàm lấy khối dòng từ một chunk)
+        arrays = [
+            ('features.npy', np.float32, (self.n_rows, len(feature_names)),
+             lambda df: df.reindex(columns=feature_names, fill_value=False).to_numpy(dtype=np.float32)),
+            ('target.npy', np.int8, (self.n_rows,), lambda df: df[self.target_col].to_numpy(dtype=np.int8)),
+        ]
+        if has_dates:
+            arrays.append(('tourney_date.npy', 'datetime64[ns]', (self.n_rows,),
+                           lambda df: pd.to_datetime(df[self.date_col]).to_numpy(dtype='datetime64[ns]')))
+        files = [open(os.path.join(self.path, name), 'wb') for name, _, _, _ in arrays]
+        try:
+            for f, (_, dtype, shape, _) in zip(files, arrays):
+                _write_npy_header(f, dtype, shape)
+            for chunk_path in sorted(glob.glob(os.path.join(self.spool_dir, 'chunk_*.pkl'))):
+                df = pd.read_pickle(chunk_path)
+                for f, (_, dtype, _, block) in zip(files, arrays):
+                    f.write(np.ascontiguousarray(block(df), dtype=dtype).tobytes())
+        finally:
+            for f in files:
+                f.close()
+        with open(os.path.join(self.path, 'schema.json'), 'w') as f:
+            json.dump(schema, f, indent=2)
+        shutil.rmtree(self.spool_dir)
+        print(f"Đã lưu feature store ({self.n_rows} dòng x {len(feature_names)} feature, "
+              f"{self.n_chunks} chunk) tại: {self.path}")
+        return load_feature_store(self.path)
+
+
+def load_feature_store(path=DEFAULT_STORE_PATH, mmap=True):
+    """Nạp feature store; mặc định memory-map các mảng thay vì đọc toàn bộ vào RAM."""
+    schema_path = os.path.join(path, 'schema.json')
+    if not os.path.exists(schema_path):
+        raise FileNotFoundError(f"Không tìm thấy feature store tại: {path}")
+    with open(schema_path) as f:
+        schema = json.load(f)
+    if schema.get('version') != STORE_VERSION:
+        raise ValueError(f"Phiên bản feature store không hỗ trợ: {schema.get('version')}")
+
+    mode = 'r' if mmap else None
+    X = np.load(os.path.join(path, 'features.npy'), mmap_mode=mode)
+    y = np.load(os.path.join(path, 'target.npy'), mmap_mode=mode)
+    dates = np.load(os.path.join(path, 'tourney_date.npy'), mmap_mode=mode) if schema['date'] else None
+    return FeatureStore(X, y, dates, schema)
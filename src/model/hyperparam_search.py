@@ -0,0 +1,417 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+import json
+import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from threadpoolctl import threadpool_limits
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from model_training import ModelTrainer, SVM_MODES, is_threaded, save_tuned_params, DEFAULT_TUNED_PARAMS
+from model_store import data_fingerprint
+from feature_store import DEFAULT_STORE_PATH
+from backtest import _score
+from main import load_processed_data
+from telemetry import TELEMETRY, add_telemetry_arguments, configure_telemetry
+
+# Ma trận fold đã chuẩn hóa (memmap), dùng chung cho mọi ứng viên và mọi lần chạy trên cùng dữ liệu
+DEFAULT_FOLD_CACHE = os.path.normpath(os.path.join(current_dir, "../../data/.cache/tuning"))
+DEFAULT_RESULTS_PATH = os.path.normpath(os.path.join(current_dir, "../../tuning_results.csv"))
+
+# Không gian tìm kiếm theo tên tham số của bước 'model' trong pipeline của ModelTrainer:
+# list = chọn một giá trị, ('log'|'uniform'|'int', thấp, cao) = phân phối liên tục/số nguyên
+SEARCH_SPACES = {
+    'Logistic Regression': {
+        'C': ('log', 1e-3, 1e2),
+    },
+    'Random Forest': {
+        'max_depth': [6, 10, 16, None],
+        'min_samples_leaf': [1, 5, 20, 50],
+        'max_features': ['sqrt', 0.3, 0.5],
+    },
+    'XGBoost': {
+        'max_depth': ('int', 2, 8),
+        'learning_rate': ('log', 0.01, 0.3),
+        'min_child_weight': ('log', 1, 50),
+        'subsample': ('uniform', 0.5, 1.0),
+        'colsample_bytree': ('uniform', 0.5, 1.0),
+        'reg_lambda': ('log', 0.1, 10),
+    },
+}
+# SVM: SVC chính xác tinh chỉnh C/gamma, chế độ xấp xỉ tinh chỉnh alpha của SGD bên trong CalibratedClassifierCV
+SVM_SEARCH_SPACES = {
+    'exact': {'C': ('log', 0.1, 10), 'gamma': ['scale', 0.01, 0.03, 0.1]},
+    'nystroem': {'estimator__alpha': ('log', 1e-6, 1e-2)},
+    'rff': {'estimator__alpha': ('log', 1e-6, 1e-2)},
+}
+
+# Model có số cây là tài nguyên của successive halving (tăng cùng lượng dữ liệu qua các rung)
+ESTIMATOR_MODELS = ('Random Forest', 'XGBoost')
+EARLY_STOPPING_ROUNDS = 20
+
+# Fold đã mở trong mỗi tiến trình con (memory-map, không sao chép giữa các ứng viên)
+_FOLDS = {}
+
+
+def search_space(name, svm_mode='nystroem'):
+    return SVM_SEARCH_SPACES[svm_mode] if name == 'SVM' else SEARCH_SPACES[name]
+
+
+def sample_candidates(space, n, rng):
+    """
+    Lấy ngẫu nhiên n cấu hình khác nhau từ không gian tìm kiếm (giá trị Python thuần, ghi được ra JSON);
+    ít hơn n nếu không gian rời rạc không đủ cấu hình.
+    """
+    candidates, seen = [], set()
+    for _ in range(20 * n):
+        params = {}
+        for key, dist in space.items():
+            if isinstance(dist, list):
+                params[key] = dist[rng.integers(len(dist))]
+            elif dist[0] == 'log':
+                params[key] = float(np.exp(rng.uniform(np.log(dist[1]), np.log(dist[2]))))
+            elif dist[0] == 'int':
+                params[key] = int(rng.integers(dist[1], dist[2] + 1))
+            else:
+                params[key] = float(rng.uniform(dist[1], dist[2]))
+        key = json.dumps(params, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(params)
+            if len(candidates) == n:
+                break
+    return candidates
+
+
+def time_series_folds(n_rows, n_folds=3, valid_fraction=0.1):
+    """
+    Fold theo thời gian trên dữ liệu đã sắp xếp (cùng quy ước với phép chia 80/20 của main.py):
+    n_folds block kiểm định liên tiếp ở cuối, mỗi block valid_fraction số dòng; fold k huấn luyện
+    trên mọi dòng trước block k (cửa sổ mở rộng).
+
+    Returns:
+        list[(int, int)]: (train_end, valid_end) - chỉ số dòng.
+    """
+    size = int(n_rows * valid_fraction)
+    first = n_rows - n_folds * size
+    if size < 1 or first < size:
+        raise ValueError(f"Không đủ dữ liệu cho {n_folds} fold x {valid_fraction:.0%} trên {n_rows} dòng.")
+    return [(first + k * size, first + (k + 1) * size) for k in range(n_folds)]
+
+
+def prepare_folds(X, y, folds, cache_dir=DEFAULT_FOLD_CACHE):
+    """
+    Chuẩn hóa mỗi fold một lần (StandardScaler fit trên phần train của fold, như bước 'scaler' của
+    pipeline) và lưu X_train/y_train/X_valid/y_valid dạng .npy theo hash dữ liệu và cách chia fold.
+    Mọi ứng viên và mọi tiến trình memory-map cùng các ma trận này thay vì chuẩn hóa lại;
+    lần chạy sau trên cùng dữ liệu dùng lại cache.
+
+    Returns:
+        str: Thư mục fold.
+    """
+    fp = data_fingerprint(X, y)[:16]
+    fold_dir = os.path.join(cache_dir, f"{fp}-{'-'.join(f'{a}_{b}' for a, b in folds)}")
+    if os.path.exists(os.path.join(fold_dir, 'done')):
+        print(f"[cache] Dùng lại {len(folds)} fold đã chuẩn hóa tại: {fold_dir}")
+        return fold_dir
+
+    os.makedirs(fold_dir, exist_ok=True)
+    with TELEMETRY.record('tune_folds', rows_in=len(y)):
+        for k, (train_end, valid_end) in enumerate(folds):
+            scaler = StandardScaler().fit(X[:train_end])
+            arrays = {
+                'X_train': scaler.transform(X[:train_end]).astype(np.float32),
+                'y_train': np.asarray(y[:train_end], dtype=np.int8),
+                'X_valid': scaler.transform(X[train_end:valid_end]).astype(np.float32),
+                'y_valid': np.asarray(y[train_end:valid_end], dtype=np.int8),
+            }
+            for name, arr in arrays.items():
+                np.save(os.path.join(fold_dir, f'fold{k}_{name}.npy'), arr)
+    open(os.path.join(fold_dir, 'done'), 'w').close()
+    print(f"Đã chuẩn hóa và lưu {len(folds)} fold tại: {fold_dir}")
+    return fold_dir
+
+
+def _load_fold(fold_dir, k):
+    key = (fold_dir, k)
+    if key not in _FOLDS:
+        _FOLDS[key] = tuple(np.load(os.path.join(fold_dir, f'fold{k}_{name}.npy'), mmap_mode='r')
+                            for name in ('X_train', 'y_train', 'X_valid', 'y_valid'))
+    return _FOLDS[key]
+
+
+def model_estimator(name, svm_mode='nystroem', random_state=42):
+    """Pipeline của ModelTrainer bỏ bước 'scaler' (dữ liệu fold đã được chuẩn hóa sẵn)."""
+    pipe = ModelTrainer(random_state=random_state, svm_mode=svm_mode).pipelines[name]
+    return Pipeline(pipe.steps[1:])
+
+
+def _evaluate_worker(name, params, fold_dir, k, fraction, n_estimators, svm_mode, random_state, threads):
+    """
+    Fit một ứng viên trên fold k với fraction dòng GẦN NHẤT của cửa sổ train (trong tiến trình con)
+    và chấm điểm trên block kiểm định của fold. XGBoost dừng sớm theo log loss của block kiểm định.
+
+    Returns:
+        dict: Chỉ số (_score), số cây thực dùng, thời gian wall/CPU.
+    """
+    X_train, y_train, X_valid, y_valid = _load_fold(fold_dir, k)
+    start_row = len(y_train) - max(int(len(y_train) * fraction), 1)
+    X_fit, y_fit = X_train[start_row:], y_train[start_row:].astype(int)
+
+    pipe = model_estimator(name, svm_mode, random_state)
+    pipe.set_params(**{f'model__{key}': value for key, value in params.items()})
+    if n_estimators is not None:
+        pipe.set_params(model__n_estimators=n_estimators)
+    if is_threaded(pipe):
+        pipe.set_params(model__n_jobs=threads)
+    fit_params = {}
+    if name == 'XGBoost':
+        pipe.set_params(model__early_stopping_rounds=EARLY_STOPPING_ROUNDS)
+        fit_params = {'model__eval_set': [(X_valid, y_valid.astype(int))], 'model__verbose': False}
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    with threadpool_limits(limits=threads):
+        pipe.fit(X_fit, y_fit, **fit_params)
+        y_prob = pipe.predict_proba(X_valid)[:, 1]
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+
+    model = pipe.named_steps['model']
+    used = model.best_iteration + 1 if name == 'XGBoost' else n_estimators
+    return {'fold': k, 'n_estimators_used': used, 'fit_rows': len(y_fit), 'wall_s': wall, 'cpu_s': cpu,
+            **_score(y_valid.astype(int), y_prob)}
+
+
+def rung_schedule(min_fraction=1 / 9, eta=3):
+    """Tỷ lệ dữ liệu của các rung: min_fraction, min_fraction*eta, ..., 1."""
+    n_rungs = int(math.floor(math.log(1 / min_fraction, eta) + 1e-9)) + 1
+    return [eta ** (r - n_rungs + 1) for r in range(n_rungs)]
+
+
+def successive_halving(name, candidates, fold_dir, n_folds, fractions, eta=3, max_estimators=500,
+                       svm_mode='nystroem', random_state=42, executor=None, threads=1, first_rung=0, bracket=0):
+    """
+    Successive halving: mọi ứng viên được đánh giá trên mọi fold ở rung đầu (ít dữ liệu, ít cây);
+    1/eta ứng viên có log loss trung bình thấp nhất lên rung sau với eta lần dữ liệu và số cây,
+    đến khi rung cuối dùng toàn bộ cửa sổ train và max_estimators cây. Các cặp (ứng viên, fold)
+    của một rung chạy song song trên executor. first_rung > 0 bỏ qua các rung đầu (bracket Hyperband).
+
+    Returns:
+        list[dict]: Một dòng cho mỗi (ứng viên, rung): log loss/AUC/accuracy trung bình các fold,
+                    số cây, thời gian tính toán cộng dồn của ứng viên.
+    """
+    rows = []
+    alive = list(range(len(candidates)))
+    compute = np.zeros(len(candidates))
+    for rung in range(first_rung, len(fractions)):
+        fraction = fractions[rung]
+        n_estimators = max(int(round(max_estimators * fraction)), 10) if name in ESTIMATOR_MODELS else None
+        tasks = [(i, k) for i in alive for k in range(n_folds)]
+        args = [(name, candidates[i], fold_dir, k, fraction, n_estimators, svm_mode, random_state, threads)
+                for i, k in tasks]
+        if executor is None:
+            results = [_evaluate_worker(*a) for a in args]
+        else:
+            futures = {executor.submit(_evaluate_worker, *a): j for j, a in enumerate(args)}
+            results = [None] * len(args)
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+
+        by_candidate = {}
+        for (i, _), res in zip(tasks, results):
+            by_candidate.setdefault(i, []).append(res)
+            # Fit chạy trong tiến trình con: chỉ có thời gian wall/CPU do worker đo
+            TELEMETRY.add('tune_fit', res['wall_s'], res['cpu_s'], rows_in=res['fit_rows'], model=name, rung=rung)
+        for i, res in by_candidate.items():
+            folds = pd.DataFrame(res)
+            compute[i] += folds['wall_s'].sum()
+            rows.append({
+                'model': name,
+                'candidate': i,
+                'bracket': bracket,
+                'rung': rung,
+                'data_fraction': fraction,
+                'n_estimators': n_estimators,
+                'n_estimators_used': folds['n_estimators_used'].mean() if n_estimators else None,
+                'Log Loss': folds['Log Loss'].mean(),
+                'Log Loss std': folds['Log Loss'].std(),
+                'ROC-AUC': folds['ROC-AUC'].mean(),
+                'Accuracy': folds['Accuracy'].mean(),
+                'compute_s': compute[i],
+                'params': json.dumps(candidates[i], sort_keys=True),
+            })
+
+        if rung < len(fractions) - 1:
+            losses = {row['candidate']: row['Log Loss'] for row in rows[-len(alive):]}
+            alive = sorted(alive, key=losses.get)[:max(len(alive) // eta, 1)]
+        print(f"  {name} [bracket {bracket}] rung {rung}: {len(by_candidate)} ứng viên x {n_folds} fold, "
+              f"{fraction:.0%} dữ liệu" + (f", {n_estimators} cây" if n_estimators else "")
+              + f", log loss tốt nhất {min(r['Log Loss'] for r in rows[-len(by_candidate):]):.4f}")
+    return rows
+
+
+def hyperband_brackets(n_candidates, n_rungs, eta=3):
+    """
+    Các bracket Hyperband: bracket s bắt đầu ở rung s với ceil(n_candidates * (s_max+1)/(s_max+1-s) / eta^s)
+    ứng viên - bracket đầu nhiều ứng viên/ít dữ liệu, bracket cuối ít ứng viên/toàn bộ dữ liệu.
+
+    Returns:
+        list[(int, int)]: (rung bắt đầu, số ứng viên).
+    """
+    s_max = n_rungs - 1
+    return [(s, max(int(math.ceil(n_candidates * (s_max + 1) / (s_max + 1 - s) / eta ** s)), 1))
+            for s in range(n_rungs)]
+
+
+def search(X, y, model_names=None, n_candidates=27, n_folds=3, valid_fraction=0.1, min_fraction=1 / 9, eta=3,
+           max_estimators=500, hyperband=False, svm_mode='nystroem', max_workers=None, random_state=42,
+           cache_dir=DEFAULT_FOLD_CACHE):
+    """
+    Tìm siêu tham số cho các model của ModelTrainer trên các fold theo thời gian của X, y
+    (tập train đã sắp xếp theo ngày - không đụng đến tập test của main.py).
+
+    Args:
+        n_candidates (int): Số ứng viên ngẫu nhiên mỗi model (mỗi bracket với Hyperband).
+        min_fraction (float): Tỷ lệ dữ liệu (và số cây) của rung đầu; các rung sau nhân eta.
+        max_estimators (int): Số cây ở rung cuối (RF) hoặc trần số vòng boosting (XGBoost, dừng sớm).
+        hyperband (bool): Chạy nhiều bracket successive halving với điểm bắt đầu khác nhau.
+        max_workers (int): Số tiến trình đánh giá ứng viên song song (mặc định: mọi core).
+
+    Returns:
+        DataFrame: Mọi lần đánh giá (ứng viên, rung).
+    """
+    model_names = model_names or list(ModelTrainer(svm_mode=svm_mode).pipelines)
+    folds = time_series_folds(len(y), n_folds, valid_fraction)
+    fold_dir = prepare_folds(X, y, folds, cache_dir)
+    fractions = rung_schedule(min_fraction, eta)
+    brackets = hyperband_brackets(n_candidates, len(fractions), eta) if hyperband else [(0, n_candidates)]
+
+    max_workers = max_workers or os.cpu_count() or 1
+    threads = max((os.cpu_count() or 1) // max_workers, 1)
+    print(f"Tìm siêu tham số: {len(model_names)} model, {len(folds)} fold theo thời gian "
+          f"(train {folds[0][0]}-{folds[-1][0]} dòng, kiểm định {folds[0][1] - folds[0][0]} dòng), "
+          f"rung {', '.join(f'{f:.0%}' for f in fractions)}, {max_workers} tiến trình x {threads} luồng.")
+
+    rng = np.random.default_rng(random_state)
+    rows = []
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+    try:
+        for name in model_names:
+            space = search_space(name, svm_mode)
+            offset = 0
+            for bracket, (first_rung, n) in enumerate(brackets):
+                candidates = sample_candidates(space, n, rng)
+                bracket_rows = successive_halving(name, candidates, fold_dir, len(folds), fractions, eta,
+                                                  max_estimators, svm_mode, random_state, executor, threads,
+                                                  first_rung, bracket)
+                for row in bracket_rows:
+                    row['candidate'] += offset
+                rows.extend(bracket_rows)
+                offset += len(candidates)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return pd.DataFrame(rows)
+
+
+def leaderboard(results):
+    """
+    Bảng xếp hạng: mỗi ứng viên một dòng ở rung cao nhất nó đạt được, xếp theo rung (giảm dần)
+    rồi log loss - ứng viên bị loại sớm chỉ có điểm trên ít dữ liệu nên không so trực tiếp.
+    """
+    last = results.sort_values('rung').groupby(['model', 'candidate']).tail(1)
+    return last.sort_values(['model', 'rung', 'Log Loss'], ascending=[True, False, True], ignore_index=True)
+
+
+def best_params(results):
+    """
+    Cấu hình tốt nhất của từng model (log loss thấp nhất ở rung cuối), sẵn sàng cho ModelTrainer(params=...).
+    RF dùng số cây của rung cuối; XGBoost dùng số vòng trung bình mà dừng sớm chọn trên các fold.
+    """
+    best = {}
+    board = leaderboard(results)
+    for name, group in board.groupby('model', sort=False):
+        top = group[group['rung'] == results['rung'].max()].head(1)
+        if top.empty:
+            continue
+        top = top.iloc[0]
+        params = json.loads(top['params'])
+        if name == 'XGBoost':
+            params['n_estimators'] = int(round(top['n_estimators_used']))
+        elif name in ESTIMATOR_MODELS:
+            params['n_estimators'] = int(top['n_estimators'])
+        best[name] = params
+    return best
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Tìm siêu tham số theo thời gian (successive halving / Hyperband).")
+    parser.add_argument('data', nargs='?', default=DEFAULT_STORE_PATH, help="Feature store hoặc file CSV đã xử lý.")
+    parser.add_argument('--models', nargs='+', default=None, help="Tập con model (mặc định: tất cả).")
+    parser.add_argument('--candidates', type=int, default=27, help="Số ứng viên ngẫu nhiên mỗi model.")
+    parser.add_argument('--folds', type=int, default=3, help="Số fold theo thời gian.")
+    parser.add_argument('--valid-fraction', type=float, default=0.1,
+                        help="Kích thước block kiểm định của mỗi fold (tỷ lệ tập train).")
+    parser.add_argument('--min-fraction', type=float, default=1 / 9, help="Tỷ lệ dữ liệu của rung đầu.")
+    parser.add_argument('--eta', type=int, default=3, help="Hệ số loại/tăng tài nguyên giữa các rung.")
+    parser.add_argument('--max-estimators', type=int, default=500,
+                        help="Số cây ở rung cuối (RF) / trần số vòng boosting (XGBoost).")
+    parser.add_argument('--hyperband', action='store_true', help="Chạy nhiều bracket (Hyperband).")
+    parser.add_argument('--svm-mode', choices=SVM_MODES, default='nystroem')
+    parser.add_argument('--workers', type=int, default=None, help="Số tiến trình song song.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--top', type=int, default=5, help="Số ứng viên hiển thị mỗi model.")
+    parser.add_argument('--output', default=DEFAULT_TUNED_PARAMS, help="File JSON cấu hình tốt nhất.")
+    add_telemetry_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_telemetry(args)
+    try:
+        store = load_processed_data(args.data)
+    except Exception as e:
+        print(e)
+        return
+
+    # Chỉ tìm trên phần train (80% đầu theo thời gian) của phép chia trong main.py
+    X, y = store.X, store.y
+    if store.dates is not None and (np.diff(store.dates) < np.timedelta64(0)).any():
+        order = np.argsort(store.dates, kind='stable')
+        X, y = X[order], y[order]
+    split_idx = int(len(y) * 0.8)
+
+    start = time.perf_counter()
+    try:
+        results = search(X[:split_idx], y[:split_idx], args.models, args.candidates, args.folds,
+                         args.valid_fraction, args.min_fraction, args.eta, args.max_estimators, args.hyperband,
+                         args.svm_mode, args.workers, args.seed)
+    except ValueError as e:
+        print(e)
+        return
+
+    board = leaderboard(results)
+    print("\n--- BẢNG XẾP HẠNG (LOG LOSS TRUNG BÌNH CÁC FOLD) ---")
+    cols = ['model', 'candidate', 'rung', 'n_estimators_used', 'Log Loss', 'ROC-AUC', 'Accuracy', 'compute_s', 'params']
+    print(board.groupby('model', sort=False).head(args.top)[cols].to_string(index=False))
+    print("\nThời gian tính toán (tổng fit/predict trong tiến trình con):")
+    for name, group in board.groupby('model', sort=False):
+        print(f"  {name:<20} {group['compute_s'].sum():7.1f}s ({len(group)} ứng viên)")
+    print(f"  Tổng wall {time.perf_counter() - start:.1f}s")
+
+    results.to_csv(DEFAULT_RESULTS_PATH, index=False)
+    print(f"\nĐã lưu mọi lần đánh giá tại: {DEFAULT_RESULTS_PATH}")
+    save_tuned_params(best_params(results), args.output, args.svm_mode)
+
+    if args.telemetry:
+        TELEMETRY.write_report(args.telemetry)
+
+if __name__ == "__main__":
+    main()
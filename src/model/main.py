@@ -1,63 +1,94 @@
 import pandas as pd
+import numpy as np
 import os
 import sys
-from model_training import ModelTrainer
+import argparse
+from model_training import ModelTrainer, SVM_MODES, load_tuned_params
 from ensemble import EnsembleTrainer
+from feature_store import FeatureStore, load_feature_store, DEFAULT_STORE_PATH
+from model_store import ModelStore, DEFAULT_MODEL_STORE
+from prediction_cache import PredictionCache
+from telemetry import TELEMETRY, add_telemetry_arguments, configure_telemetry
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
 
-def load_processed_data(filepath):
-    if not os.path.exists(filepath):
-        raise FileNotFoundError(f"Không tìm thấy file dữ liệu tại: {filepath}")
-    return pd.read_csv(filepath)
+def load_processed_data(path=DEFAULT_STORE_PATH):
+    """
+    Nạp dữ liệu đã xử lý: feature store nhị phân (memory-map) hoặc file CSV xuất bằng --csv.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Không tìm thấy file dữ liệu tại: {path}")
+    if path.endswith('.csv'):
+        return FeatureStore.from_frame(pd.read_csv(path, parse_dates=['tourney_date']))
+    return load_feature_store(path)
 
-def main():
-    # 1. Load dữ liệu đã xử lý
-    data_path = os.path.join(current_dir, "../../data/processed_atp_data.csv")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Huấn luyện và đánh giá các mô hình dự đoán ATP.")
+    parser.add_argument('data', nargs='?', default=DEFAULT_STORE_PATH,
+                        help="Feature store hoặc file CSV đã xử lý.")
+    parser.add_argument('--model-store', default=DEFAULT_MODEL_STORE,
+                        help="Thư mục lưu model đã huấn luyện.")
+    parser.add_argument('--no-model-store', action='store_true',
+                        help="Luôn train lại, không nạp/lưu model.")
+    parser.add_argument('--parallel', action='store_true',
+                        help="Train đồng thời các mô hình cơ sở.")
+    parser.add_argument('--cpu-budget', type=int, default=None,
+                        help="Tổng số core cho --parallel và các fold stacking (mặc định: mọi core).")
+    parser.add_argument('--svm-mode', choices=SVM_MODES, default='exact',
+                        help="SVC RBF chính xác hoặc xấp xỉ kernel (nystroem/rff) cho dữ liệu lớn.")
+    parser.add_argument('--tuned-params', default=None,
+                        help="File JSON siêu tham số từ hyperparam_search.py (mặc định: cấu hình cố định).")
+    add_telemetry_arguments(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_telemetry(args)
     
+    # 1. Load dữ liệu đã xử lý
     try:
-        df = load_processed_data(data_path)
+        store = load_processed_data(args.data)
+        params = load_tuned_params(args.tuned_params, args.svm_mode) if args.tuned_params else None
     except Exception as e:
         print(e)
         return
 
     # 2. Chia tập dữ liệu (Time-series Split)
-    # Sắp xếp theo thời gian để đảm bảo tính quá khứ -> tương lai
-    if 'tourney_date' in df.columns:
-        df = df.sort_values('tourney_date').reset_index(drop=True)
-        # Xóa cột ngày tháng sau khi sort xong vì model không dùng
-        dates = df['tourney_date'] # Lưu lại để debug nếu cần
-        df_model = df.drop(columns=['tourney_date'])
-    else:
-        df_model = df
+    X, y = store.X, store.y
+    # Feature store đã được sắp xếp theo thời gian; chỉ sắp xếp lại (có sao chép) nếu cần
+    if store.dates is not None and (np.diff(store.dates) < np.timedelta64(0)).any():
+        order = np.argsort(store.dates, kind='stable')
+        X, y = X[order], y[order]
         
-    # Chia 80-20
-    split_idx = int(len(df_model) * 0.8)
+    # Chia 80-20 (cắt lát trên memmap, không sao chép)
+    split_idx = int(len(y) * 0.8)
     
-    train_data = df_model.iloc[:split_idx]
-    test_data = df_model.iloc[split_idx:]
+    X_train, X_test = X[:split_idx], X[split_idx:]
+    y_train = y[:split_idx].astype(int)
+    y_test = y[split_idx:].astype(int)
     
-    print(f"Kích thước tập Train: {train_data.shape}")
-    print(f"Kích thước tập Test: {test_data.shape}")
-    
-    X_train = train_data.drop(columns=['target'])
-    y_train = train_data['target'].astype(int)
-    
-    X_test = test_data.drop(columns=['target'])
-    y_test = test_data['target'].astype(int)
+    print(f"Kích thước tập Train: {X_train.shape}")
+    print(f"Kích thước tập Test: {X_test.shape}")
     
     # 3. Huấn luyện Model cơ sở (Base Models)
-    trainer = ModelTrainer()
-    base_results = trainer.train_evaluate(X_train, y_train, X_test, y_test)
+    # Model đã train trên cùng dữ liệu, feature và siêu tham số được nạp lại từ model store
+    model_store = None if args.no_model_store else ModelStore(args.model_store)
+    # Xác suất dự đoán được tính một lần cho mỗi (model, tập dữ liệu) và dùng chung cho các ensemble
+    predictions = PredictionCache()
+    trainer = ModelTrainer(predictions=predictions, svm_mode=args.svm_mode, params=params)
+    base_results = trainer.train_evaluate(X_train, y_train, X_test, y_test,
+                                          store=model_store, feature_names=store.feature_names,
+                                          parallel=args.parallel, cpu_budget=args.cpu_budget)
     
     # 4. Huấn luyện Ensemble
     trained_models = trainer.get_trained_models()
-    ensemble = EnsembleTrainer(trained_models)
+    ensemble = EnsembleTrainer(trained_models, store=model_store, model_keys=trainer.model_keys,
+                               predictions=predictions)
     
     ensemble.soft_voting(X_test, y_test)
-    ensemble.stacking(X_train, y_train, X_test, y_test)
+    ensemble.stacking(X_train, y_train, X_test, y_test, cpu_budget=args.cpu_budget)
     
     ensemble_results = ensemble.get_results()
     
@@ -72,6 +103,9 @@ def main():
     result_path = os.path.join(current_dir, "../../model_results.csv")
     final_results.to_csv(result_path, index=False)
     print(f"\nĐã lưu bảng kết quả tại: {result_path}")
+    
+    if args.telemetry:
+        TELEMETRY.write_report(args.telemetry)
 
 if __name__ == "__main__":
     main()
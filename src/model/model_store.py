@@ -0,0 +1,83 @@
+import pandas as pd
+import numpy as np
+import os, json, hashlib, time
+import joblib
+import sklearn
+import xgboost
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Thư mục mặc định lưu các model đã huấn luyện
+DEFAULT_MODEL_STORE = os.path.normpath(os.path.join(current_dir, "../../models"))
+
+
+def data_fingerprint(X, y=None):
+    """Hash nội dung dữ liệu (mảng numpy/memmap hoặc DataFrame) kèm shape và dtype."""
+    h = hashlib.sha256()
+    for arr in (X, y):
+        if arr is None:
+            continue
+        if isinstance(arr, (pd.DataFrame, pd.Series)):
+            h.update(repr(list(arr.columns) if isinstance(arr, pd.DataFrame) else arr.name).encode())
+            arr = pd.util.hash_pandas_object(arr, index=False).to_numpy()
+        arr = np.ascontiguousarray(arr)
+        h.update(f'{arr.shape}{arr.dtype}'.encode())
+        h.update(arr)
+    return h.hexdigest()
+
+
+def params_fingerprint(estimator):
+    """Hash siêu tham số (chỉ các giá trị cơ bản, bỏ qua object estimator con) và phiên bản thư viện."""
+    params = estimator.get_params(deep=True) if hasattr(estimator, 'get_params') else estimator
+    flat = {k: v for k, v in params.items() if not hasattr(v, 'get_params')}
+    payload = json.dumps({'params': flat, 'sklearn': sklearn.__version__, 'xgboost': xgboost.__version__},
+                         sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def model_key(name, estimator, data_fp, feature_names=None):
+    """Khóa của một model: tên + hash dữ liệu huấn luyện + danh sách feature + siêu tham số."""
+    payload = json.dumps({'name': name, 'data': data_fp, 'features': list(feature_names or []),
+                          'params': params_fingerprint(estimator)}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+
+class ModelStore:
+    """
+    Kho model cục bộ: mỗi model (pipeline, meta-model stacking, cấu hình soft voting) được lưu bằng joblib
+    kèm metadata JSON (tên, thời gian fit, ...). Khóa xem model_key.
+    """
+
+    def __init__(self, store_dir=DEFAULT_MODEL_STORE):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.time_saved = 0.0
+
+    def _paths(self, key):
+        return os.path.join(self.store_dir, f'{key}.joblib'), os.path.join(self.store_dir, f'{key}.json')
+
+    def load(self, key):
+        """Trả về (model, metadata) hoặc None nếu chưa có; cập nhật thống kê hit/miss."""
+        model_path, meta_path = self._paths(key)
+        if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+            self.misses += 1
+            return None
+        start = time.perf_counter()
+        model = joblib.load(model_path)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.hits += 1
+        self.time_saved += max(meta.get('fit_seconds', 0.0) - (time.perf_counter() - start), 0.0)
+        return model, meta
+
+    def save(self, key, model, **meta):
+        model_path, meta_path = self._paths(key)
+        joblib.dump(model, model_path)
+        with open(meta_path, 'w') as f:
+            json.dump({'key': key, 'created': time.strftime('%Y-%m-%d %H:%M:%S'), **meta}, f, indent=2, default=str)
+
+    def report(self):
+        print(f"Model store: {self.hits} hit, {self.misses} miss, tiết kiệm ~{self.time_saved:.1f}s huấn luyện.")
+        return {'hits': self.hits, 'misses': self.misses, 'time_saved': self.time_saved}
@@ -5,13 +5,136 @@ from sklearn.pipeline import Pipeline
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.svm import SVC
+from sklearn.linear_model import SGDClassifier
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.calibration import CalibratedClassifierCV
 from xgboost import XGBClassifier
 from sklearn.metrics import accuracy_score, f1_score, roc_auc_score, precision_score, log_loss
+from threadpoolctl import threadpool_limits
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from model_store import data_fingerprint, model_key
+from prediction_cache import PredictionCache
+from telemetry import TELEMETRY
+import os, json, time
+
+
+# File siêu tham số mặc định do hyperparam_search.py ghi ra
+DEFAULT_TUNED_PARAMS = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../tuned_params.json"))
+
+# Chế độ của model SVM: 'exact' (SVC RBF chính xác), 'nystroem' hoặc 'rff' (xấp xỉ kernel + solver tuyến tính)
+SVM_MODES = ('exact', 'nystroem', 'rff')
+
+
+def build_svm_pipeline(mode='exact', random_state=42, n_components=300):
+    """
+    Pipeline cho vị trí 'SVM'. Chế độ xấp xỉ ánh xạ dữ liệu sang n_components feature ngẫu nhiên
+    xấp xỉ kernel RBF (Nystroem hoặc Random Fourier Features) rồi học SVM tuyến tính (hinge loss, SGD);
+    xác suất được hiệu chỉnh riêng bằng sigmoid (Platt) qua CalibratedClassifierCV. Chi phí tuyến tính
+    theo số dòng, thay vì bậc hai/bậc ba của SVC chính xác. SGD học trực tiếp trên mảng dense
+    (LinearSVC/liblinear sao chép dữ liệu sang định dạng riêng, hết RAM ở ~1 triệu dòng).
+    """
+    if mode == 'exact':
+        return Pipeline([
+            ('scaler', StandardScaler()),
+            ('model', SVC(
+                kernel='rbf',         # Radial Basis Function (Phi tuyến)
+                C=1.0,                # Regularization (C càng nhỏ càng chống overfitting)
+                probability=True,     # Bắt buộc để dùng Soft Voting
+                class_weight='balanced',
+                random_state=random_state
+            ))
+        ])
+    if mode not in SVM_MODES:
+        raise ValueError(f"svm_mode không hợp lệ: {mode} (chọn một trong {SVM_MODES})")
+    
+    # Cùng độ rộng kernel với SVC(gamma='scale') sau StandardScaler
+    if mode == 'nystroem':
+        features = Nystroem(kernel='rbf', n_components=n_components, random_state=random_state)
+    else:
+        features = RBFSampler(gamma='scale', n_components=n_components, random_state=random_state)
+    return Pipeline([
+        ('scaler', StandardScaler()),
+        ('features', features),
+        ('model', CalibratedClassifierCV(
+            SGDClassifier(loss='hinge', alpha=1e-4, class_weight='balanced', random_state=random_state),
+            method='sigmoid',
+            cv=3
+        ))
+    ])
+
+
+def is_threaded(pipe):
+    """Model có tự song song hóa (tham số n_jobs được đặt, vd. RF/XGBoost) hay chạy đơn luồng (LR, SVC)."""
+    return pipe.named_steps['model'].get_params().get('n_jobs') is not None
+
+
+def allocate_threads(pipelines, cpu_budget):
+    """
+    Chia ngân sách core cho các model train song song: model đơn luồng nhận 1 core,
+    phần còn lại chia đều cho các model đa luồng (tối thiểu 1 core mỗi model).
+    """
+    threaded = [name for name, pipe in pipelines.items() if is_threaded(pipe)]
+    n_serial = len(pipelines) - len(threaded)
+    spare = max(cpu_budget - n_serial, len(threaded))
+    threads = {name: 1 for name in pipelines}
+    for i, name in enumerate(threaded):
+        threads[name] = max(spare // len(threaded) + (i < spare % len(threaded)), 1)
+    return threads
+
+
+def _fit_worker(name, pipe, X_train, y_train, threads=None):
+    """
+    Fit một pipeline (trong tiến trình con khi train song song) và trả về (tên, pipeline, wall, cpu).
+    threads giới hạn n_jobs của model và thread pool BLAS/OpenMP; None giữ nguyên cấu hình gốc.
+    """
+    estimator = pipe.named_steps['model']
+    n_jobs = estimator.get_params().get('n_jobs')
+    if threads is not None and n_jobs is not None:
+        estimator.set_params(n_jobs=threads)
+    start, cpu_start = time.perf_counter(), time.process_time()
+    with threadpool_limits(limits=threads):
+        pipe.fit(X_train, y_train)
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    if threads is not None and n_jobs is not None:
+        # Trả lại cấu hình gốc để model lưu/nạp giống hệt chế độ tuần tự
+        estimator.set_params(n_jobs=n_jobs)
+    return name, pipe, wall, cpu
+
+def save_tuned_params(params, path=DEFAULT_TUNED_PARAMS, svm_mode='nystroem'):
+    """Ghi cấu hình tốt nhất (tên model -> siêu tham số) kèm chế độ SVM đã dùng khi tìm kiếm."""
+    with open(path, 'w') as f:
+        json.dump({'svm_mode': svm_mode, 'models': params}, f, indent=2)
+    print(f"Đã lưu cấu hình tốt nhất tại: {path}")
+
+
+def load_tuned_params(path=DEFAULT_TUNED_PARAMS, svm_mode=None):
+    """
+    Nạp cấu hình đã tinh chỉnh cho ModelTrainer(params=...). Tham số SVM chỉ áp dụng cho đúng
+    chế độ SVM đã tìm kiếm (SVC chính xác và SVM xấp xỉ có tham số khác nhau).
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Không tìm thấy file siêu tham số tại: {path}")
+    with open(path) as f:
+        tuned = json.load(f)
+    params = tuned['models']
+    if svm_mode is not None and 'SVM' in params and tuned['svm_mode'] != svm_mode:
+        print(f"Bỏ qua tham số SVM đã tinh chỉnh cho chế độ '{tuned['svm_mode']}' (đang dùng '{svm_mode}').")
+        params.pop('SVM')
+    return params
 
 class ModelTrainer:
-    def __init__(self, random_state=42):
+    def __init__(self, random_state=42, predictions=None, svm_mode='exact', params=None):
+        """
+        Args:
+            predictions (PredictionCache): Cache xác suất dùng chung với EnsembleTrainer.
+            svm_mode (str): 'exact', 'nystroem' hoặc 'rff' - xem build_svm_pipeline.
+            params (dict): Tên model -> siêu tham số của bước 'model' ghi đè cấu hình mặc định
+                           (vd. kết quả của hyperparam_search.py).
+        """
         self.random_state = random_state
+        self.predictions = predictions if predictions is not None else PredictionCache()
         self.models = {}
+        self.model_keys = {}
         self.results = []
         
         self.pipelines = {
@@ -45,41 +168,109 @@ class ModelTrainer:
                     n_jobs=-1
                 ))
             ]),
-            'SVM': Pipeline([
-                ('scaler', StandardScaler()),
-                ('model', SVC(
-                    kernel='rbf',         # Radial Basis Function (Phi tuyến)
-                    C=1.0,                # Regularization (C càng nhỏ càng chống overfitting)
-                    probability=True,     # Bắt buộc để dùng Soft Voting
-                    class_weight='balanced',
-                    random_state=self.random_state
-                ))
-            ])
+            'SVM': build_svm_pipeline(svm_mode, self.random_state)
         }
+        for name, model_params in (params or {}).items():
+            self.pipelines[name].set_params(**{f'model__{key}': value for key, value in model_params.items()})
 
-    def train_evaluate(self, X_train, y_train, X_test, y_test):
+    def train_evaluate(self, X_train, y_train, X_test, y_test, store=None, feature_names=None,
+                       parallel=False, cpu_budget=None):
+        """
+        Args:
+            store (ModelStore): Nếu có, model đã huấn luyện trên cùng dữ liệu/feature/siêu tham số
+                                được nạp lại thay vì train lại; model mới train được lưu vào store.
+            feature_names (list): Tên feature (tham gia vào khóa của model store).
+            parallel (bool): Train đồng thời các model (mỗi model một tiến trình) thay vì lần lượt.
+            cpu_budget (int): Tổng số core dành cho huấn luyện song song (mặc định: mọi core),
+                              chia cho các model bằng allocate_threads để tránh tranh chấp CPU.
+        """
         print("\n--- HUẤN LUYỆN MÔ HÌNH CƠ SỞ (BASE MODELS) ---")
+        data_fp = data_fingerprint(X_train, y_train) if store is not None else None
+        fitted, to_fit = {}, {}
         
         for name, pipe in self.pipelines.items():
-            print(f"Đang train {name}...")
-            pipe.fit(X_train, y_train)
-            self.models[name] = pipe
-            
-            y_pred = pipe.predict(X_test)
-            y_prob = pipe.predict_proba(X_test)[:, 1]
-            
-            res = {
-                'Model': name,
-                'Accuracy': accuracy_score(y_test, y_pred),
-                'Precision': precision_score(y_test, y_pred),
-                'F1-score': f1_score(y_test, y_pred),
-                'ROC-AUC': roc_auc_score(y_test, y_prob),
-                'Log Loss': log_loss(y_test, y_prob)
-            }
-            self.results.append(res)
-            print(f"  -> Accuracy: {res['Accuracy']:.4f}, AUC: {res['ROC-AUC']:.4f}")
-            
+            cached = None
+            if store is not None:
+                self.model_keys[name] = model_key(name, pipe, data_fp, feature_names)
+                cached = store.load(self.model_keys[name])
+            if cached is not None:
+                fitted[name], meta = cached
+                print(f"Nạp {name} từ model store (train gốc mất {meta['fit_seconds']:.1f}s).")
+                self._evaluate(name, fitted[name], X_test, y_test)
+            else:
+                to_fit[name] = pipe
+        
+        start = time.perf_counter()
+        timings = {}
+        if parallel and len(to_fit) > 1:
+            cpu_budget = cpu_budget or os.cpu_count()
+            threads = allocate_threads(to_fit, cpu_budget)
+            print(f"Train song song {len(to_fit)} model với ngân sách {cpu_budget} core: "
+                  + ", ".join(f"{name}={n}" for name, n in threads.items()))
+            with ProcessPoolExecutor(max_workers=min(len(to_fit), cpu_budget)) as executor:
+                futures = [executor.submit(_fit_worker, name, pipe, X_train, y_train, threads[name])
+                           for name, pipe in to_fit.items()]
+                # Đánh giá từng model ngay khi nó train xong
+                for future in as_completed(futures):
+                    name, pipe, wall, cpu = future.result()
+                    fitted[name], timings[name] = pipe, (wall, cpu, threads[name])
+                    # Fit chạy trong tiến trình con: chỉ có thời gian wall/CPU do worker đo
+                    TELEMETRY.add('fit', wall, cpu, rows_in=len(y_train), model=name, threads=threads[name])
+                    print(f"Xong {name} ({wall:.1f}s).")
+                    self._evaluate(name, pipe, X_test, y_test)
+        else:
+            for name, pipe in to_fit.items():
+                print(f"Đang train {name}...")
+                with TELEMETRY.record('fit', rows_in=len(y_train), model=name):
+                    name, pipe, wall, cpu = _fit_worker(name, pipe, X_train, y_train)
+                fitted[name] = pipe
+                timings[name] = (wall, cpu, os.cpu_count() if is_threaded(pipe) else 1)
+                self._evaluate(name, pipe, X_test, y_test)
+        
+        for name, (wall, _, _) in timings.items():
+            if store is not None:
+                store.save(self.model_keys[name], fitted[name], name=name, fit_seconds=wall,
+                           n_rows=len(y_train), feature_names=feature_names)
+        if timings:
+            self.report_timings(timings, time.perf_counter() - start)
+        
+        # Giữ thứ tự model cố định (thứ tự cột meta-feature của stacking phụ thuộc vào đây)
+        for name in self.pipelines:
+            self.pipelines[name] = self.models[name] = fitted[name]
+        order = list(self.pipelines)
+        self.results.sort(key=lambda res: order.index(res['Model']))
+        
+        if store is not None:
+            store.report()
         return pd.DataFrame(self.results)
 
+    def _evaluate(self, name, pipe, X_test, y_test):
+        with TELEMETRY.record('predict', rows_in=len(y_test), model=name):
+            y_pred = pipe.predict(X_test)
+            y_prob = self.predictions.proba(name, pipe, X_test)
+        
+        res = {
+            'Model': name,
+            'Accuracy': accuracy_score(y_test, y_pred),
+            'Precision': precision_score(y_test, y_pred),
+            'F1-score': f1_score(y_test, y_pred),
+            'ROC-AUC': roc_auc_score(y_test, y_prob),
+            'Log Loss': log_loss(y_test, y_prob)
+        }
+        self.results.append(res)
+        print(f"  -> Accuracy: {res['Accuracy']:.4f}, AUC: {res['ROC-AUC']:.4f}")
+        return res
+
+    @staticmethod
+    def report_timings(timings, total_wall):
+        """In thời gian wall, CPU và mức sử dụng CPU (CPU / (wall x số luồng)) của từng model."""
+        print("\nThời gian huấn luyện:")
+        for name, (wall, cpu, n_threads) in timings.items():
+            print(f"  {name:<20} wall {wall:7.1f}s | CPU {cpu:7.1f}s | {n_threads:>2} luồng | "
+                  f"sử dụng {cpu / max(wall * n_threads, 1e-9):.0%}")
+        sum_wall = sum(wall for wall, _, _ in timings.values())
+        print(f"  Tổng wall {total_wall:.1f}s (tổng các model {sum_wall:.1f}s, "
+              f"chậm nhất {max(wall for wall, _, _ in timings.values()):.1f}s)")
+
     def get_trained_models(self):
         return self.models
@@ -0,0 +1,39 @@
+import numpy as np
+from model_store import data_fingerprint
+
+
+class PredictionCache:
+    """
+    Cache xác suất dự đoán (predict_proba lớp 1) theo (model, tập dữ liệu), dùng chung giữa
+    ModelTrainer và các chiến lược ensemble để mỗi model chỉ suy luận một lần trên mỗi tập.
+    Tập dữ liệu được nhận diện bằng hash nội dung; hash được nhớ theo object mảng để không tính lại.
+    """
+
+    def __init__(self):
+        self._probs = {}
+        self._fingerprints = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _dataset_key(self, X):
+        # Giữ tham chiếu tới X để id() không bị tái sử dụng cho mảng khác
+        entry = self._fingerprints.get(id(X))
+        if entry is None or entry[0] is not X:
+            entry = (X, data_fingerprint(X))
+            self._fingerprints[id(X)] = entry
+        return entry[1]
+
+    def proba(self, name, model, X):
+        """Xác suất lớp 1 của model trên X (tính một lần, các lần sau lấy từ cache)."""
+        key = (name, id(model), self._dataset_key(X))
+        if key in self._probs:
+            self.hits += 1
+            return self._probs[key][1]
+        self.misses += 1
+        probs = np.asarray(model.predict_proba(X)[:, 1])
+        self._probs[key] = (model, probs)
+        return probs
+
+    def matrix(self, models, X):
+        """Ma trận [n_rows x n_models] xác suất của các model (theo thứ tự của dict models)."""
+        return np.column_stack([self.proba(name, model, X) for name, model in models.items()])
@@ -0,0 +1,308 @@
+import pandas as pd
+import numpy as np
+import os, sys, json, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+sys.path.append(os.path.join(current_dir, '../data_preprocessing'))
+
+from feature_spec import UNSEEDED, CRITICAL_COLUMNS, build_feature_matrix, feature_plan
+from rolling_features import DEFAULT_FORM_WINDOW, form_feature, player_form_state, _win_rate
+from context_features import DEFAULT_WORKLOAD_DAYS, MAX_REST_DAYS, workload_feature, match_days
+from match_index import MatchIndex
+from serve_features import DEFAULT_HALF_LIFE, SERVE_STATS, ServeState, compute_serve_features
+
+# Ngữ cảnh trận đấu mặc định khi không được truyền vào
+DEFAULT_CONTEXT = {'draw_size': 32, 'best_of': 3, 'match_num': 1}
+
+PROFILE_COLS = ['hand', 'ht', 'age', 'rank', 'rank_points']
+
+
+def _linear_scorer(pipe):
+    """
+    Đường tắt cho pipeline StandardScaler + LogisticRegression: tính trực tiếp bằng numpy,
+    tránh chi phí kiểm tra đầu vào của sklearn (chiếm phần lớn độ trễ khi chấm 1 trận).
+    Trả về None nếu pipeline không có dạng này.
+    """
+    steps = getattr(pipe, 'named_steps', {})
+    scaler, model = steps.get('scaler'), steps.get('model')
+    if type(scaler).__name__ != 'StandardScaler' or type(model).__name__ != 'LogisticRegression':
+        return None
+    mean = scaler.mean_ if scaler.with_mean else 0.0
+    scale = scaler.scale_ if scaler.with_std else 1.0
+    coef, intercept = model.coef_[0], model.intercept_[0]
+    return lambda X: 1 / (1 + np.exp(-(((X - mean) / scale) @ coef + intercept)))
+
+
+def _take(values, idx, fill):
+    """values[idx], với idx = -1 (cầu thủ/mặt sân chưa biết) trả về fill."""
+    out = values[np.maximum(idx, 0)]
+    if out.dtype.kind in 'fc':
+        out = out.astype(np.float64)
+    else:
+        out = out.astype(object)
+    out[idx < 0] = fill
+    return out
+
+
+class MatchPredictor:
+    """
+    Bộ dự đoán online giữ sẵn trong bộ nhớ: trạng thái Elo, phong độ/tỷ lệ thắng mặt sân của từng cầu thủ,
+    hồ sơ cầu thủ (tay thuận, chiều cao, tuổi, thứ hạng), chỉ mục lịch sử trận (đối đầu, ngày nghỉ,
+    khối lượng thi đấu), thống kê giao bóng có trọng số mũ và các model đã huấn luyện.
+    Feature được dựng bằng cùng đặc tả với finalize_features (model/feature_spec.py).
+    """
+
+    def __init__(self, models, feature_names, elo_model, matches, meta_model=None):
+        """
+        Args:
+            models (dict): Tên -> pipeline đã fit (ModelTrainer.get_trained_models()).
+            feature_names (list): Thứ tự feature lúc huấn luyện (FeatureStore.feature_names).
+            elo_model (TennisEloModel): Trạng thái Elo hiện tại (vd. TennisEloModel.load_state).
+            matches (DataFrame): Lịch sử trận dạng Winner/Loser (load_data), dùng để dựng phong độ và hồ sơ cầu thủ.
+            meta_model: Meta-model của stacking (EnsembleTrainer.meta_model), tùy chọn.
+        """
+        self.models = models
+        self.meta_model = meta_model
+        self.feature_names = list(feature_names)
+        self.elo = elo_model
+        self.windows = [DEFAULT_FORM_WINDOW] + [
+            int(c[len('p1_recent_form_'):]) for c in self.feature_names if c.startswith('p1_recent_form_')
+        ]
+        self.workload_windows = [DEFAULT_WORKLOAD_DAYS] + [
+            int(c[len('p1_matches_'):-1]) for c in self.feature_names
+            if c.startswith('p1_matches_') and c != f'p1_{workload_feature(DEFAULT_WORKLOAD_DAYS)}'
+        ]
+        self.half_lives = [DEFAULT_HALF_LIFE] + sorted({
+            int(c.rsplit('_hl', 1)[1]) for c in self.feature_names
+            for stat in SERVE_STATS if c.startswith(f'p1_{stat}_hl')
+        })
+        self.matches = matches
+        self._plan = feature_plan(self.feature_names)
+        self._scorers = {name: _linear_scorer(m) or (lambda X, m=m: m.predict_proba(X)[:, 1])
+                         for name, m in models.items()}
+        self._build_state()
+
+    def _build_state(self):
+        """Dựng các mảng tra cứu theo chỉ số cầu thủ / mặt sân từ lịch sử và trạng thái Elo."""
+        df = self.matches
+        recent, surface_stats = player_form_state(df, max(self.windows))
+
+        # Hồ sơ cầu thủ: giá trị ở trận gần nhất
+        n = len(df)
+        long = pd.DataFrame({
+            'player': np.concatenate([df['winner_id'].to_numpy(), df['loser_id'].to_numpy()]),
+            'pos': np.tile(np.arange(n), 2),
+            'date': np.tile(df['tourney_date'].to_numpy(dtype='datetime64[ns]'), 2),
+            **{col: np.concatenate([df[f'winner_{col}'].to_numpy(dtype=object if col == 'hand' else np.float64),
+                                    df[f'loser_{col}'].to_numpy(dtype=object if col == 'hand' else np.float64)])
+               for col in PROFILE_COLS}
+        }).sort_values(['player', 'pos'], kind='stable')
+        profiles = long.groupby('player', sort=False).last()
+
+        players = pd.Index(pd.unique(np.concatenate([
+            profiles.index.to_numpy(dtype=object), np.asarray(list(self.elo.overall_elo), dtype=object)
+        ])))
+        surfaces = pd.Index(sorted({s for _, s in surface_stats} |
+                                   {s for by_surf in self.elo.surface_elo.values() for s in by_surf if not pd.isna(s)}))
+        self._players, self._surfaces = players, surfaces
+        self._player_pos = {pid: i for i, pid in enumerate(players)}
+        self._surface_pos = {surf: j for j, surf in enumerate(surfaces)}
+
+        profiles = profiles.reindex(players)
+        self._profile = {col: profiles[col].to_numpy() for col in PROFILE_COLS}
+        self._profile_date = profiles['date'].to_numpy(dtype='datetime64[ns]')
+
+        # Phong độ cho từng cửa sổ (giống np.mean của danh sách kết quả gần nhất)
+        self._form = {}
+        for window in self.windows:
+            form = np.zeros(len(players))
+            for pid, results in recent.items():
+                last = results[-window:]
+                form[self._player_pos[pid]] = sum(last) / len(last)
+            self._form[window] = form
+
+        # Tỷ lệ thắng mặt sân và Elo dạng ma trận [cầu thủ x mặt sân]
+        self._surf_pct = np.zeros((len(players), len(surfaces)))
+        for (pid, surf), (wins, total) in surface_stats.items():
+            self._surf_pct[self._player_pos[pid], self._surface_pos[surf]] = wins / total
+
+        start = self.elo.start_elo
+        # Thống kê giao bóng có trọng số mũ sau trận gần nhất của từng cầu thủ
+        serve_state = ServeState(self.half_lives)
+        compute_serve_features(df, self.half_lives, state=serve_state)
+        self._serve = {name: np.zeros(len(players)) for name in serve_state.features(None)}
+        for pid in serve_state.sums:
+            for name, value in serve_state.features(pid).items():
+                self._serve[name][self._player_pos[pid]] = value
+
+        # Chỉ mục lịch sử trận: truy vấn "tính đến trận kế tiếp" = vị trí sau toàn bộ lịch sử
+        days = match_days(df['tourney_date'].to_numpy())
+        self._index = MatchIndex(df['winner_id'].to_numpy(), df['loser_id'].to_numpy(), days)
+        self._last_day = int(days.max()) if n else 0
+
+        self._elo_overall = np.array([self.elo.overall_elo.get(pid, start) for pid in players], dtype=np.float64)
+        self._elo_surface = np.full((len(players), len(surfaces)), float(start))
+        for pid, by_surf in self.elo.surface_elo.items():
+            for surf, elo in by_surf.items():
+                if surf in self._surface_pos:
+                    self._elo_surface[self._player_pos[pid], self._surface_pos[surf]] = elo
+
+    def update(self, new_matches):
+        """
+        Ghi nhận kết quả mới (dạng Winner/Loser, đã sắp xếp theo thời gian):
+        Elo được cập nhật tăng dần qua partial_fit, phong độ và hồ sơ được dựng lại.
+        """
+        elo_input = pd.DataFrame({
+            'tourney_date': new_matches['tourney_date'],
+            'match_num': new_matches['match_num'],
+            'p1_id': new_matches['winner_id'],
+            'p2_id': new_matches['loser_id'],
+            'surface': new_matches['surface'],
+            'target': 1,
+        })
+        self.elo.partial_fit(elo_input.reset_index(drop=True))
+        self.matches = pd.concat([self.matches, new_matches], ignore_index=True)
+        self._build_state()
+
+    @staticmethod
+    def _lookup(index, positions, keys):
+        """Chỉ số của keys trong index (-1 nếu chưa biết); dùng dict cho lô nhỏ để giữ độ trễ thấp."""
+        if len(keys) <= 256:
+            return np.fromiter((positions.get(k, -1) for k in keys.tolist()), dtype=np.intp, count=len(keys))
+        return index.get_indexer(keys.astype(object))
+
+    def build_features(self, matches):
+        """
+        Dựng ma trận feature cho các trận chưa diễn ra.
+
+        Args:
+            matches (DataFrame | dict): Bắt buộc p1_id, p2_id, surface. Tùy chọn: date (để tính tuổi, ngày nghỉ
+                và khối lượng thi đấu; mặc định là ngày của trận cuối trong lịch sử),
+                draw_size, best_of, match_num, và giá trị ghi đè hồ sơ như p1_rank, p2_seed, p1_hand...
+        """
+        cols_in = {k: np.asarray(v) for k, v in matches.items()}
+        p1_ids, p2_ids = cols_in['p1_id'], cols_in['p2_id']
+        n = len(p1_ids)
+        surface = cols_in['surface'].astype(object)
+        s_idx = self._lookup(self._surfaces, self._surface_pos, surface)
+
+        cols = {'surface': surface}
+        for key, default in DEFAULT_CONTEXT.items():
+            cols[key] = cols_in[key].astype(np.float64) if key in cols_in else np.full(n, float(default))
+
+        after_history = np.full(n, self._index.n_matches)
+        days = match_days(cols_in['date']) if 'date' in cols_in else np.full(n, self._last_day)
+        p1_wins, meetings = self._index.head_to_head(p1_ids, p2_ids, after_history)
+        cols['h2h_matches'] = meetings.astype(np.float64)
+        cols['p1_h2h_win_pct'] = _win_rate(p1_wins, meetings)
+        cols['p2_h2h_win_pct'] = _win_rate(meetings - p1_wins, meetings)
+
+        w = self.elo.surface_weight
+        for side, ids in (('p1', p1_ids), ('p2', p2_ids)):
+            idx = self._lookup(self._players, self._player_pos, ids)
+            cols[f'{side}_id'] = ids.astype(np.float64)
+            for col in PROFILE_COLS:
+                cols[f'{side}_{col}'] = _take(self._profile[col], idx, np.nan)
+            if 'date' in cols_in:
+                elapsed = (np.asarray(cols_in['date'], dtype='datetime64[ns]') - self._profile_date[np.maximum(idx, 0)])
+                cols[f'{side}_age'] = cols[f'{side}_age'] + elapsed / np.timedelta64(1, 'D') / 365.25
+            # Giá trị truyền vào ghi đè hồ sơ (NaN = dùng hồ sơ)
+            for col in PROFILE_COLS + ['seed']:
+                key = f'{side}_{col}'
+                if key in cols_in:
+                    given = cols_in[key]
+                    cols[key] = given if key not in cols else np.where(pd.isna(given), cols[key], given)
+            seed = cols.get(f'{side}_seed', np.full(n, np.nan))
+            if seed.dtype.kind not in 'fi':
+                seed = pd.to_numeric(pd.Series(seed), errors='coerce').to_numpy()
+            seed = seed.astype(np.float64)
+            cols[f'{side}_seed'] = np.where(np.isnan(seed), UNSEEDED, seed)
+
+            for window in self.windows:
+                cols[f'{side}_{form_feature(window)}'] = _take(self._form[window], idx, 0.0)
+            known = (idx >= 0) & (s_idx >= 0)
+            cols[f'{side}_surface_win_pct'] = np.where(known, self._surf_pct[np.maximum(idx, 0), np.maximum(s_idx, 0)], 0.0)
+            cols[f'{side}_rest_days'] = np.fmin(self._index.days_since_last(ids, after_history, days), MAX_REST_DAYS)
+            for name, values in self._serve.items():
+                cols[f'{side}_{name}'] = _take(values, idx, 0.0)
+            for window in self.workload_windows:
+                cols[f'{side}_{workload_feature(window)}'] = self._index.matches_since(
+                    ids, after_history, days - window).astype(np.float64)
+            overall = _take(self._elo_overall, idx, float(self.elo.start_elo))
+            s_elo = np.where(known, self._elo_surface[np.maximum(idx, 0), np.maximum(s_idx, 0)], float(self.elo.start_elo))
+            cols[f'{side}_elo'] = (1 - w) * overall + w * s_elo
+        cols['elo_diff'] = cols['p1_elo'] - cols['p2_elo']
+
+        missing = [c for c in CRITICAL_COLUMNS if np.isnan(cols[c].astype(np.float64)).any()]
+        if missing:
+            raise ValueError(f"Thiếu dữ liệu cốt lõi {missing}: hãy truyền giá trị (vd. p1_rank=...) cho cầu thủ chưa có hồ sơ.")
+        return build_feature_matrix(cols, self.feature_names, self._plan)
+
+    def _predict_proba(self, X, model):
+        if model is None or model == 'soft_voting':
+            return np.mean([score(X) for score in self._scorers.values()], axis=0)
+        if model == 'stacking':
+            if self.meta_model is None:
+                raise ValueError("Chưa có meta-model cho stacking.")
+            meta = np.column_stack([score(X) for score in self._scorers.values()])
+            return self.meta_model.predict_proba(meta)[:, 1]
+        return self._scorers[model](X)
+
+    def predict_many(self, matches, model=None):
+        """
+        Xác suất P1 thắng cho nhiều trận (vd. cả một nhánh đấu) trong một lần gọi.
+
+        Args:
+            model (str): Tên model, 'soft_voting' (mặc định - trung bình các model) hoặc 'stacking'.
+        """
+        return self._predict_proba(self.build_features(matches), model)
+
+    def predict(self, p1_id, p2_id, surface, model=None, **context):
+        """Xác suất P1 thắng cho một trận."""
+        matches = {'p1_id': [p1_id], 'p2_id': [p2_id], 'surface': [surface]}
+        matches.update({k: [v] for k, v in context.items()})
+        return float(self.predict_many(matches, model=model)[0])
+
+
+def serve(predictor, host='127.0.0.1', port=8000):
+    """
+    Endpoint HTTP cục bộ (chỉ dùng thư viện chuẩn).
+        POST /predict  {"p1_id": ..., "p2_id": ..., "surface": ..., "model": ...}
+                       hoặc {"matches": [{...}, ...], "model": ...}
+        -> {"probabilities": [...], "latency_ms": ...}
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path != '/predict':
+                return self._reply(404, {'error': 'not found'})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                if not isinstance(request, dict):
+                    raise ValueError("Body phải là một object JSON.")
+                model = request.pop('model', None)
+                rows = request.get('matches', [request])
+                if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                    raise ValueError("'matches' phải là một danh sách các object JSON.")
+                start = time.perf_counter()
+                probs = predictor.predict_many(pd.DataFrame(rows), model=model)
+                self._reply(200, {'probabilities': probs.tolist(),
+                                  'latency_ms': (time.perf_counter() - start) * 1000})
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                self._reply(400, {'error': str(e)})
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Đang phục vụ dự đoán tại http://{host}:{port}/predict")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
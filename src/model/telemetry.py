@@ -0,0 +1,198 @@
+import pandas as pd
+import os, json, time, threading, platform, tracemalloc, cProfile, functools
+from contextlib import contextmanager
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss():
+    """
+    RSS hiện tại của tiến trình (byte): /proc/self/statm trên Linux, nếu không có thì dùng đỉnh ru_maxrss;
+    0 nếu không đo được (module resource chỉ có trên POSIX, vd. không có trên Windows).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        try:
+            import resource
+        except ImportError:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS trả về byte, Linux trả về KB
+        return peak if platform.system() == 'Darwin' else peak * 1024
+
+
+class _RssSampler(threading.Thread):
+    """Luồng nền lấy mẫu RSS mỗi interval giây để đo đỉnh bộ nhớ trong một stage."""
+
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak = max(self.peak, current_rss())
+        return self.peak
+
+
+class Telemetry:
+    """
+    Ghi nhận hiệu năng theo stage: thời gian wall/CPU, đỉnh RSS và chênh lệch RSS, số dòng vào/ra và dòng/giây.
+    Tùy chọn: theo dõi cấp phát Python/numpy bằng tracemalloc (chậm hơn đáng kể) và cProfile cho các stage chọn.
+    Khi enabled=False, record() trả về ngay một context rỗng (chi phí gần như bằng 0).
+    """
+
+    def __init__(self, enabled=False, trace_allocations=False, profile=(), profile_dir='.'):
+        """
+        Args:
+            trace_allocations (bool): Đo đỉnh/chênh lệch cấp phát bằng tracemalloc.
+            profile (iterable): Tên các stage được chạy dưới cProfile (file {stage}.prof trong profile_dir).
+        """
+        self.enabled = enabled
+        self.trace_allocations = trace_allocations
+        self.profile = set(profile)
+        self.profile_dir = profile_dir
+        self.records = []
+
+    def configure(self, **kwargs):
+        for key, value in kwargs.items():
+            if not hasattr(self, key):
+                raise ValueError(f"Tham số telemetry không hợp lệ: {key}")
+            setattr(self, key, set(value) if key == 'profile' else value)
+        return self
+
+    @contextmanager
+    def _measure(self, stage, rows_in, meta):
+        record = {'stage': stage, 'rows_in': rows_in, 'rows_out': None, **meta}
+        sampler = _RssSampler()
+        sampler.start()
+        rss_start = current_rss()
+        # Stage lồng nhau: chỉ stage ngoài cùng bật/tắt tracemalloc
+        own_trace = self.trace_allocations and not tracemalloc.is_tracing()
+        if own_trace:
+            tracemalloc.start()
+        trace_start = tracemalloc.get_traced_memory()[0] if self.trace_allocations else 0
+        profiler = cProfile.Profile() if stage in self.profile else None
+        if profiler is not None:
+            profiler.enable()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(self.profile_dir, exist_ok=True)
+                record['profile'] = os.path.join(self.profile_dir, f'{stage}.prof')
+                profiler.dump_stats(record['profile'])
+            if self.trace_allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                if own_trace:
+                    tracemalloc.stop()
+                record['alloc_delta_mb'] = (current - trace_start) / 2**20
+                record['alloc_peak_mb'] = peak / 2**20
+            peak_rss = sampler.stop()
+            rows = record['rows_out'] if record['rows_out'] is not None else record['rows_in']
+            record.update({
+                'wall_s': wall,
+                'cpu_s': cpu,
+                'cpu_util': cpu / wall if wall > 0 else None,
+                'peak_rss_mb': peak_rss / 2**20,
+                'rss_delta_mb': (current_rss() - rss_start) / 2**20,
+                'rows_per_s': rows / wall if rows and wall > 0 else None
+            })
+            self.records.append(record)
+
+    def record(self, stage, rows_in=None, **meta):
+        """
+        Context manager đo một stage; gán record['rows_out'] bên trong khối with nếu biết số dòng ra.
+
+            with TELEMETRY.record('fit', rows_in=len(X), model=name) as rec:
+                ...
+        """
+        if not self.enabled:
+            return _NULL_RECORD
+        return self._measure(stage, rows_in, meta)
+
+    def timed(self, stage, rows=None):
+        """Decorator: đo mỗi lần gọi hàm như một stage; rows(*args, **kwargs) trả về số dòng vào."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._measure(stage, rows(*args, **kwargs) if rows else None, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add(self, stage, wall_s, cpu_s=None, rows_in=None, **meta):
+        """Ghi một bản ghi đã đo sẵn ở nơi khác (vd. model fit trong tiến trình con)."""
+        if self.enabled:
+            self.records.append({'stage': stage, 'rows_in': rows_in, 'wall_s': wall_s, 'cpu_s': cpu_s,
+                                 'cpu_util': cpu_s / wall_s if cpu_s is not None and wall_s > 0 else None,
+                                 'rows_per_s': rows_in / wall_s if rows_in and wall_s > 0 else None, **meta})
+
+    def to_frame(self):
+        return pd.DataFrame(self.records)
+
+    def write_report(self, path):
+        """Ghi báo cáo lần chạy: {path}.json (metadata + bản ghi) và {path}.csv (một dòng mỗi bản ghi)."""
+        base = os.path.splitext(path)[0]
+        os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+        report = {
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'host': platform.node(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'records': self.records
+        }
+        with open(f'{base}.json', 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        self.to_frame().to_csv(f'{base}.csv', index=False)
+        print(f"Đã lưu báo cáo hiệu năng ({len(self.records)} bản ghi) tại: {base}.json / {base}.csv")
+
+
+def add_telemetry_arguments(parser):
+    """Thêm các cờ --telemetry/--profile/--trace-allocations vào một argparse parser."""
+    parser.add_argument('--telemetry', metavar='REPORT', default=None,
+                        help="Bật đo hiệu năng theo stage và ghi báo cáo REPORT(.json/.csv).")
+    parser.add_argument('--profile', nargs='+', default=[], metavar='STAGE',
+                        help="Chạy các stage này dưới cProfile (file .prof cạnh báo cáo).")
+    parser.add_argument('--trace-allocations', action='store_true',
+                        help="Đo cấp phát bộ nhớ bằng tracemalloc (làm chậm đáng kể).")
+    return parser
+
+
+def configure_telemetry(args, telemetry=None):
+    """Bật TELEMETRY theo các cờ của add_telemetry_arguments; trả về True nếu đang bật."""
+    telemetry = telemetry or TELEMETRY
+    enabled = bool(args.telemetry or args.profile)
+    profile_dir = os.path.dirname(os.path.abspath(args.telemetry)) if args.telemetry else 'profiles'
+    telemetry.configure(enabled=enabled, profile=args.profile, profile_dir=profile_dir,
+                        trace_allocations=args.trace_allocations)
+    return enabled
+
+
+class _NullRecord:
+    """Context rỗng dùng khi telemetry tắt: không đo gì, bản ghi là dict bỏ đi."""
+
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_RECORD = _NullRecord()
+
+# Telemetry dùng chung cho toàn bộ pipeline (mặc định tắt; bật bằng TELEMETRY.configure(enabled=True))
+TELEMETRY = Telemetry()